@@ -3,15 +3,26 @@ Analytics Router - Backend API for tracking user behavior
 """
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import func, distinct, update, case, cast, Float
+from typing import List, Optional, Set
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field
 import uuid
 
-from db.database import get_db
-from models.analytics_models import EventsRaw, UserBehaviorFeatures, GroupPerformanceMetrics
+from db.database import get_db, get_read_db
+from db.upsert import upsert_insert
+from models.analytics_models import (
+    EventsRaw, EventsArchive, UserBehaviorFeatures, GroupPerformanceMetrics, FeatureStore,
+    EventDailyUserRollup, EventDailyGroupRollup,
+)
 from models.models import User, AdminGroup
-from authentication.auth import get_current_user, verify_token
+from models.event_fields import event_entity_id
+from authentication.auth import get_current_user, verify_admin, verify_token
+from analytics.etl_pipeline import lifetime_event_counts
+from analytics.transition_index import record_product_views
+from analytics.session_store import record_session_events
+from monitoring.metrics import INGESTION_QUEUE_EVENTS
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
@@ -65,7 +76,8 @@ async def track_batch_events(
     """
     try:
         # Process events in background to not block response
-        background_tasks.add_task(process_events_batch, request.events, db)
+        INGESTION_QUEUE_EVENTS.inc(len(request.events))
+        background_tasks.add_task(_process_queued_events, request.events, db)
         
         return {
             "status": "ok",
@@ -76,6 +88,12 @@ async def track_batch_events(
         print(f"Error ingesting events: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to ingest events: {str(e)}")
 
+def _process_queued_events(events: List[AnalyticsEvent], db: Session):
+    try:
+        process_events_batch(events, db)
+    finally:
+        INGESTION_QUEUE_EVENTS.dec(len(events))
+
 def process_events_batch(events: List[AnalyticsEvent], db: Session):
     """
     Process and store events batch with idempotency.
@@ -85,6 +103,7 @@ def process_events_batch(events: List[AnalyticsEvent], db: Session):
     """
     try:
         events_to_insert = []
+        seen_event_ids = set()
         
         for event in events:
             # Skip events from anonymous users or events without user_id
@@ -97,13 +116,17 @@ def process_events_batch(events: List[AnalyticsEvent], db: Session):
                 print(f"⏭️  Skipping event from non-trader user {event.user_id}")
                 continue
             
-            # Check if event already exists (idempotency by event_id)
+            # Check if event already exists (idempotency by event_id),
+            # including duplicates within this batch
+            if event.event_id in seen_event_ids:
+                continue
             existing = db.query(EventsRaw).filter(
                 EventsRaw.event_id == event.event_id
             ).first()
             
             if existing:
                 continue  # Skip duplicate
+            seen_event_ids.add(event.event_id)
             
             # Create event record
             event_record = EventsRaw(
@@ -115,6 +138,8 @@ def process_events_batch(events: List[AnalyticsEvent], db: Session):
                 session_id=event.session_id,
                 timestamp=event.timestamp,
                 properties=event.properties,
+                group_id=event_entity_id(event.properties, 'group_id'),
+                product_id=event_entity_id(event.properties, 'product_id'),
                 url=event.context.url,
                 path=event.context.path,
                 referrer=event.context.referrer,
@@ -135,96 +160,156 @@ def process_events_batch(events: List[AnalyticsEvent], db: Session):
             db.commit()
             print(f"✅ Inserted {len(events_to_insert)} events into events_raw")
             
-            # Trigger incremental feature updates for affected users
-            affected_user_ids = set(e.user_id for e in events if e.user_id)
-            for user_id in affected_user_ids:
-                update_user_features_incremental(user_id, db)
+            # Feed the session context store used by session-aware recommendations
+            record_session_events(events_to_insert)
+            
+            # Apply only the newly inserted events to each affected user's features
+            events_by_user = defaultdict(list)
+            for record in events_to_insert:
+                events_by_user[record.user_id].append(record)
+            for user_id, user_events in events_by_user.items():
+                update_user_features_incremental(user_id, user_events, db)
+                record_product_views(user_id, user_events, db)
         
     except Exception as e:
         db.rollback()
         print(f"❌ Error processing events batch: {str(e)}")
         raise
 
-def update_user_features_incremental(user_id: int, db: Session):
+VIEWED_GROUPS_KEY = "user:{user_id}:viewed_groups"
+
+def _viewed_groups_from_events(db: Session, user_id: int) -> Set[int]:
+    """Distinct groups the user has viewed, from raw and archived events."""
+    viewed = set()
+    for model in (EventsRaw, EventsArchive):
+        viewed.update(group_id for (group_id,) in db.query(distinct(model.group_id)).filter(
+            model.user_id == user_id,
+            model.event_type == 'group_view',
+            model.group_id.isnot(None)
+        ))
+    return viewed
+
+def merge_viewed_groups(user_id: int, group_ids: Set[int], db: Session) -> int:
+    """
+    Merge newly viewed group ids into the user's compact viewed-group set
+    (a sorted id list in the feature store) and return the distinct count.
+    A user without a set yet gets one seeded from their stored view events.
+    """
+    key = VIEWED_GROUPS_KEY.format(user_id=user_id)
+    record = db.query(FeatureStore).filter(FeatureStore.feature_key == key).first()
+    if record is None:
+        # Insert-or-ignore: a concurrent batch may be seeding the same set
+        db.execute(upsert_insert(db, FeatureStore).values(
+            feature_key=key,
+            feature_value={"group_ids": sorted(_viewed_groups_from_events(db, user_id))},
+            feature_type='user',
+            entity_id=user_id,
+            computed_at=datetime.utcnow()
+        ).on_conflict_do_nothing(index_elements=['feature_key']))
+        record = db.query(FeatureStore).filter(FeatureStore.feature_key == key).one()
+    
+    known = set((record.feature_value or {}).get("group_ids", []))
+    merged = known | group_ids
+    if merged != known:
+        # Reassign so the JSON column is flagged dirty
+        record.feature_value = {"group_ids": sorted(merged)}
+        record.computed_at = datetime.utcnow()
+    return len(merged)
+
+FEATURE_COUNTERS = {
+    'total_page_views': 'page_view',
+    'total_group_views': 'group_view',
+    'total_group_clicks': 'group_join_click',
+    'total_joins': 'group_join_complete',
+    'total_payments': 'payment_success',
+}
+FEATURE_RECENCY = {
+    'last_view': 'group_view',
+    'last_click': 'group_join_click',
+    'last_join': 'group_join_complete',
+    'last_payment': 'payment_success',
+}
+
+def _ratio(numerator, denominator, current):
+    """numerator / denominator as a float, keeping `current` while the denominator is 0."""
+    return case((denominator > 0, cast(numerator, Float) / denominator), else_=current)
+
+def update_user_features_incremental(user_id: int, events: List[EventsRaw], db: Session):
     """
-    Incrementally update user behavior features based on new events.
-    This runs after each batch to keep features fresh.
+    Incrementally update user behavior features from a batch of new events.
+    Only the given events are applied, as deltas onto the running totals, so
+    re-processing never double counts; the daily ETL recomputes from scratch.
+    
+    Counters are incremented in SQL (not read-modify-write), since ingestion
+    batches for the same user can run concurrently.
     """
     try:
-        # Get or create user features
-        features = db.query(UserBehaviorFeatures).filter(
-            UserBehaviorFeatures.user_id == user_id
-        ).first()
+        F = UserBehaviorFeatures
+        # Insert-or-ignore, so two first batches for a user can't both insert the row
+        db.execute(upsert_insert(db, F).values(user_id=user_id).on_conflict_do_nothing(index_elements=['user_id']))
         
-        if not features:
-            features = UserBehaviorFeatures(user_id=user_id)
-            db.add(features)
+        counts = Counter(event.event_type for event in events)
+        values = {'total_events': func.coalesce(F.total_events, 0) + len(events)}
+        for column, event_type in FEATURE_COUNTERS.items():
+            values[column] = func.coalesce(getattr(F, column), 0) + counts[event_type]
         
-        # Get recent events (last hour) for incremental update
-        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        recent_events = db.query(EventsRaw).filter(
-            EventsRaw.user_id == user_id,
-            EventsRaw.timestamp >= one_hour_ago
-        ).all()
+        # Track recency from the batch itself
+        for column, event_type in FEATURE_RECENCY.items():
+            timestamps = [e.timestamp for e in events if e.event_type == event_type and e.timestamp]
+            if timestamps:
+                latest = max(timestamps, key=_naive)
+                current = getattr(F, column)
+                values[column] = case((current.is_(None), latest), (current < latest, latest), else_=current)
         
-        # Update event counts
-        for event in recent_events:
-            if event.event_type == 'page_view':
-                features.total_page_views += 1
-            elif event.event_type == 'group_view':
-                features.total_group_views += 1
-                features.unique_groups_viewed = db.query(EventsRaw).filter(
-                    EventsRaw.user_id == user_id,
-                    EventsRaw.event_type == 'group_view'
-                ).distinct(EventsRaw.properties['group_id']).count()
-            elif event.event_type == 'group_join_click':
-                features.total_group_clicks += 1
-            elif event.event_type == 'group_join_complete':
-                features.total_joins += 1
-            elif event.event_type == 'payment_success':
-                features.total_payments += 1
+        # The update also locks the user's row until commit, serialising the viewed-group merge below
+        db.execute(update(F).where(F.user_id == user_id).values(**values))
         
-        # Update conversion rates
-        if features.total_group_views > 0:
-            features.browse_to_click_rate = features.total_group_clicks / features.total_group_views
-        
-        if features.total_group_clicks > 0:
-            features.click_to_join_rate = features.total_joins / features.total_group_clicks
-        
-        if features.total_joins > 0:
-            features.join_to_payment_rate = features.total_payments / features.total_joins
+        viewed_group_ids = {
+            event.group_id for event in events
+            if event.event_type == 'group_view' and event.group_id is not None
+        }
+        rates = {}
+        if viewed_group_ids:
+            rates['unique_groups_viewed'] = merge_viewed_groups(user_id, viewed_group_ids, db)
         
-        # Update engagement score (simple formula)
-        features.engagement_score = min(1.0, (
-            (features.total_page_views / 100) * 0.2 +
-            (features.total_group_views / 50) * 0.3 +
-            (features.total_joins / 10) * 0.5
+        # Conversion rates and engagement score from the updated totals
+        engagement = (
+            cast(F.total_page_views, Float) / 100 * 0.2 +
+            cast(F.total_group_views, Float) / 50 * 0.3 +
+            cast(F.total_joins, Float) / 10 * 0.5
+        )
+        db.execute(update(F).where(F.user_id == user_id).values(
+            browse_to_click_rate=_ratio(F.total_group_clicks, F.total_group_views, F.browse_to_click_rate),
+            click_to_join_rate=_ratio(F.total_joins, F.total_group_clicks, F.click_to_join_rate),
+            join_to_payment_rate=_ratio(F.total_payments, F.total_joins, F.join_to_payment_rate),
+            engagement_score=case((engagement > 1.0, 1.0), else_=engagement),
+            last_computed=datetime.utcnow(),
+            **rates
         ))
-        
-        features.last_computed = datetime.utcnow()
         db.commit()
         
     except Exception as e:
         db.rollback()
         print(f"⚠️  Error updating user features for user {user_id}: {str(e)}")
 
+def _naive(ts: datetime) -> datetime:
+    """Drop tzinfo so aware and naive timestamps can be compared."""
+    return ts.replace(tzinfo=None) if ts.tzinfo else ts
+
+def get_event_breakdown(db: Session, user_id: int) -> dict:
+    """
+    Event counts by type for a user: compacted days come from the daily
+    rollups, only the not-yet-compacted tail is read from events_raw.
+    """
+    return dict(lifetime_event_counts(db, 'user_id', user_id).get(user_id, {}))
+
 @router.get("/user-activity", response_model=UserActivitySummary)
 async def get_user_activity(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get user's own activity summary."""
-    from sqlalchemy import func
-    
-    # Get event counts by type
-    event_counts = db.query(
-        EventsRaw.event_type,
-        func.count(EventsRaw.id).label('count')
-    ).filter(
-        EventsRaw.user_id == current_user.id
-    ).group_by(
-        EventsRaw.event_type
-    ).all()
+    event_breakdown = get_event_breakdown(db, current_user.id)
     
     # Get user features
     features = db.query(UserBehaviorFeatures).filter(
@@ -233,19 +318,19 @@ async def get_user_activity(
     
     return UserActivitySummary(
         user_id=current_user.id,
-        total_events=sum(row.count for row in event_counts),
+        total_events=sum(event_breakdown.values()),
         total_sessions=features.total_sessions if features else 0,
         total_group_views=features.total_group_views if features else 0,
         total_joins=features.total_joins if features else 0,
         engagement_score=features.engagement_score if features else 0.0,
-        event_breakdown={row.event_type: row.count for row in event_counts}
+        event_breakdown=event_breakdown
     )
 
 @router.get("/group-performance/{group_id}")
 async def get_group_performance(
     group_id: int,
     current_user: User = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get performance metrics for a specific group (admin only)."""
     
@@ -290,7 +375,7 @@ async def get_top_performing_groups(
     limit: int = Query(10, ge=1, le=50),
     sort_by: str = Query("popularity", regex="^(popularity|trending|conversion)$"),
     current_user: User = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get top performing groups by various metrics (admin only)."""
     
@@ -332,7 +417,7 @@ async def get_top_performing_groups(
 @router.get("/user-engagement-distribution")
 async def get_user_engagement_distribution(
     current_user: User = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get distribution of user engagement scores (admin only)."""
     from sqlalchemy import func, case
@@ -354,6 +439,47 @@ async def get_user_engagement_distribution(
         "total_users": sum(row.count for row in engagement_buckets)
     }
 
+@router.get("/daily-activity")
+async def get_daily_activity(
+    days: int = Query(30, ge=1, le=365),
+    group_id: Optional[int] = None,
+    current_user: User = Depends(verify_admin),
+    db: Session = Depends(get_read_db)
+):
+    """Daily event totals and funnel steps from the compacted rollups (admin only)."""
+    since = datetime.utcnow().date() - timedelta(days=days)
+    rollup = EventDailyGroupRollup if group_id is not None else EventDailyUserRollup
+    
+    query = db.query(
+        rollup.day,
+        func.sum(rollup.total_events).label('total_events'),
+        func.sum(rollup.unique_sessions).label('sessions'),
+        func.sum(rollup.group_views).label('group_views'),
+        func.sum(rollup.group_clicks).label('group_clicks'),
+        func.sum(rollup.joins).label('joins'),
+        func.sum(rollup.payments).label('payments'),
+    ).filter(rollup.day >= since)
+    if group_id is not None:
+        query = query.filter(EventDailyGroupRollup.group_id == group_id)
+    rows = query.group_by(rollup.day).order_by(rollup.day).all()
+    
+    return {
+        "days": days,
+        "group_id": group_id,
+        "series": [
+            {
+                "day": row.day.isoformat(),
+                "total_events": row.total_events or 0,
+                "sessions": row.sessions or 0,
+                "group_views": row.group_views or 0,
+                "group_clicks": row.group_clicks or 0,
+                "joins": row.joins or 0,
+                "payments": row.payments or 0,
+            }
+            for row in rows
+        ]
+    }
+
 @router.post("/track-recommendation-interaction")
 async def track_recommendation_interaction(
     group_id: int,
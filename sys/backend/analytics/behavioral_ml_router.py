@@ -270,7 +270,7 @@ async def extract_features_batch(
             raise HTTPException(status_code=403, detail="Admin access required")
         
         # Extract features
-        features_df = extract_behavioral_features_batch(request.user_ids, db)
+        features_df = extract_behavioral_features_batch(request.user_ids, db, window_days=request.window_days)
         
         # Convert to dict for JSON response
         features_dict = features_df.to_dict(orient='records')
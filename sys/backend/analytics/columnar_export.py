@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Columnar export of analytical tables for training and offline analytics.
+
+Writes events_raw, transactions, contributions and recommendation_events to
+day-partitioned Parquet (or Arrow IPC) files:
+
+    <ANALYTICS_EXPORT_DIR>/<table>/day=YYYY-MM-DD/part-0.parquet
+
+Each run re-exports only the days after the table's last exported day (plus a
+short overlap for tables whose rows are updated after insert), so it is cheap
+to run often. Readers load the files memory-mapped through pyarrow/pandas
+instead of pulling rows from the OLTP database.
+
+Usage (from the backend directory):
+    python -m analytics.columnar_export [--full]
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import shutil
+
+import pandas as pd
+
+from models.analytics_models import EventsRaw
+from models.models import Transaction, Contribution, RecommendationEvent
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.path.abspath(os.getenv(
+    "ANALYTICS_EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exports")
+))
+EXPORT_FORMAT = os.getenv("ANALYTICS_EXPORT_FORMAT", "parquet").lower()  # 'parquet' or 'arrow'
+# 'db' reads training/benchmark data straight from the database, 'export' from the files
+OFFLINE_DATA_SOURCE = os.getenv("OFFLINE_DATA_SOURCE", "db").lower()
+
+MANIFEST_FILE = "_manifest.json"
+
+# table name -> (model, timestamp column, exported columns, days re-exported for late updates)
+EXPORT_TABLES = {
+    "events_raw": (
+        EventsRaw, "timestamp",
+        ["event_id", "event_type", "user_id", "session_id", "timestamp", "properties",
+         "group_id", "product_id", "path", "platform"],
+        0,
+    ),
+    "transactions": (
+        Transaction, "created_at",
+        ["id", "user_id", "group_buy_id", "product_id", "quantity", "amount",
+         "transaction_type", "created_at", "location_zone", "cluster_id"],
+        0,
+    ),
+    "contributions": (
+        Contribution, "joined_at",
+        ["id", "group_buy_id", "user_id", "quantity", "contribution_amount", "paid_amount",
+         "is_fully_paid", "joined_at", "is_collected", "refund_status"],
+        7,
+    ),
+    "recommendation_events": (
+        RecommendationEvent, "shown_at",
+        ["id", "user_id", "group_buy_id", "recommendation_score", "shown_at",
+         "clicked", "clicked_at", "joined", "joined_at"],
+        7,
+    ),
+}
+
+def pyarrow_available() -> bool:
+    return pa is not None
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Columnar export requires pyarrow. Install it with: pip install pyarrow")
+
+def _table_dir(table: str) -> str:
+    return os.path.join(EXPORT_DIR, table)
+
+def _read_manifest(table: str) -> dict:
+    path = os.path.join(_table_dir(table), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _write_manifest(table: str, manifest: dict):
+    path = os.path.join(_table_dir(table), MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _select_frame(db: Session, stmt) -> pd.DataFrame:
+    """Run a Core select and return the rows as a DataFrame."""
+    result = db.execute(stmt)
+    return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+def _normalise_frame(df: pd.DataFrame, ts_col: str) -> pd.DataFrame:
+    """Make a SQL result frame Arrow-friendly: UTC-naive timestamps, JSON as text."""
+    for col in df.columns:
+        if col == ts_col or col.endswith("_at"):
+            df[col] = pd.to_datetime(df[col], utc=True, errors="coerce").dt.tz_localize(None)
+    if "properties" in df.columns:
+        df["properties"] = df["properties"].map(
+            lambda value: json.dumps(value, default=str) if value is not None else None
+        )
+    return df
+
+def _write_partition(table: str, day: date, df: pd.DataFrame):
+    """Atomically replace one day partition of a table."""
+    part_dir = os.path.join(_table_dir(table), f"day={day.isoformat()}")
+    # Leading underscore keeps readers from picking up a half-written partition
+    tmp_dir = os.path.join(_table_dir(table), f"_tmp-day={day.isoformat()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+    if EXPORT_FORMAT == "arrow":
+        feather.write_feather(arrow_table, os.path.join(tmp_dir, "part-0.arrow"), compression="uncompressed")
+    else:
+        pq.write_table(arrow_table, os.path.join(tmp_dir, "part-0.parquet"), compression="snappy")
+
+    shutil.rmtree(part_dir, ignore_errors=True)
+    os.replace(tmp_dir, part_dir)
+
+def export_table(db: Session, table: str, full: bool = False) -> int:
+    """
+    Export one table incrementally. Returns the number of rows written.
+    Days after the last exported day (minus the table's overlap) are rewritten
+    whole, so repeated runs are idempotent.
+    """
+    _require_pyarrow()
+    model, ts_name, columns, overlap_days = EXPORT_TABLES[table]
+    ts_col = getattr(model, ts_name)
+    if full:
+        shutil.rmtree(_table_dir(table), ignore_errors=True)
+    os.makedirs(_table_dir(table), exist_ok=True)
+
+    manifest = {} if full else _read_manifest(table)
+    stmt = select(*[getattr(model, c) for c in columns]).where(ts_col.isnot(None))
+    if manifest.get("last_exported_day"):
+        start_day = date.fromisoformat(manifest["last_exported_day"]) - timedelta(days=overlap_days)
+        stmt = stmt.where(ts_col >= datetime(start_day.year, start_day.month, start_day.day))
+
+    df = _select_frame(db, stmt)
+    if df.empty:
+        return 0
+
+    df = _normalise_frame(df, ts_name)
+    df = df[df[ts_name].notna()]
+    days = df[ts_name].dt.date
+    for day, day_df in df.groupby(days):
+        _write_partition(table, day, day_df.sort_values(ts_name))
+
+    manifest.update({
+        "table": table,
+        "format": EXPORT_FORMAT,
+        "last_exported_day": max(days).isoformat(),
+        "exported_at": datetime.utcnow().isoformat(),
+        "columns": columns,
+    })
+    _write_manifest(table, manifest)
+    logger.info(f"✅ Exported {len(df)} {table} rows across {days.nunique()} day partition(s)")
+    return len(df)
+
+def export_all(db: Session, tables: Optional[List[str]] = None, full: bool = False) -> Dict[str, int]:
+    """Export every analytical table (or the given subset)."""
+    results = {}
+    for table in tables or EXPORT_TABLES:
+        try:
+            results[table] = export_table(db, table, full=full)
+        except Exception as e:
+            logger.exception(f"Failed to export {table}: {e}")
+            results[table] = -1
+    return results
+
+def export_available(table: str) -> bool:
+    return pyarrow_available() and bool(_read_manifest(table))
+
+def read_export(
+    table: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Load an exported table as a DataFrame, memory-mapping the files.
+    `start`/`end` select day partitions (inclusive) without touching the others.
+    """
+    _require_pyarrow()
+    path = _table_dir(table)
+    fmt = "ipc" if _read_manifest(table).get("format") == "arrow" else "parquet"
+    dataset = ds.dataset(
+        path,
+        format=fmt,
+        partitioning=ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive"),
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+    expr = None
+    if start is not None:
+        expr = ds.field("day") >= start.isoformat()
+    if end is not None:
+        end_expr = ds.field("day") <= end.isoformat()
+        expr = end_expr if expr is None else expr & end_expr
+    wanted = columns or [name for name in dataset.schema.names if name != "day"]
+    return dataset.to_table(columns=wanted, filter=expr).to_pandas()
+
+def load_table_frame(db: Session, table: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load a whole analytical table as a DataFrame for training/benchmarks.
+    Reads the columnar export when OFFLINE_DATA_SOURCE=export (refreshing it
+    incrementally first), otherwise issues a single SQL select.
+    """
+    model, ts_name, exported, _ = EXPORT_TABLES[table]
+    columns = columns or exported
+    if OFFLINE_DATA_SOURCE == "export" and pyarrow_available():
+        try:
+            export_table(db, table)
+            if export_available(table):
+                return read_export(table, columns=columns)
+        except Exception as e:
+            logger.warning(f"Falling back to database for {table}: {e}")
+
+    df = _select_frame(db, select(*[getattr(model, c) for c in columns]))
+    return _normalise_frame(df, ts_name) if ts_name in df.columns else df
+
+
+if __name__ == "__main__":
+    import sys
+    from db.database import SessionLocal
+
+    print("=" * 70)
+    print("COLUMNAR ANALYTICS EXPORT")
+    print("=" * 70)
+    session = SessionLocal()
+    try:
+        for name, rows in export_all(session, full="--full" in sys.argv).items():
+            print(f"  {name}: {rows} rows")
+    finally:
+        session.close()
+    print(f"✅ Export written to {EXPORT_DIR}")
+    print("=" * 70)
@@ -1,17 +1,24 @@
 #!/usr/bin/env python3
 """
 Daily ETL jobs for analytics: update user behavior features, group performance metrics,
-interaction matrix, user similarities, and refresh the feature store.
+interaction matrix, user similarities, refresh the feature store, compact raw events
+into daily rollups and apply the events_raw retention policy.
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from sqlalchemy import func, distinct, insert, select, delete, union_all
+from datetime import datetime, timedelta, date
+from collections import Counter, defaultdict
+from typing import Dict, Optional
 import asyncio
 import logging
+import os
 
 from db.database import SessionLocal
 from models.analytics_models import (
     EventsRaw,
+    EventsArchive,
+    EventDailyUserRollup,
+    EventDailyGroupRollup,
     UserBehaviorFeatures,
     GroupPerformanceMetrics,
     UserGroupInteractionMatrix,
@@ -22,6 +29,19 @@ from models.models import AdminGroup, User, Transaction
 
 logger = logging.getLogger(__name__)
 
+# Raw events older than this many days are moved to events_archive (0 disables)
+EVENTS_RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("EVENTS_ARCHIVE_BATCH_SIZE", "5000"))
+# Events ingested this long before the previous compaction run are re-checked for late arrivals
+LATE_EVENT_MARGIN = timedelta(hours=1)
+
+FUNNEL_STEPS = {
+    'group_view': 'group_views',
+    'group_join_click': 'group_clicks',
+    'group_join_complete': 'joins',
+    'payment_success': 'payments',
+}
+
 def _with_session(fn):
     def wrapper(*args, **kwargs):
         db = SessionLocal()
@@ -33,7 +53,9 @@ def _with_session(fn):
 
 def update_user_features_daily(db: Session):
     """
-    Aggregate user behavior from events_raw into user_behavior_features.
+    Aggregate user behavior into user_behavior_features. Lifetime totals come
+    from the daily rollups plus the not-yet-compacted events_raw tail, so they
+    survive events being archived.
     
     NOTE: Only processes data for TRADERS (non-admin, non-supplier users)
     """
@@ -52,18 +74,20 @@ def update_user_features_daily(db: Session):
             User.is_admin == False, 
             User.is_supplier == False
         ).all()]
+        event_counts = lifetime_event_counts(db, 'user_id')
         for uid in user_ids:
             features = db.query(UserBehaviorFeatures).filter(UserBehaviorFeatures.user_id == uid).first()
             if not features:
                 features = UserBehaviorFeatures(user_id=uid)
                 db.add(features)
 
-            total_events = db.query(func.count(EventsRaw.id)).filter(EventsRaw.user_id == uid).scalar() or 0
-            total_page_views = db.query(func.count(EventsRaw.id)).filter(EventsRaw.user_id == uid, EventsRaw.event_type == 'page_view').scalar() or 0
-            total_group_views = db.query(func.count(EventsRaw.id)).filter(EventsRaw.user_id == uid, EventsRaw.event_type == 'group_view').scalar() or 0
-            total_group_clicks = db.query(func.count(EventsRaw.id)).filter(EventsRaw.user_id == uid, EventsRaw.event_type == 'group_join_click').scalar() or 0
-            total_joins = db.query(func.count(EventsRaw.id)).filter(EventsRaw.user_id == uid, EventsRaw.event_type == 'group_join_complete').scalar() or 0
-            total_payments = db.query(func.count(EventsRaw.id)).filter(EventsRaw.user_id == uid, EventsRaw.event_type == 'payment_success').scalar() or 0
+            counts = event_counts.get(uid, Counter())
+            total_events = sum(counts.values())
+            total_page_views = counts['page_view']
+            total_group_views = counts['group_view']
+            total_group_clicks = counts['group_join_click']
+            total_joins = counts['group_join_complete']
+            total_payments = counts['payment_success']
 
             features.total_events = total_events
             features.total_page_views = total_page_views
@@ -97,16 +121,21 @@ def update_group_metrics_daily(db: Session):
                 return
             raise
         
+        # Lifetime funnel counts for all groups: rollups plus the raw tail
+        event_counts = lifetime_event_counts(db, 'group_id')
+        
+        existing_metrics = {m.admin_group_id: m for m in db.query(GroupPerformanceMetrics).all()}
         group_ids = [g.id for g in db.query(AdminGroup.id).all()]
         for gid in group_ids:
-            metrics = db.query(GroupPerformanceMetrics).filter(GroupPerformanceMetrics.admin_group_id == gid).first()
+            metrics = existing_metrics.get(gid)
             if not metrics:
                 metrics = GroupPerformanceMetrics(admin_group_id=gid)
                 db.add(metrics)
 
-            total_views = db.query(func.count(EventsRaw.id)).filter(EventsRaw.event_type == 'group_view', EventsRaw.properties['group_id'].as_integer() == gid).scalar() or 0  # type: ignore
-            total_clicks = db.query(func.count(EventsRaw.id)).filter(EventsRaw.event_type == 'group_join_click', EventsRaw.properties['group_id'].as_integer() == gid).scalar() or 0  # type: ignore
-            total_joins = db.query(func.count(EventsRaw.id)).filter(EventsRaw.event_type == 'group_join_complete', EventsRaw.properties['group_id'].as_integer() == gid).scalar() or 0  # type: ignore
+            counts = event_counts.get(gid, Counter())
+            total_views = counts['group_view']
+            total_clicks = counts['group_join_click']
+            total_joins = counts['group_join_complete']
 
             metrics.total_views = total_views
             metrics.total_clicks = total_clicks
@@ -150,12 +179,288 @@ def refresh_feature_store(db: Session):
         db.rollback()
         logger.exception(f"Failed to refresh feature store: {e}")
 
+def _day_bounds(day: date):
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
+
+def _build_rollup_rows(counts, sessions, extra=None):
+    """Turn (key, event_type) -> count and key -> sessions into rollup rows."""
+    rows = {}
+    for (key, event_type), count in counts.items():
+        row = rows.setdefault(key, {"total_events": 0, "event_counts": {},
+                                    **{step: 0 for step in FUNNEL_STEPS.values()}})
+        row["total_events"] += count
+        row["event_counts"][event_type] = count
+        step = FUNNEL_STEPS.get(event_type)
+        if step:
+            row[step] = count
+    for key, row in rows.items():
+        row["unique_sessions"] = sessions.get(key, 0)
+        if extra:
+            row.update(extra.get(key, {}))
+    return rows
+
+def _events_in_day(day: date):
+    """The day's raw and archived events (the columns rollups need) as one subquery."""
+    start, end = _day_bounds(day)
+    def of(model):
+        return select(model.user_id, model.group_id, model.event_type, model.session_id).where(
+            model.timestamp >= start, model.timestamp < end
+        )
+    return union_all(of(EventsRaw), of(EventsArchive)).subquery()
+
+def compact_events_for_day(db: Session, day: date):
+    """
+    Roll one day of events up into per-user and per-group aggregates.
+    Reads archived events as well as raw ones, so a day can be recompacted
+    after retention has run. Idempotent: existing rollups for the day are replaced.
+    """
+    events = _events_in_day(day)
+
+    # Per-user aggregates
+    user_counts = {
+        (row.user_id, row.event_type): row.count
+        for row in db.query(
+            events.c.user_id, events.c.event_type, func.count().label('count')
+        ).filter(events.c.user_id.isnot(None)).group_by(events.c.user_id, events.c.event_type)
+    }
+    user_sessions = {
+        row.user_id: row.sessions
+        for row in db.query(
+            events.c.user_id, func.count(distinct(events.c.session_id)).label('sessions')
+        ).filter(events.c.user_id.isnot(None)).group_by(events.c.user_id)
+    }
+
+    # Per-group aggregates
+    group_counts = {
+        (row.group_id, row.event_type): row.count
+        for row in db.query(
+            events.c.group_id, events.c.event_type, func.count().label('count')
+        ).filter(events.c.group_id.isnot(None)).group_by(events.c.group_id, events.c.event_type)
+    }
+    group_sessions = {}
+    group_users = {}
+    for row in db.query(
+        events.c.group_id,
+        func.count(distinct(events.c.session_id)).label('sessions'),
+        func.count(distinct(events.c.user_id)).label('users'),
+    ).filter(events.c.group_id.isnot(None)).group_by(events.c.group_id):
+        group_sessions[row.group_id] = row.sessions
+        group_users[row.group_id] = {"unique_users": row.users}
+
+    db.query(EventDailyUserRollup).filter(EventDailyUserRollup.day == day).delete(synchronize_session=False)
+    db.query(EventDailyGroupRollup).filter(EventDailyGroupRollup.day == day).delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    user_rows = _build_rollup_rows(user_counts, user_sessions)
+    group_rows = _build_rollup_rows(group_counts, group_sessions, group_users)
+    if user_rows:
+        db.execute(insert(EventDailyUserRollup), [
+            {"day": day, "user_id": uid, "computed_at": now, **row} for uid, row in user_rows.items()
+        ])
+    if group_rows:
+        db.execute(insert(EventDailyGroupRollup), [
+            {"day": day, "group_id": gid, "computed_at": now, **row} for gid, row in group_rows.items()
+        ])
+    return len(user_rows), len(group_rows)
+
+ROLLUP_WATERMARK_KEY = "events_rollup_watermark"
+
+def _rollup_state(db: Session) -> Optional[FeatureStore]:
+    return db.query(FeatureStore).filter(FeatureStore.feature_key == ROLLUP_WATERMARK_KEY).first()
+
+def get_rollup_watermark(db: Session) -> Optional[date]:
+    """Last day fully compacted into rollups, or None if nothing has been compacted."""
+    record = _rollup_state(db)
+    if not record or not record.feature_value:
+        return None
+    return date.fromisoformat(record.feature_value["day"])
+
+def _last_compacted_at(record: FeatureStore) -> datetime:
+    """Start of the previous compaction run (older records only have computed_at)."""
+    compacted_at = (record.feature_value or {}).get("compacted_at")
+    if compacted_at:
+        return datetime.fromisoformat(compacted_at)
+    return (record.computed_at or datetime.utcnow()).replace(tzinfo=None)
+
+def _set_rollup_watermark(db: Session, day: date, compacted_at: datetime):
+    record = _rollup_state(db)
+    payload = {"day": day.isoformat(), "compacted_at": compacted_at.isoformat()}
+    if not record:
+        db.add(FeatureStore(feature_key=ROLLUP_WATERMARK_KEY, feature_value=payload, feature_type='system', entity_id=0))
+    else:
+        record.feature_value = payload
+        record.computed_at = datetime.utcnow()
+
+def _late_event_days(db: Session, watermark: date, since: datetime):
+    """
+    Already compacted days that received events ingested (server-side
+    created_at) since `since`. Event timestamps come from the client, so an
+    event can arrive after its day was compacted.
+    """
+    rows = db.query(distinct(EventsRaw.timestamp)).filter(
+        EventsRaw.created_at >= since,
+        EventsRaw.timestamp < _day_bounds(watermark)[1]
+    )
+    return {ts.date() for (ts,) in rows}
+
+def compact_event_rollups(db: Session, until: Optional[date] = None):
+    """
+    Compact every day of events_raw after the rollup watermark, up to (but not
+    including) `until` (default: today, so the current day stays raw).
+    Compacted days are only recomputed when late events arrived for them since
+    the previous run. Returns the number of newly compacted days.
+    """
+    try:
+        run_started = datetime.utcnow()
+        until = until or run_started.date()
+        state = _rollup_state(db)
+        watermark = get_rollup_watermark(db)
+        if watermark is not None:
+            late_days = _late_event_days(db, watermark, _last_compacted_at(state) - LATE_EVENT_MARGIN)
+            for late_day in sorted(late_days):
+                compact_events_for_day(db, late_day)
+            if late_days:
+                logger.info(f"✅ Recompacted {len(late_days)} day(s) that received late events")
+            day = watermark + timedelta(days=1)
+        else:
+            first_ts = db.query(func.min(EventsRaw.timestamp)).scalar()
+            if first_ts is None:
+                return 0
+            day = first_ts.date()
+
+        days = 0
+        while day < until:
+            compact_events_for_day(db, day)
+            _set_rollup_watermark(db, day, run_started)
+            db.commit()
+            watermark = day
+            day += timedelta(days=1)
+            days += 1
+        if watermark is not None:
+            # Records this run's start even when no new day was compacted
+            _set_rollup_watermark(db, watermark, run_started)
+            db.commit()
+        if days:
+            logger.info(f"✅ Compacted {days} day(s) of events into daily rollups")
+        return days
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Failed to compact event rollups: {e}")
+        return 0
+
+ROLLUP_MODELS = {'user_id': EventDailyUserRollup, 'group_id': EventDailyGroupRollup}
+
+def lifetime_event_counts(db: Session, key: str, entity_id: Optional[int] = None) -> Dict[int, Counter]:
+    """
+    All-time event counts by type per user (key='user_id') or group
+    (key='group_id'): compacted days come from the daily rollups, only the
+    not-yet-compacted tail is read from events_raw. Archived events are
+    counted through the rollups.
+    """
+    rollup = ROLLUP_MODELS[key]
+    rollup_key, raw_key = getattr(rollup, key), getattr(EventsRaw, key)
+    rollup_query = db.query(rollup_key, rollup.event_counts)
+    raw_query = db.query(raw_key, EventsRaw.event_type, func.count(EventsRaw.id)).filter(raw_key.isnot(None))
+    if entity_id is not None:
+        rollup_query = rollup_query.filter(rollup_key == entity_id)
+        raw_query = raw_query.filter(raw_key == entity_id)
+
+    counts = defaultdict(Counter)
+    watermark = get_rollup_watermark(db)
+    if watermark is not None:
+        for entity, event_counts in rollup_query.filter(rollup.day <= watermark):
+            counts[entity].update(event_counts or {})
+        raw_query = raw_query.filter(EventsRaw.timestamp >= _day_bounds(watermark)[1])
+    for entity, event_type, count in raw_query.group_by(raw_key, EventsRaw.event_type):
+        counts[entity][event_type] += count
+    return counts
+
+def apply_events_retention(db: Session, retention_days: int = EVENTS_RETENTION_DAYS):
+    """
+    Move raw events older than `retention_days` to events_archive, in batches.
+    Only days already covered by rollups are archived; lifetime counts read
+    those days from the rollups, and recompaction reads the archive.
+    """
+    if retention_days <= 0:
+        return 0
+    try:
+        watermark = get_rollup_watermark(db)
+        if watermark is None:
+            return 0
+        cutoff = min(
+            datetime.utcnow() - timedelta(days=retention_days),
+            _day_bounds(watermark)[1],
+        )
+
+        archived = 0
+        while True:
+            ids = [row.id for row in db.query(EventsRaw.id).filter(
+                EventsRaw.timestamp < cutoff
+            ).limit(ARCHIVE_BATCH_SIZE)]
+            if not ids:
+                break
+            db.execute(insert(EventsArchive).from_select(
+                ['id', 'event_id', 'event_type', 'user_id', 'session_id', 'timestamp', 'properties',
+                 'group_id', 'product_id', 'path'],
+                select(
+                    EventsRaw.id, EventsRaw.event_id, EventsRaw.event_type, EventsRaw.user_id,
+                    EventsRaw.session_id, EventsRaw.timestamp, EventsRaw.properties,
+                    EventsRaw.group_id, EventsRaw.product_id, EventsRaw.path,
+                ).where(EventsRaw.id.in_(ids))
+            ))
+            db.execute(delete(EventsRaw).where(EventsRaw.id.in_(ids)))
+            db.commit()
+            archived += len(ids)
+        if archived:
+            logger.info(f"✅ Archived {archived} raw events older than {retention_days} days")
+        return archived
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Failed to apply events retention: {e}")
+        return 0
+
+def update_user_similarities(db: Session):
+    """Recompute the precomputed trader neighbour table (user_similarity)."""
+    from ml.user_similarity import rebuild_user_similarity
+    return rebuild_user_similarity(db)
+
+def update_cluster_participation(db: Session):
+    """Rebuild the cluster x admin-group participation index."""
+    from ml.cluster_participation import refresh_cluster_participation
+    try:
+        refresh_cluster_participation(db)
+    except Exception as e:
+        logger.exception(f"Failed to refresh cluster participation: {e}")
+
+def refresh_behavioral_features(db: Session):
+    """Recompute every trader's behavioral ML features into the feature store."""
+    from ml.behavioral_ml_service import extract_behavioral_features_batch, store_behavioral_features
+    try:
+        trader_ids = [uid for (uid,) in db.query(User.id).filter(
+            User.is_admin == False,
+            User.is_supplier == False
+        ).order_by(User.id)]
+        stored = store_behavioral_features(db, extract_behavioral_features_batch(trader_ids, db))
+        logger.info(f"✅ Behavioral features refreshed for {stored} traders")
+        return stored
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Failed to refresh behavioral features: {e}")
+        return 0
+
 async def run_daily_analytics_jobs_once():
     db = SessionLocal()
     try:
+        # Compact first: the lifetime totals below read the rollups
+        compact_event_rollups(db)
         update_user_features_daily(db)
         update_group_metrics_daily(db)
         refresh_feature_store(db)
+        update_user_similarities(db)
+        update_cluster_participation(db)
+        refresh_behavioral_features(db)
+        apply_events_retention(db)
     finally:
         db.close()
 
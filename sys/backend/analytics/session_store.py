@@ -0,0 +1,294 @@
+"""
+Session context store fed by event ingestion.
+
+Keeps, per session_id, a bounded ring buffer of the most recent events plus
+running aggregates (event type counts for intent, category counts, price
+stats) so session-aware recommendations never have to re-read events_raw.
+
+States live in a process-local LRU with TTL eviction. Set
+SESSION_STORE_BACKEND=redis to share them across workers through Redis
+(falls back to the local store if Redis is unreachable).
+
+Ingestion batches run in the threadpool, so updates of one session are
+serialised: a per-session lock around load/add/save locally, and a
+WATCH/MULTI transaction in Redis so concurrent workers do not overwrite
+each other's events.
+"""
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory").lower()  # 'memory' or 'redis'
+SESSION_STORE_TTL_SECONDS = int(os.getenv("SESSION_STORE_TTL_SECONDS", "1800"))
+SESSION_STORE_MAX_SESSIONS = int(os.getenv("SESSION_STORE_MAX_SESSIONS", "10000"))
+SESSION_BUFFER_SIZE = int(os.getenv("SESSION_BUFFER_SIZE", "50"))
+REDIS_KEY_PREFIX = "session_ctx:"
+
+
+class SessionState:
+    """Running context of one session."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.user_id: Optional[int] = None
+        self.first_event_at: Optional[datetime] = None
+        self.last_event_at: Optional[datetime] = None
+        self.event_count = 0
+        self.recent = deque(maxlen=SESSION_BUFFER_SIZE)
+        self.event_types = Counter()
+        self.categories = Counter()
+        self.last_category: Optional[str] = None
+        self.price_count = 0
+        self.price_sum = 0.0
+        self.price_min: Optional[float] = None
+        self.price_max: Optional[float] = None
+
+    def add(self, event_type: str, timestamp: datetime, properties: Optional[dict],
+            user_id: Optional[int] = None, product_id: Optional[int] = None, group_id: Optional[int] = None):
+        props = properties or {}
+        timestamp = timestamp.replace(tzinfo=None) if timestamp else datetime.utcnow()
+        category = props.get('category')
+        price = props.get('price')
+        try:
+            price = float(price) if price is not None else None
+        except (TypeError, ValueError):
+            price = None
+
+        self.user_id = user_id or self.user_id
+        self.first_event_at = min(self.first_event_at or timestamp, timestamp)
+        self.last_event_at = max(self.last_event_at or timestamp, timestamp)
+        self.event_count += 1
+        self.event_types[event_type] += 1
+        self.recent.append({
+            "event_type": event_type,
+            "timestamp": timestamp.isoformat(),
+            "product_id": product_id if product_id is not None else props.get('product_id'),
+            "group_id": group_id if group_id is not None else props.get('group_id'),
+            "category": category,
+            "price": price,
+        })
+        if category:
+            self.categories[category] += 1
+            self.last_category = category
+        if price is not None:
+            self.price_count += 1
+            self.price_sum += price
+            self.price_min = price if self.price_min is None else min(self.price_min, price)
+            self.price_max = price if self.price_max is None else max(self.price_max, price)
+
+    def infer_intent(self) -> str:
+        """Infer user intent from the session's event types"""
+        if self.event_types['purchase_completed']:
+            return 'transactional'
+        elif self.event_types['product_search'] or self.event_types['filter_applied']:
+            return 'research'
+        elif self.event_types['group_view'] > 5:
+            return 'browsing'
+        elif self.event_types['add_to_cart']:
+            return 'consideration'
+        else:
+            return 'exploratory'
+
+    def context(self) -> Dict[str, Any]:
+        """Session context in the shape SessionBasedRecommender returns"""
+        # Snapshot under the session's lock: ingestion may be adding events
+        with _session_lock(self.session_id):
+            return self._context()
+
+    def _context(self) -> Dict[str, Any]:
+        recent = list(self.recent)
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "duration": (self.last_event_at - self.first_event_at).seconds if self.event_count else 0,
+            "event_count": self.event_count,
+            "viewed_products": [e["product_id"] for e in recent if e["product_id"] is not None],
+            "viewed_categories": [e["category"] for e in recent if e["category"]],
+            "viewed_groups": [e["group_id"] for e in recent if e["group_id"] is not None],
+            "last_category": self.last_category,
+            "top_categories": [category for category, _ in self.categories.most_common(3)],
+            "avg_price": self.price_sum / self.price_count if self.price_count else None,
+            "min_price": self.price_min,
+            "max_price": self.price_max,
+            "session_intent": self.infer_intent(),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "first_event_at": self.first_event_at.isoformat() if self.first_event_at else None,
+            "last_event_at": self.last_event_at.isoformat() if self.last_event_at else None,
+            "event_count": self.event_count,
+            "recent": list(self.recent),
+            "event_types": dict(self.event_types),
+            "categories": dict(self.categories),
+            "last_category": self.last_category,
+            "price": [self.price_count, self.price_sum, self.price_min, self.price_max],
+        })
+
+    @classmethod
+    def from_json(cls, payload: str) -> "SessionState":
+        data = json.loads(payload)
+        state = cls(data["session_id"])
+        state.user_id = data["user_id"]
+        state.first_event_at = datetime.fromisoformat(data["first_event_at"]) if data["first_event_at"] else None
+        state.last_event_at = datetime.fromisoformat(data["last_event_at"]) if data["last_event_at"] else None
+        state.event_count = data["event_count"]
+        state.recent.extend(data["recent"])
+        state.event_types.update(data["event_types"])
+        state.categories.update(data["categories"])
+        state.last_category = data["last_category"]
+        state.price_count, state.price_sum, state.price_min, state.price_max = data["price"]
+        return state
+
+
+# session_id -> (state, expires_at monotonic)
+_sessions: "OrderedDict[str, tuple]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+# Striped locks serialising load/add/save (and context snapshots) per session
+SESSION_LOCK_STRIPES = 64
+_session_locks = [threading.Lock() for _ in range(SESSION_LOCK_STRIPES)]
+
+
+def _session_lock(session_id: str) -> threading.Lock:
+    return _session_locks[hash(session_id) % SESSION_LOCK_STRIPES]
+
+
+def _redis():
+    if SESSION_STORE_BACKEND != "redis":
+        return None
+    try:
+        from db.redis_client import get_redis
+        return get_redis()
+    except Exception:
+        return None
+
+
+def _load(session_id: str) -> Optional[SessionState]:
+    r = _redis()
+    if r is not None:
+        try:
+            payload = r.get(REDIS_KEY_PREFIX + session_id)
+            if payload is not None:
+                return SessionState.from_json(payload)
+        except Exception as e:
+            logger.warning(f"Session store Redis read failed, using local store: {e}")
+    return _load_local(session_id)
+
+
+def _load_local(session_id: str) -> Optional[SessionState]:
+    with _sessions_lock:
+        entry = _sessions.get(session_id)
+        if entry is None:
+            return None
+        state, expires_at = entry
+        if expires_at < time.monotonic():
+            del _sessions[session_id]
+            return None
+        _sessions.move_to_end(session_id)
+        return state
+
+
+def _save(state: SessionState):
+    r = _redis()
+    if r is not None:
+        try:
+            r.setex(REDIS_KEY_PREFIX + state.session_id, SESSION_STORE_TTL_SECONDS, state.to_json())
+        except Exception as e:
+            logger.warning(f"Session store Redis write failed, using local store: {e}")
+    _save_local(state)
+
+
+def _save_local(state: SessionState):
+    with _sessions_lock:
+        _sessions[state.session_id] = (state, time.monotonic() + SESSION_STORE_TTL_SECONDS)
+        _sessions.move_to_end(state.session_id)
+        while len(_sessions) > SESSION_STORE_MAX_SESSIONS:
+            _sessions.popitem(last=False)
+
+
+def _add_events(state: SessionState, events: List[Any]):
+    for event in sorted(events, key=lambda e: e.timestamp):
+        state.add(event.event_type, event.timestamp, event.properties, event.user_id,
+                  getattr(event, 'product_id', None), getattr(event, 'group_id', None))
+
+
+def _update_redis(r, session_id: str, events: List[Any]) -> SessionState:
+    """Add `events` to the Redis copy of the session, retrying if another writer got there first."""
+    key = REDIS_KEY_PREFIX + session_id
+
+    def update(pipe) -> SessionState:
+        payload = pipe.get(key)
+        state = SessionState.from_json(payload) if payload is not None else SessionState(session_id)
+        _add_events(state, events)
+        pipe.multi()
+        pipe.setex(key, SESSION_STORE_TTL_SECONDS, state.to_json())
+        return state
+
+    return r.transaction(update, key, value_from_callable=True)
+
+
+def record_session_events(events: Iterable[Any]):
+    """
+    Fold newly ingested events (EventsRaw rows or anything with the same
+    attributes) into their sessions' state.
+    """
+    by_session: Dict[str, List[Any]] = {}
+    for event in events:
+        if event.session_id:
+            by_session.setdefault(event.session_id, []).append(event)
+
+    r = _redis()
+    for session_id, session_events in by_session.items():
+        with _session_lock(session_id):
+            if r is not None:
+                try:
+                    _save_local(_update_redis(r, session_id, session_events))
+                    continue
+                except Exception as e:
+                    logger.warning(f"Session store Redis update failed, using local store: {e}")
+            state = _load_local(session_id) or SessionState(session_id)
+            _add_events(state, session_events)
+            _save_local(state)
+
+
+def get_session_state(session_id: str) -> Optional[SessionState]:
+    return _load(session_id)
+
+
+def seed_session(session_id: str, events: Iterable[Any]) -> Optional[SessionState]:
+    """Rebuild a session's state from stored events (cold store after a restart)."""
+    state = SessionState(session_id)
+    _add_events(state, list(events))
+    if not state.event_count:
+        return None
+    r = _redis()
+    with _session_lock(session_id):
+        # Keep a state that ingestion recorded meanwhile instead of overwriting it
+        if r is not None:
+            try:
+                if not r.set(REDIS_KEY_PREFIX + session_id, state.to_json(), ex=SESSION_STORE_TTL_SECONDS, nx=True):
+                    return _load(session_id)
+                _save_local(state)
+                return state
+            except Exception as e:
+                logger.warning(f"Session store Redis write failed, using local store: {e}")
+        current = _load_local(session_id)
+        if current is not None:
+            return current
+        _save_local(state)
+    return state
+
+
+def clear_session_store():
+    with _sessions_lock:
+        _sessions.clear()
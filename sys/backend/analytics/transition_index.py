@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Markov (n-gram) transition index over product views.
+
+Counts, across all traders, how often each product was viewed right after a
+given context of the previous 1-3 viewed products, in product_transitions.
+The index is built in bulk from events_raw/events_archive and kept current
+by event ingestion, which carries each trader's last viewed products in the
+feature store so transitions continue across batches.
+
+Next-product lookups are two indexed queries on (ngram_order, context)
+instead of replaying every user's view history.
+
+Usage (from the backend directory):
+    python -m analytics.transition_index
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, delete, union_all
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+import os
+
+from db.upsert import upsert_insert
+from models.analytics_models import EventsRaw, EventsArchive, ProductTransition, FeatureStore
+
+logger = logging.getLogger(__name__)
+
+MAX_ORDER = 3
+VIEW_EVENT_TYPES = ('product_view', 'group_view')
+RECENT_PRODUCTS_KEY = "user:{user_id}:recent_products"
+REBUILD_BATCH_SIZE = int(os.getenv("TRANSITION_REBUILD_BATCH_SIZE", "5000"))
+KEY_CHUNK_SIZE = 500
+
+def context_key(product_ids: Sequence[int]) -> str:
+    return ",".join(str(pid) for pid in product_ids)
+
+def count_transitions(
+    product_ids: Iterable[int],
+    history: Sequence[int] = (),
+    counts: Optional[Counter] = None,
+) -> Tuple[Counter, List[int]]:
+    """
+    Count (ngram_order, context, next_product_id) transitions of a view sequence,
+    continuing from `history` (the previously viewed products).
+    Returns the counts and the new history tail.
+    """
+    counts = counts if counts is not None else Counter()
+    window = list(history)[-MAX_ORDER:]
+    for product_id in product_ids:
+        for order in range(1, len(window) + 1):
+            counts[(order, context_key(window[-order:]), product_id)] += 1
+        window = (window + [product_id])[-MAX_ORDER:]
+    return counts, window
+
+def apply_transition_counts(db: Session, counts: Counter):
+    """
+    Add transition counts onto product_transitions (no commit), as one
+    INSERT ... ON CONFLICT DO UPDATE SET count = count + n per chunk, so
+    concurrent ingestion batches sharing a transition neither lose counts nor
+    collide on idx_transition_key.
+    """
+    # Sorted, so concurrent batches lock shared rows in the same order
+    keys = sorted(counts)
+    stmt = upsert_insert(db, ProductTransition)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['ngram_order', 'context', 'next_product_id'],
+        set_={'count': ProductTransition.count + stmt.excluded.count, 'updated_at': stmt.excluded.updated_at}
+    )
+    for start in range(0, len(keys), KEY_CHUNK_SIZE):
+        now = datetime.utcnow()
+        db.execute(stmt, [
+            {'ngram_order': order, 'context': context, 'next_product_id': next_id,
+             'count': counts[(order, context, next_id)], 'updated_at': now}
+            for order, context, next_id in keys[start:start + KEY_CHUNK_SIZE]
+        ])
+
+def record_product_views(user_id: int, events: List[EventsRaw], db: Session):
+    """
+    Incrementally add the transitions of a user's newly ingested view events.
+    """
+    views = sorted(
+        (e for e in events if e.event_type in VIEW_EVENT_TYPES and e.product_id is not None),
+        key=lambda e: e.timestamp
+    )
+    if not views:
+        return
+    try:
+        key = RECENT_PRODUCTS_KEY.format(user_id=user_id)
+        # Insert-or-ignore, then lock the user's view tail until commit
+        db.execute(upsert_insert(db, FeatureStore).values(
+            feature_key=key, feature_value={"product_ids": []}, feature_type='user', entity_id=user_id
+        ).on_conflict_do_nothing(index_elements=['feature_key']))
+        record = db.query(FeatureStore).filter(FeatureStore.feature_key == key).with_for_update().one()
+
+        history = (record.feature_value or {}).get("product_ids", [])
+        counts, tail = count_transitions([e.product_id for e in views], history=history)
+        apply_transition_counts(db, counts)
+        # Reassign so the JSON column is flagged dirty
+        record.feature_value = {"product_ids": tail}
+        record.computed_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error updating product transitions for user {user_id}: {e}")
+
+def _view_stream(db: Session):
+    """(user_id, product_id) of every view event, per user in time order."""
+    def views_of(model):
+        return select(model.user_id, model.product_id, model.timestamp).where(
+            model.event_type.in_(VIEW_EVENT_TYPES),
+            model.product_id.isnot(None),
+            model.user_id.isnot(None)
+        )
+    views = union_all(views_of(EventsArchive), views_of(EventsRaw)).subquery()
+    stmt = select(views.c.user_id, views.c.product_id).order_by(views.c.user_id, views.c.timestamp)
+    return db.execute(stmt.execution_options(yield_per=REBUILD_BATCH_SIZE))
+
+def rebuild_transition_index(db: Session) -> int:
+    """
+    Recompute product_transitions and the per-user view tails from all stored
+    view events. Returns the number of transition rows written.
+    """
+    try:
+        counts: Counter = Counter()
+        tails: Dict[int, List[int]] = {}
+        current_user, sequence = None, []
+        for user_id, product_id in _view_stream(db):
+            if user_id != current_user:
+                if sequence:
+                    _, tails[current_user] = count_transitions(sequence, counts=counts)
+                current_user, sequence = user_id, []
+            sequence.append(product_id)
+        if sequence:
+            _, tails[current_user] = count_transitions(sequence, counts=counts)
+
+        db.execute(delete(ProductTransition))
+        db.execute(delete(FeatureStore).where(
+            FeatureStore.feature_key.like(RECENT_PRODUCTS_KEY.format(user_id="%"))
+        ))
+        now = datetime.utcnow()
+        rows = [
+            {'ngram_order': order, 'context': context, 'next_product_id': next_id, 'count': count, 'updated_at': now}
+            for (order, context, next_id), count in counts.items()
+        ]
+        for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+            db.bulk_insert_mappings(ProductTransition, rows[start:start + REBUILD_BATCH_SIZE])
+        db.bulk_insert_mappings(FeatureStore, [
+            {'feature_key': RECENT_PRODUCTS_KEY.format(user_id=uid), 'feature_value': {"product_ids": tail},
+             'feature_type': 'user', 'entity_id': uid, 'computed_at': now}
+            for uid, tail in tails.items()
+        ])
+        db.commit()
+        logger.info(f"✅ Rebuilt {len(rows)} product transitions from {len(tails)} users' views")
+        return len(rows)
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Failed to rebuild product transitions: {e}")
+        return 0
+
+def next_products(db: Session, recent_views: Sequence[int], top_k: int = 10) -> List[Tuple[int, float]]:
+    """
+    Most likely next products after `recent_views`, as (product_id, probability).
+    Uses the longest context (up to MAX_ORDER) seen before, backing off to shorter ones.
+    """
+    context = list(recent_views)[-MAX_ORDER:]
+    for order in range(len(context), 0, -1):
+        key = context_key(context[-order:])
+        match = (ProductTransition.ngram_order == order, ProductTransition.context == key)
+        total = db.query(func.sum(ProductTransition.count)).filter(*match).scalar()
+        if not total:
+            continue
+        rows = db.query(ProductTransition.next_product_id, ProductTransition.count).filter(*match).order_by(
+            ProductTransition.count.desc(), ProductTransition.next_product_id
+        ).limit(top_k).all()
+        return [(row.next_product_id, row.count / total) for row in rows]
+    return []
+
+
+if __name__ == "__main__":
+    from db.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"✅ Wrote {rebuild_transition_index(session)} product transitions")
+    finally:
+        session.close()
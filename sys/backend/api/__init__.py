@@ -0,0 +1 @@
+# API response pipeline initialization
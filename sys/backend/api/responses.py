@@ -0,0 +1,154 @@
+"""
+Response pipeline: fast JSON encoding and compression.
+
+* FastJSONResponse (the app's default response class) encodes with orjson
+  instead of the stdlib json module.
+* model_response(content, Model) replaces FastAPI's response_model handling
+  for list-heavy routes: it validates once (model instances the route
+  already built pass through without re-validation) and pydantic-core dumps
+  straight to JSON bytes, instead of validate -> dict -> JSON.
+* CompressionMiddleware compresses JSON/text bodies of at least
+  COMPRESSION_MIN_BYTES with brotli when the client accepts it (and the
+  brotli package is installed), otherwise gzip. Bodies over
+  COMPRESSION_THREADPOOL_BYTES are compressed off the event loop. Streamed
+  responses (file/CSV downloads) are passed through untouched.
+"""
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, List, Optional, Type
+import gzip
+import os
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_THREADPOOL_BYTES = int(os.getenv("COMPRESSION_THREADPOOL_BYTES", str(256 * 1024)))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Dynamic responses: quality 4-5 compresses better than gzip -6 at similar speed
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return jsonable_encoder(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (datetimes, UUIDs, numpy values and models included)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+@lru_cache(maxsize=None)
+def _adapter(model: Type[BaseModel], many: bool) -> TypeAdapter:
+    return TypeAdapter(List[model] if many else model)
+
+
+def model_response(content: Any, model: Type[BaseModel], status_code: int = 200,
+                   headers: Optional[dict] = None) -> Response:
+    """
+    `content` (a model, or a list of them) serialised as `response_model=model`
+    would, in one pass. Dicts and ORM objects are validated; instances of
+    `model` are not validated again.
+    """
+    adapter = _adapter(model, isinstance(content, list))
+    value = adapter.validate_python(content, from_attributes=True)
+    return Response(adapter.dump_json(value, by_alias=True), status_code=status_code,
+                    headers=headers, media_type="application/json")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """'br', 'gzip' or None for an Accept-Encoding header, honouring q=0."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: brotli/gzip for single-body responses above COMPRESSION_MIN_BYTES."""
+
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            start["headers"] = headers.raw
+            body = message.get("body", b"")
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            if len(body) >= COMPRESSION_THREADPOOL_BYTES:
+                body = await run_in_threadpool(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
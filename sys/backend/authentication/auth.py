@@ -2,7 +2,6 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
-import bcrypt
 from datetime import datetime, timedelta
 import jwt
 import os
@@ -10,6 +9,14 @@ import secrets
 from typing import List, Optional
 from db.database import get_db
 from models.models import User, PendingRegistration
+from authentication.principal_cache import get_principal
+from authentication.passwords import (
+    hash_password,
+    hash_password_async,
+    needs_rehash,
+    verify_password,
+    verify_password_async,
+)
 
 router = APIRouter()
 security = HTTPBearer()
@@ -156,17 +163,6 @@ class DeleteAccountRequest(BaseModel):
     confirmation: str  # User must type "DELETE" to confirm
 
 # Helper Functions
-def hash_password(password: str) -> str:
-    # Bcrypt has a 72-byte limit, truncate password if necessary
-    password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    password_bytes = plain_password.encode('utf-8')[:72]
-    hashed_bytes = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
-
 def validate_password_strength(password: str) -> bool:
     """Validate password meets security requirements"""
     if len(password) < 8:
@@ -203,6 +199,15 @@ def generate_otp() -> str:
     """Generate a 6-digit OTP code"""
     return ''.join([str(secrets.randbelow(10)) for _ in range(6)])
 
+def refresh_preference_index(user: User):
+    """Keep the cold-start recommender's in-memory preference index in sync"""
+    try:
+        # Imported lazily: the ml package imports this module
+        from ml.user_similarity import update_preference_index
+        update_preference_index(user)
+    except Exception as e:
+        print(f"⚠️ Failed to refresh preference index for user {user.id}: {e}")
+
 def send_otp_email(user_email: str, user_name: str, otp_code: str) -> dict:
     """Send OTP code via email"""
     try:
@@ -295,7 +300,7 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security),
         if user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = get_principal(db, user_id)
         if user is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
         
@@ -313,7 +318,7 @@ def verify_token_string(token: str, db: Session):
         if user_id is None:
             return None
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = get_principal(db, user_id)
         if user is None:
             return None
         
@@ -364,7 +369,7 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     # Create pending registration (user not created yet!)
     pending_registration = PendingRegistration(
         email=user_data.email,
-        hashed_password=hash_password(user_data.password),
+        hashed_password=await hash_password_async(user_data.password),
         full_name=user_data.full_name,
         location_zone=user_data.location_zone,
         preferred_categories=user_data.preferred_categories,
@@ -495,6 +500,7 @@ async def verify_otp(request: VerifyOTPRequest, db: Session = Depends(get_db)):
     db.delete(pending)  # Remove pending registration
     db.commit()
     db.refresh(new_user)
+    refresh_preference_index(new_user)
     
     # Create access token for immediate login
     access_token = create_access_token({"user_id": new_user.id, "email": new_user.email})
@@ -565,9 +571,14 @@ async def resend_otp(request: ResendOTPRequest, db: Session = Depends(get_db)):
 async def login(credentials: UserLogin, db: Session = Depends(get_db)):
     # Find user
     user = db.query(User).filter(User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    if not user or not await verify_password_async(credentials.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     
+    # Upgrade hashes made with an older, cheaper bcrypt cost
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password_async(credentials.password)
+        db.commit()
+    
     # Check if email is verified
     if not user.email_verified:
         raise HTTPException(
@@ -654,6 +665,7 @@ async def update_profile(
     
     db.commit()
     db.refresh(user)
+    refresh_preference_index(user)
     
     return UserProfile.from_orm(user)
 
@@ -676,7 +688,7 @@ async def change_password(
 ):
     """Change user's password"""
     # Verify current password
-    if not verify_password(password_data.current_password, user.hashed_password):
+    if not await verify_password_async(password_data.current_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -690,7 +702,7 @@ async def change_password(
         )
     
     # Hash and update password
-    user.hashed_password = hash_password(password_data.new_password)
+    user.hashed_password = await hash_password_async(password_data.new_password)
     db.commit()
     
     return {"message": "Password changed successfully"}
@@ -706,7 +718,7 @@ async def delete_account(
     Requires password verification and confirmation text
     """
     # Verify password
-    if not verify_password(request.password, user.hashed_password):
+    if not await verify_password_async(request.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect password"
@@ -844,7 +856,7 @@ async def reset_password(
         )
     
     # Update password and clear reset token
-    user.hashed_password = hash_password(request.new_password)
+    user.hashed_password = await hash_password_async(request.new_password)
     user.password_reset_token = None
     user.password_reset_expires = None
     db.commit()
@@ -1066,7 +1078,7 @@ async def register_supplier(supplier_data: SupplierRegister, db: Session = Depen
     # Create pending registration for supplier
     pending_registration = PendingRegistration(
         email=supplier_data.email,
-        hashed_password=hash_password(supplier_data.password),
+        hashed_password=await hash_password_async(supplier_data.password),
         full_name=supplier_data.full_name,
         location_zone=supplier_data.location_zone,
         is_supplier=True,
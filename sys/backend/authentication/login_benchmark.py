@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark.
+
+Fires concurrent logins at the /login handler against an in-memory database
+and, alongside, a heartbeat task that measures how long the event loop is
+stalled (the delay every other request and WebSocket would see). Run once
+with bcrypt offloaded to the password pool and once with it inline on the
+loop, for comparison.
+
+Usage (from the backend directory):
+    python -m authentication.login_benchmark [--logins 200] [--concurrency 50] [--rounds 12]
+"""
+from typing import Dict
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+HEARTBEAT_SECONDS = 0.01
+
+
+def _setup(users: int, rounds: int):
+    from db.database import Base
+    from models.models import User
+    from authentication.passwords import hash_password
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    hashed = hash_password("Benchmark123", rounds=rounds)
+    db.add_all([
+        User(email=f"trader{i}@example.com", hashed_password=hashed, full_name=f"Trader {i}",
+             location_zone="HARARE", email_verified=True)
+        for i in range(users)
+    ])
+    db.commit()
+    db.close()
+    return factory
+
+
+async def _heartbeat(stalls: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        stalls.append(loop.time() - started - HEARTBEAT_SECONDS)
+
+
+async def _run(factory, users: int, logins: int, concurrency: int, offload: bool) -> Dict[str, float]:
+    from authentication import auth
+    from authentication.passwords import verify_password
+
+    async def inline_verify(plain, hashed):
+        return verify_password(plain, hashed)
+
+    latencies, stalls = [], []
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one_login(i):
+        async with limit:
+            db = factory()
+            started = time.perf_counter()
+            try:
+                await auth.login(auth.UserLogin(email=f"trader{i % users}@example.com", password="Benchmark123"), db)
+            finally:
+                db.close()
+            latencies.append(time.perf_counter() - started)
+
+    original = auth.verify_password_async
+    if not offload:
+        auth.verify_password_async = inline_verify
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(stalls, stop))
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one_login(i) for i in range(logins)))
+    finally:
+        elapsed = time.perf_counter() - started
+        auth.verify_password_async = original
+        stop.set()
+        await heartbeat
+
+    latencies.sort()
+    return {
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(logins / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+        "max_loop_stall_ms": round(max(stalls, default=0.0) * 1000, 1),
+    }
+
+
+def run_login_benchmark(logins: int = 200, concurrency: int = 50, users: int = 20,
+                        rounds: int = None, offload: bool = True) -> Dict[str, float]:
+    """Benchmark `logins` logins, `concurrency` at a time; returns throughput and stall stats."""
+    from authentication import passwords
+
+    # Benchmark at the given cost without triggering rehash-on-login
+    configured = passwords.BCRYPT_ROUNDS
+    passwords.BCRYPT_ROUNDS = rounds or configured
+    try:
+        factory = _setup(users, passwords.BCRYPT_ROUNDS)
+        return asyncio.run(_run(factory, users, logins, concurrency, offload))
+    finally:
+        passwords.BCRYPT_ROUNDS = configured
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login throughput benchmark")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=None)
+    args = parser.parse_args()
+
+    for label, offload in [("password pool", True), ("inline on event loop", False)]:
+        result = run_login_benchmark(args.logins, args.concurrency, args.users, args.rounds, offload)
+        print(f"📊 {label}: {result['logins_per_second']} logins/s, p50 {result['p50_ms']} ms, "
+              f"p95 {result['p95_ms']} ms, max event-loop stall {result['max_loop_stall_ms']} ms")
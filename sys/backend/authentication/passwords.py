@@ -0,0 +1,64 @@
+"""
+Password hashing off the event loop.
+
+bcrypt costs tens to hundreds of milliseconds of CPU per hash or check, so
+the async auth routes hand it to a small, bounded thread pool (bcrypt
+releases the GIL while hashing) instead of freezing every other request and
+WebSocket while it runs. At most PASSWORD_HASH_WORKERS hashes run at once;
+further requests wait their turn without blocking the loop.
+
+The work factor is BCRYPT_ROUNDS. Hashes made with a lower cost are upgraded
+on the next successful login (see needs_rehash).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import os
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Bcrypt only uses the first 72 bytes of a password
+MAX_PASSWORD_BYTES = 72
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+def hash_password(password: str, rounds: int = None) -> str:
+    password_bytes = password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    password_bytes = plain_password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+    try:
+        return bcrypt.checkpw(password_bytes, hashed_password.encode('utf-8'))
+    except ValueError:
+        # Malformed or non-bcrypt hash
+        return False
+
+
+def hash_rounds(hashed_password: str) -> int:
+    """Work factor of a stored bcrypt hash ($2b$<rounds>$...), 0 if unreadable."""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return hash_rounds(hashed_password) < BCRYPT_ROUNDS
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, verify_password, plain_password, hashed_password
+    )
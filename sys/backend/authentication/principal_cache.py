@@ -0,0 +1,221 @@
+"""
+Authenticated-principal cache for verify_token / verify_token_string.
+
+Caches each user's column values (minus secrets such as the password hash
+and reset token, see EXCLUDED_COLUMNS) so authenticated
+requests can skip the users lookup. Entries are keyed by user id plus a
+per-user version stamp and a global generation:
+
+    auth_user:<generation>:<user_id>:<version>
+
+Any committed insert/update/delete of a User through the ORM (profile
+updates, role/active toggles, password changes, account deletion, cluster
+reassignment at training) bumps that user's version, so stale entries are
+never read again. Bulk changes can call invalidate_all_principals().
+
+Entries live in a process-local TTL/LRU. Set AUTH_CACHE_BACKEND=redis to add
+a shared Redis tier; versions then live in Redis too, so an invalidation in
+one worker is seen by all (falls back to the local tier if Redis is down).
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+import copy
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import DateTime, event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models.models import User
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_BACKEND = os.getenv("AUTH_CACHE_BACKEND", "memory").lower()  # 'memory', 'redis' or 'off'
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+REDIS_KEY_PREFIX = "auth_user:"
+REDIS_VERSION_PREFIX = "auth_user_ver:"
+REDIS_GENERATION_KEY = "auth_user_gen"
+# Commits touching more users than this (e.g. re-clustering) drop the whole cache
+BULK_INVALIDATION_THRESHOLD = 500
+
+# Never cached (credentials and financial identifiers stay out of the local and
+# Redis tiers): read lazily from the database by the few routes that need them
+EXCLUDED_COLUMNS = {
+    "hashed_password", "password_reset_token", "password_reset_expires",
+    "bank_account_number", "tax_id",
+}
+CACHED_COLUMNS = [c for c in User.__table__.columns if c.key not in EXCLUDED_COLUMNS]
+DATETIME_COLUMNS = {c.key for c in CACHED_COLUMNS if isinstance(c.type, DateTime)}
+
+# user_id -> (version, values, expires_at monotonic)
+_entries: "OrderedDict[int, tuple]" = OrderedDict()
+_local_versions: Dict[int, int] = {}
+_local_generation = 0
+_lock = threading.Lock()
+
+
+def _redis():
+    if AUTH_CACHE_BACKEND != "redis":
+        return None
+    try:
+        from db.redis_client import get_redis
+        return get_redis()
+    except Exception:
+        return None
+
+
+def _stamp(user_id: int) -> tuple:
+    """(generation, version) the user's cache entry must carry to be valid."""
+    r = _redis()
+    if r is not None:
+        try:
+            generation, version = r.mget(REDIS_GENERATION_KEY, f"{REDIS_VERSION_PREFIX}{user_id}")
+            return int(generation or 0), int(version or 0)
+        except Exception as e:
+            logger.warning(f"Auth cache Redis read failed, using local tier: {e}")
+    with _lock:
+        return _local_generation, _local_versions.get(user_id, 0)
+
+
+def _snapshot(user: User) -> Dict[str, Any]:
+    return {c.key: copy.deepcopy(getattr(user, c.key)) for c in CACHED_COLUMNS}
+
+
+def _to_json(values: Dict[str, Any]) -> str:
+    return json.dumps({k: v.isoformat() if k in DATETIME_COLUMNS and v is not None else v for k, v in values.items()})
+
+
+def _from_json(payload: str) -> Dict[str, Any]:
+    values = json.loads(payload)
+    for key in DATETIME_COLUMNS:
+        if values.get(key):
+            values[key] = datetime.fromisoformat(values[key])
+    return values
+
+
+def _lookup(user_id: int, stamp: tuple) -> Optional[Dict[str, Any]]:
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None:
+            entry_stamp, values, expires_at = entry
+            if entry_stamp == stamp and expires_at >= time.monotonic():
+                _entries.move_to_end(user_id)
+                return values
+            del _entries[user_id]
+
+    r = _redis()
+    if r is not None:
+        try:
+            payload = r.get(f"{REDIS_KEY_PREFIX}{stamp[0]}:{user_id}:{stamp[1]}")
+            if payload is not None:
+                values = _from_json(payload)
+                _store_local(user_id, stamp, values)
+                return values
+        except Exception as e:
+            logger.warning(f"Auth cache Redis read failed, using local tier: {e}")
+    return None
+
+
+def _store_local(user_id: int, stamp: tuple, values: Dict[str, Any]):
+    with _lock:
+        _entries[user_id] = (stamp, values, time.monotonic() + AUTH_CACHE_TTL_SECONDS)
+        _entries.move_to_end(user_id)
+        while len(_entries) > AUTH_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def _store(user_id: int, stamp: tuple, values: Dict[str, Any]):
+    _store_local(user_id, stamp, values)
+    r = _redis()
+    if r is not None:
+        try:
+            r.setex(f"{REDIS_KEY_PREFIX}{stamp[0]}:{user_id}:{stamp[1]}", AUTH_CACHE_TTL_SECONDS, _to_json(values))
+        except Exception as e:
+            logger.warning(f"Auth cache Redis write failed: {e}")
+
+
+def get_principal(db: Session, user_id: int) -> Optional[User]:
+    """
+    The User for an authenticated request, attached to `db` without a query
+    when cached. Routes can read, lazy-load relationships and modify it as if
+    it had been queried.
+    """
+    if AUTH_CACHE_BACKEND == "off":
+        return db.query(User).filter(User.id == user_id).first()
+
+    stamp = _stamp(user_id)
+    values = _lookup(user_id, stamp)
+    record_cache("principal", values is not None)
+    if values is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is not None:
+            _store(user_id, stamp, _snapshot(user))
+        return user
+
+    user = User(**copy.deepcopy(values))
+    make_transient_to_detached(user)
+    # Reuses the session's instance if it already holds this user
+    return db.merge(user, load=False)
+
+
+def invalidate_principal(user_id: int):
+    """Bump a user's version so cached entries for it are ignored."""
+    with _lock:
+        _local_versions[user_id] = _local_versions.get(user_id, 0) + 1
+        _entries.pop(user_id, None)
+    r = _redis()
+    if r is not None:
+        try:
+            r.incr(f"{REDIS_VERSION_PREFIX}{user_id}")
+        except Exception as e:
+            logger.warning(f"Auth cache Redis invalidation failed for user {user_id}: {e}")
+
+
+def invalidate_all_principals():
+    """Drop every cached principal (e.g. after bulk updates of users)."""
+    global _local_generation
+    with _lock:
+        _local_generation += 1
+        _entries.clear()
+    r = _redis()
+    if r is not None:
+        try:
+            r.incr(REDIS_GENERATION_KEY)
+        except Exception as e:
+            logger.warning(f"Auth cache Redis invalidation failed: {e}")
+
+
+def clear_principal_cache():
+    with _lock:
+        _entries.clear()
+        _local_versions.clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context):
+    changed: Set[int] = session.info.setdefault("changed_user_ids", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session):
+    # After commit, so a concurrent request cannot re-cache the pre-commit row
+    changed = session.info.pop("changed_user_ids", ())
+    if len(changed) > BULK_INVALIDATION_THRESHOLD:
+        invalidate_all_principals()
+        return
+    for user_id in changed:
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session: Session):
+    session.info.pop("changed_user_ids", None)
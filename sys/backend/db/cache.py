@@ -0,0 +1,439 @@
+"""
+Two-tier cache for expensive, JSON-serialisable results.
+
+    @cached(ttl_seconds=300, key="products:{is_active}:{category}", tags=["products"])
+    def list_products(db, is_active, category): ...
+
+    invalidate_tags("products")          # or tag_model_changes(Product, ...)
+
+* Keys are stable across processes: an explicit template (or callable) over
+  the call's arguments, or by default a SHA-1 of the function and its
+  JSON-encoded arguments. Sessions (db/adb/session, Session, AsyncSession)
+  are left out, so every request's call shares one entry.
+* L1 is an in-process TTL/LRU (CACHE_L1_MAX_ENTRIES entries, at most
+  CACHE_L1_TTL_SECONDS old) in front of Redis, which all workers share.
+* Single-flight: concurrent misses on a key are computed once per process
+  (the rest wait for that result), and once across processes via a short
+  Redis lock. Waiters give up after CACHE_LOCK_WAIT_SECONDS and compute it
+  themselves.
+* Tags: an entry records the versions of its tags (group:{id}, user:{id})
+  when computed; invalidate_tags() bumps them so the entry is not served
+  again. Other workers' L1 copies age out within CACHE_L1_TTL_SECONDS.
+* If Redis errors (or CACHE_BACKEND=memory) the cache runs L1-only, and
+  retries Redis after CACHE_REDIS_RETRY_SECONDS.
+
+Every call returns the JSON round trip of the result, hit or miss, so
+callers see the same types either way.
+"""
+from collections import OrderedDict
+from datetime import date, datetime
+from enum import Enum
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis").lower()  # 'redis' or 'memory'
+CACHE_L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "2048"))
+CACHE_L1_TTL_SECONDS = float(os.getenv("CACHE_L1_TTL_SECONDS", "10"))
+CACHE_LOCK_SECONDS = float(os.getenv("CACHE_LOCK_SECONDS", "30"))
+CACHE_LOCK_WAIT_SECONDS = float(os.getenv("CACHE_LOCK_WAIT_SECONDS", "5"))
+CACHE_REDIS_RETRY_SECONDS = float(os.getenv("CACHE_REDIS_RETRY_SECONDS", "30"))
+KEY_PREFIX = "cache:"
+TAG_PREFIX = "cache_tag:"
+LOCK_PREFIX = "cache_lock:"
+LOCK_POLL_SECONDS = 0.05
+SESSION_PARAMS = {"db", "adb", "session"}
+
+KeySpec = Union[str, Callable[..., str], None]
+TagSpec = Union[Iterable[str], Callable[..., Iterable[str]], None]
+
+_MISS = object()
+
+# key -> (payload, local tag versions, expires_at monotonic)
+_l1: "OrderedDict[str, tuple]" = OrderedDict()
+_local_tag_versions: Dict[str, int] = {}
+_inflight: Dict[str, threading.Event] = {}
+_async_inflight: Dict[str, asyncio.Future] = {}
+_lock = threading.Lock()
+_redis_down_until = 0.0
+
+# model class -> tags to invalidate when one of its rows changes
+_model_tags: Dict[type, Callable[[Any], Iterable[str]]] = {}
+
+
+def _redis():
+    if CACHE_BACKEND != "redis" or time.monotonic() < _redis_down_until:
+        return None
+    try:
+        from db.redis_client import get_redis
+        return get_redis()
+    except Exception as e:
+        _redis_failed(e)
+        return None
+
+
+def _redis_failed(error: Exception):
+    global _redis_down_until
+    if time.monotonic() >= _redis_down_until:
+        logger.warning(f"⚠️ Cache Redis unavailable ({error}); using the in-process cache for "
+                       f"{CACHE_REDIS_RETRY_SECONDS:.0f}s")
+    _redis_down_until = time.monotonic() + CACHE_REDIS_RETRY_SECONDS
+
+
+# === KEYS ===
+
+def _encode_argument(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if hasattr(value, "__table__") and getattr(value, "id", None) is not None:
+        return f"{type(value).__name__}:{value.id}"
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Cannot build a cache key from {type(value).__name__}; pass key= to @cached")
+
+
+def _is_session(name: str, value) -> bool:
+    return name in SESSION_PARAMS or isinstance(value, (Session, AsyncSession))
+
+
+def stable_key(name: str, arguments: Dict[str, Any]) -> str:
+    """`name:<sha1 of the non-session arguments>`, identical in every process."""
+    kept = {k: v for k, v in arguments.items() if not _is_session(k, v)}
+    encoded = json.dumps(kept, sort_keys=True, default=_encode_argument)
+    return f"{name}:{hashlib.sha1(encoded.encode('utf-8')).hexdigest()}"
+
+
+def _render(spec, arguments: Dict[str, Any]):
+    if callable(spec):
+        return spec(**arguments)
+    if isinstance(spec, str):
+        return spec.format(**arguments)
+    return [tag.format(**arguments) for tag in spec]
+
+
+# === L1 ===
+
+def _local_versions(tags: List[str]) -> Tuple[int, ...]:
+    with _lock:
+        return tuple(_local_tag_versions.get(tag, 0) for tag in tags)
+
+
+def _l1_get(key: str, tags: List[str]):
+    with _lock:
+        entry = _l1.get(key)
+        if entry is None:
+            return _MISS
+        payload, versions, expires_at = entry
+        if expires_at < time.monotonic() or versions != tuple(_local_tag_versions.get(t, 0) for t in tags):
+            del _l1[key]
+            return _MISS
+        _l1.move_to_end(key)
+        return payload
+
+
+def _l1_set(key: str, payload: str, versions: Tuple[int, ...], ttl_seconds: float):
+    with _lock:
+        _l1[key] = (payload, versions, time.monotonic() + min(ttl_seconds, CACHE_L1_TTL_SECONDS))
+        _l1.move_to_end(key)
+        while len(_l1) > CACHE_L1_MAX_ENTRIES:
+            _l1.popitem(last=False)
+
+
+# === REDIS ===
+
+def _redis_get(r, key: str, tags: List[str]):
+    """(payload or _MISS, current Redis tag versions)."""
+    pipe = r.pipeline(transaction=False)
+    pipe.get(KEY_PREFIX + key)
+    if tags:
+        pipe.mget([TAG_PREFIX + tag for tag in tags])
+    results = pipe.execute()
+    versions = [int(v or 0) for v in results[1]] if tags else []
+    if results[0] is None:
+        return _MISS, versions
+    entry = json.loads(results[0])
+    if entry.get("t") != versions:
+        return _MISS, versions
+    return entry["p"], versions
+
+
+class _Lookup:
+    """State of one cache read: what was found and the tag versions seen before computing."""
+
+    def __init__(self, key: str, tags: List[str]):
+        self.key = key
+        self.tags = tags
+        self.local_versions = _local_versions(tags)
+        self.redis_versions: Optional[List[int]] = None
+
+    def get(self):
+        payload = _l1_get(self.key, self.tags)
+        if payload is not _MISS:
+            return payload
+        r = _redis()
+        if r is None:
+            return _MISS
+        try:
+            payload, self.redis_versions = _redis_get(r, self.key, self.tags)
+        except Exception as e:
+            _redis_failed(e)
+            return _MISS
+        if payload is not _MISS:
+            _l1_set(self.key, payload, self.local_versions, CACHE_L1_TTL_SECONDS)
+        return payload
+
+    def store(self, payload: str, ttl_seconds: float):
+        _l1_set(self.key, payload, self.local_versions, ttl_seconds)
+        r = _redis()
+        if r is None or self.redis_versions is None:
+            return
+        try:
+            r.set(KEY_PREFIX + self.key, json.dumps({"p": payload, "t": self.redis_versions}),
+                  px=max(1, int(ttl_seconds * 1000)))
+        except Exception as e:
+            _redis_failed(e)
+
+    def try_lock(self) -> Optional[str]:
+        """Take the cross-process compute lock; a token to release it with, '' without Redis, None if held."""
+        r = _redis()
+        if r is None:
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            if r.set(LOCK_PREFIX + self.key, token, nx=True, px=int(CACHE_LOCK_SECONDS * 1000)):
+                return token
+            return None
+        except Exception as e:
+            _redis_failed(e)
+            return ""
+
+    def unlock(self, token: str):
+        r = _redis()
+        if not token or r is None:
+            return
+        try:
+            if r.get(LOCK_PREFIX + self.key) == token:
+                r.delete(LOCK_PREFIX + self.key)
+        except Exception as e:
+            _redis_failed(e)
+
+
+def _encode(result) -> str:
+    return json.dumps(result, default=str)
+
+
+# === DECORATOR ===
+
+def cached(ttl_seconds: float = 300, key: KeySpec = None, tags: TagSpec = None,
+           make_key: Optional[Callable[..., str]] = None):
+    """
+    Cache a function's (JSON-serialisable) result for `ttl_seconds`.
+
+    key: template over the call's arguments ("group:{group_id}") or a callable
+    taking them as keyword arguments; default: a hash of the non-session
+    arguments. make_key(*args, **kwargs) is still accepted. tags: templates
+    or a callable, e.g. ["group:{group_id}"], for invalidate_tags().
+    Works on plain and async functions; `fn.invalidate(*args, **kwargs)`
+    drops one call's entry.
+    """
+    def decorator(fn: Callable[..., Any]):
+        signature = inspect.signature(fn)
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        def lookup_for(args, kwargs) -> _Lookup:
+            if make_key is not None:
+                arguments = None
+                cache_key = make_key(*args, **kwargs)
+            else:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = dict(bound.arguments)
+                cache_key = _render(key, arguments) if key is not None else stable_key(name, arguments)
+            if tags is None:
+                entry_tags = []
+            else:
+                if arguments is None:
+                    bound = signature.bind(*args, **kwargs)
+                    bound.apply_defaults()
+                    arguments = dict(bound.arguments)
+                entry_tags = sorted(set(_render(tags, arguments)))
+            return _Lookup(cache_key, entry_tags)
+
+        def invalidate(*args, **kwargs):
+            invalidate_key(lookup_for(args, kwargs).key)
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                lookup = lookup_for(args, kwargs)
+                payload = lookup.get()
+                record_cache(fn.__name__, payload is not _MISS)
+                if payload is not _MISS:
+                    return json.loads(payload)
+
+                waiting = _async_inflight.get(lookup.key)
+                if waiting is not None:
+                    try:
+                        return json.loads(await asyncio.wait_for(asyncio.shield(waiting), CACHE_LOCK_WAIT_SECONDS))
+                    except Exception:
+                        pass  # Leader failed or is slow: compute it ourselves
+                    return json.loads(_encode(await fn(*args, **kwargs)))
+
+                leader = asyncio.get_running_loop().create_future()
+                _async_inflight[lookup.key] = leader
+                try:
+                    token = lookup.try_lock()
+                    deadline = time.monotonic() + CACHE_LOCK_WAIT_SECONDS
+                    while token is None and time.monotonic() < deadline:
+                        await asyncio.sleep(LOCK_POLL_SECONDS)
+                        payload = lookup.get()
+                        if payload is not _MISS:
+                            leader.set_result(payload)
+                            return json.loads(payload)
+                    try:
+                        payload = _encode(await fn(*args, **kwargs))
+                        lookup.store(payload, ttl_seconds)
+                    finally:
+                        lookup.unlock(token)
+                    leader.set_result(payload)
+                    return json.loads(payload)
+                except BaseException as e:
+                    if not leader.done():
+                        leader.set_exception(e)
+                        leader.exception()  # Mark retrieved; waiters recompute
+                    raise
+                finally:
+                    _async_inflight.pop(lookup.key, None)
+
+            async_wrapper.invalidate = invalidate
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            lookup = lookup_for(args, kwargs)
+            payload = lookup.get()
+            record_cache(fn.__name__, payload is not _MISS)
+            if payload is not _MISS:
+                return json.loads(payload)
+
+            with _lock:
+                waiting = _inflight.get(lookup.key)
+                if waiting is None:
+                    _inflight[lookup.key] = leader = threading.Event()
+            if waiting is not None:
+                waiting.wait(CACHE_LOCK_WAIT_SECONDS)
+                payload = _l1_get(lookup.key, lookup.tags)
+                if payload is not _MISS:
+                    return json.loads(payload)
+                # Leader failed or is slow: compute it ourselves
+                return json.loads(_encode(fn(*args, **kwargs)))
+
+            try:
+                token = lookup.try_lock()
+                deadline = time.monotonic() + CACHE_LOCK_WAIT_SECONDS
+                while token is None and time.monotonic() < deadline:
+                    time.sleep(LOCK_POLL_SECONDS)
+                    payload = lookup.get()
+                    if payload is not _MISS:
+                        return json.loads(payload)
+                try:
+                    payload = _encode(fn(*args, **kwargs))
+                    lookup.store(payload, ttl_seconds)
+                finally:
+                    lookup.unlock(token)
+                return json.loads(payload)
+            finally:
+                with _lock:
+                    _inflight.pop(lookup.key, None)
+                leader.set()
+
+        wrapper.invalidate = invalidate
+        return wrapper
+    return decorator
+
+
+# === INVALIDATION ===
+
+def invalidate_key(key: str):
+    with _lock:
+        _l1.pop(key, None)
+    r = _redis()
+    if r is not None:
+        try:
+            r.delete(KEY_PREFIX + key)
+        except Exception as e:
+            _redis_failed(e)
+
+
+def invalidate_tags(*tags: str):
+    """Stop serving every entry carrying any of `tags` (in all workers)."""
+    if not tags:
+        return
+    with _lock:
+        for tag in tags:
+            _local_tag_versions[tag] = _local_tag_versions.get(tag, 0) + 1
+    r = _redis()
+    if r is not None:
+        try:
+            pipe = r.pipeline(transaction=False)
+            for tag in tags:
+                pipe.incr(TAG_PREFIX + tag)
+            pipe.execute()
+        except Exception as e:
+            _redis_failed(e)
+
+
+def tag_model_changes(model: type, tags_for: Callable[[Any], Iterable[str]]):
+    """Invalidate tags_for(row) after any commit that inserts, updates or deletes a `model` row."""
+    _model_tags[model] = tags_for
+
+
+def clear_cache():
+    """Drop the in-process tier and retry Redis on the next call (tests, admin resets)."""
+    global _redis_down_until
+    with _lock:
+        _l1.clear()
+        _local_tag_versions.clear()
+    _redis_down_until = 0.0
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tags(session: Session, flush_context):
+    if not _model_tags:
+        return
+    changed = session.info.setdefault("changed_cache_tags", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags_for = _model_tags.get(type(obj))
+        if tags_for is not None:
+            changed.update(tags_for(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_tags(session: Session):
+    # After commit, so a concurrent request cannot re-cache the pre-commit rows
+    invalidate_tags(*session.info.pop("changed_cache_tags", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_tags(session: Session):
+    session.info.pop("changed_cache_tags", None)
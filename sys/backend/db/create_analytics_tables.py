@@ -12,10 +12,14 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db.database import engine, Base
 from models.analytics_models import (
     EventsRaw,
+    EventsArchive,
+    EventDailyUserRollup,
+    EventDailyGroupRollup,
     UserBehaviorFeatures,
     GroupPerformanceMetrics,
     UserGroupInteractionMatrix,
     UserSimilarity,
+    ProductTransition,
     FeatureStore,
     SessionMetrics,
     SearchQuery,
@@ -28,10 +32,14 @@ def create_analytics_tables():
     # Import all models to ensure they're registered with Base
     tables_to_create = [
         EventsRaw.__table__,
+        EventsArchive.__table__,
+        EventDailyUserRollup.__table__,
+        EventDailyGroupRollup.__table__,
         UserBehaviorFeatures.__table__,
         GroupPerformanceMetrics.__table__,
         UserGroupInteractionMatrix.__table__,
         UserSimilarity.__table__,
+        ProductTransition.__table__,
         FeatureStore.__table__,
         SessionMetrics.__table__,
         SearchQuery.__table__,
@@ -1,9 +1,15 @@
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 
+from db.read_routing import mark_replica_down, use_replica, use_replica_async
+
 load_dotenv()
 
 # Use SQLite for local development (change to PostgreSQL for production)
@@ -42,10 +48,53 @@ def get_db():
     finally:
         db.close()
 
-# Optional read-replica support for analytics-heavy reads
+# Async engine for hot read endpoints, so a slow query does not block the
+# event loop (asyncpg for PostgreSQL, aiosqlite for local SQLite)
+def to_async_url(url: str):
+    async_url = make_url(url)
+    connect_args = {}
+    if async_url.get_backend_name() == "sqlite":
+        async_url = async_url.set(drivername="sqlite+aiosqlite")
+    elif async_url.get_backend_name() == "postgresql":
+        async_url = async_url.set(drivername="postgresql+asyncpg")
+        # asyncpg takes ssl=... instead of libpq's sslmode
+        if "sslmode" in async_url.query:
+            connect_args["ssl"] = async_url.query["sslmode"]
+            async_url = async_url.difference_update_query(["sslmode"])
+    return async_url, connect_args
+
+ASYNC_DATABASE_URL, async_connect_args = to_async_url(os.getenv("ASYNC_DATABASE_URL", DATABASE_URL))
+async_engine = None
+AsyncSessionLocal = None
+try:
+    if is_sqlite:
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=async_connect_args, pool_pre_ping=True)
+    else:
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            connect_args=async_connect_args,
+            pool_pre_ping=True,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE
+        )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+except ImportError as e:
+    print(f"⚠️ Async database driver not installed ({e}); async read endpoints are unavailable")
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database driver not installed (pip install aiosqlite asyncpg)")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Optional read-replica support for read-only endpoints (routing in db/read_routing.py)
 READ_REPLICA_URL = os.getenv("READ_REPLICA_URL")
 read_engine = None
 ReadSessionLocal = None
+async_read_engine = None
+AsyncReadSessionLocal = None
 if READ_REPLICA_URL:
     is_replica_sqlite = "sqlite" in READ_REPLICA_URL
     if is_replica_sqlite:
@@ -65,13 +114,54 @@ if READ_REPLICA_URL:
         )
     ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
-def get_read_db():
-    if ReadSessionLocal is None:
-        # Fallback to primary if no replica configured
+    if AsyncSessionLocal is not None:
+        async_replica_url, async_replica_connect_args = to_async_url(READ_REPLICA_URL)
+        if is_replica_sqlite:
+            async_read_engine = create_async_engine(
+                async_replica_url, connect_args=async_replica_connect_args, pool_pre_ping=True
+            )
+        else:
+            async_read_engine = create_async_engine(
+                async_replica_url,
+                connect_args=async_replica_connect_args,
+                pool_pre_ping=True,
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT,
+                pool_recycle=POOL_RECYCLE
+            )
+        AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+def get_read_db(request: Request):
+    """
+    Session for read-only endpoints: the replica, unless none is configured,
+    the caller wrote recently, or the replica lags or is down.
+    """
+    if ReadSessionLocal is None or not use_replica(request, read_engine):
         yield from get_db()
         return
     db = ReadSessionLocal()
     try:
         yield db
+    except DBAPIError as e:
+        if e.connection_invalidated or isinstance(e, OperationalError):
+            mark_replica_down(read_engine, e)
+        raise
     finally:
         db.close()
+
+async def get_async_read_db(request: Request):
+    """Async counterpart of get_read_db."""
+    if AsyncReadSessionLocal is None or not await use_replica_async(request, async_read_engine):
+        if AsyncSessionLocal is None:
+            raise RuntimeError("Async database driver not installed (pip install aiosqlite asyncpg)")
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    async with AsyncReadSessionLocal() as db:
+        try:
+            yield db
+        except DBAPIError as e:
+            if e.connection_invalidated or isinstance(e, OperationalError):
+                mark_replica_down(async_read_engine, e)
+            raise
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Migration script to promote group_id/product_id out of events_raw.properties
+into real indexed columns, and backfill them for existing rows.
+
+Safe to re-run: columns and indexes are only added when missing, and the
+backfill only touches rows whose columns are still NULL.
+
+Usage (from the backend directory):
+    python -m db.migrate_event_entity_columns
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text, select, update, bindparam
+from db.database import engine
+from models.analytics_models import EventsRaw, EventsArchive
+from models.event_fields import event_entity_id
+
+BATCH_SIZE = 5000
+
+NEW_COLUMNS = [("group_id", "INTEGER"), ("product_id", "INTEGER")]
+
+NEW_INDEXES = {
+    "idx_events_group_type_timestamp": "CREATE INDEX IF NOT EXISTS idx_events_group_type_timestamp ON events_raw (group_id, event_type, timestamp)",
+    "idx_events_product_timestamp": "CREATE INDEX IF NOT EXISTS idx_events_product_timestamp ON events_raw (product_id, timestamp)",
+}
+
+def add_columns(conn, table_name: str):
+    """Add the entity id columns to a table if they are missing."""
+    existing_columns = {col["name"] for col in inspect(conn).get_columns(table_name)}
+    for column_name, column_type in NEW_COLUMNS:
+        if column_name in existing_columns:
+            print(f"   ✓ {table_name}.{column_name} already exists")
+            continue
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+        print(f"   ✅ Added {table_name}.{column_name}")
+
+def backfill(conn, model) -> int:
+    """Populate group_id/product_id from properties, in id-ordered batches."""
+    table = model.__table__
+    stmt = update(table).where(table.c.id == bindparam("row_id")).values(
+        group_id=bindparam("new_group_id"),
+        product_id=bindparam("new_product_id"),
+    )
+    updated = 0
+    last_id = None
+    while True:
+        query = select(table.c.id, table.c.properties).where(
+            table.c.group_id.is_(None),
+            table.c.product_id.is_(None),
+            table.c.properties.isnot(None),
+        ).order_by(table.c.id).limit(BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        rows = conn.execute(query).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        params = []
+        for row in rows:
+            group_id = event_entity_id(row.properties, "group_id")
+            product_id = event_entity_id(row.properties, "product_id")
+            if group_id is not None or product_id is not None:
+                params.append({"row_id": row.id, "new_group_id": group_id, "new_product_id": product_id})
+        if params:
+            conn.execute(stmt, params)
+            updated += len(params)
+        conn.commit()
+        print(f"   … {updated} {table.name} rows backfilled")
+    return updated
+
+def migrate_event_entity_columns():
+    """Add, index and backfill the events_raw entity id columns"""
+    print("🔄 Promoting group_id/product_id to indexed columns...")
+
+    with engine.connect() as conn:
+        table_names = set(inspect(conn).get_table_names())
+        if "events_raw" not in table_names:
+            print("⚠️  events_raw does not exist. Run: python db/create_analytics_tables.py")
+            return
+
+        print("\n📋 Checking columns...")
+        add_columns(conn, "events_raw")
+        if "events_archive" in table_names:
+            add_columns(conn, "events_archive")
+        conn.commit()
+
+        print("\n📇 Creating indexes...")
+        for name, ddl in NEW_INDEXES.items():
+            conn.execute(text(ddl))
+            print(f"   ✓ {name}")
+        conn.commit()
+
+        print("\n🧮 Backfilling existing rows...")
+        total = backfill(conn, EventsRaw)
+        if "events_archive" in table_names:
+            total += backfill(conn, EventsArchive)
+
+    print(f"\n✅ Migration complete: {total} rows backfilled")
+
+if __name__ == "__main__":
+    migrate_event_entity_columns()
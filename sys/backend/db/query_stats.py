@@ -0,0 +1,185 @@
+"""
+SQL query instrumentation per request and per background job.
+
+Engine-level SQLAlchemy hooks (sync and async engines alike) count the
+queries and DB time of whatever unit of work is current: an HTTP request
+(track_request_queries middleware) or a job (`with track_queries("job:...")`,
+wired into every Celery task). For each unit:
+
+* queries slower than SLOW_QUERY_MS are logged with the route/job;
+* a statement shape (the SQL text, whitespace-normalised) running more than
+  N_PLUS_ONE_THRESHOLD times is logged once as a likely N+1;
+* totals are folded into a per-route aggregate (route_query_stats) so the
+  worst endpoints can be ranked, served at GET /admin/query-stats.
+
+With QUERY_STATS_HEADER=true (or DEBUG=true) responses carry
+`X-DB-Queries: <count>; time_ms=<ms>`. Set QUERY_STATS_ENABLED=false to
+turn the hooks off.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+import logging
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+QUERY_STATS_HEADER = os.getenv("QUERY_STATS_HEADER", os.getenv("DEBUG", "false")).lower() == "true"
+QUERY_STATS_HEADER_NAME = "X-DB-Queries"
+MAX_LOGGED_STATEMENT_CHARS = 500
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryStats:
+    """Queries issued by one request or job."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+        self.n_plus_one: List[str] = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float):
+        shape = _WHITESPACE.sub(" ", statement).strip()
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.shapes[shape] += 1
+            repeats = self.shapes[shape]
+            if repeats == N_PLUS_ONE_THRESHOLD + 1:
+                self.n_plus_one.append(shape)
+        if repeats == N_PLUS_ONE_THRESHOLD + 1:
+            logger.warning(f"🔁 Possible N+1 in {self.label}: statement ran over {N_PLUS_ONE_THRESHOLD} times: "
+                           f"{shape[:MAX_LOGGED_STATEMENT_CHARS]}")
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            logger.warning(f"🐢 Slow query in {self.label} ({seconds * 1000:.0f} ms): "
+                           f"{shape[:MAX_LOGGED_STATEMENT_CHARS]}")
+
+    @property
+    def milliseconds(self) -> float:
+        return self.seconds * 1000
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# label -> aggregate over completed requests/jobs
+_routes: Dict[str, Dict[str, float]] = {}
+_routes_lock = threading.Lock()
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def _fold(stats: QueryStats):
+    with _routes_lock:
+        route = _routes.setdefault(stats.label, {
+            "calls": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0, "max_db_ms": 0.0, "n_plus_one": 0,
+        })
+        route["calls"] += 1
+        route["queries"] += stats.count
+        route["db_ms"] += stats.milliseconds
+        route["max_queries"] = max(route["max_queries"], stats.count)
+        route["max_db_ms"] = max(route["max_db_ms"], stats.milliseconds)
+        route["n_plus_one"] += bool(stats.n_plus_one)
+
+
+def begin_tracking(label: str):
+    """Start counting queries for `label` in the current context; hand the result to end_tracking."""
+    stats = QueryStats(label)
+    return stats, _current.set(stats)
+
+
+def end_tracking(tracking) -> QueryStats:
+    stats, token = tracking
+    _current.reset(token)
+    _fold(stats)
+    logger.debug(f"{stats.label}: {stats.count} queries, {stats.milliseconds:.1f} ms in the database")
+    return stats
+
+
+@contextmanager
+def track_queries(label: str):
+    """Count the queries issued inside the block (a job or script)."""
+    tracking = begin_tracking(label)
+    try:
+        yield tracking[0]
+    finally:
+        end_tracking(tracking)
+
+
+def route_query_stats(sort_by: str = "queries", limit: int = 20) -> List[Dict[str, float]]:
+    """Per-route totals, worst first by `sort_by` (queries, db_ms, max_queries, max_db_ms, n_plus_one)."""
+    with _routes_lock:
+        rows = [dict(label=label, **values) for label, values in _routes.items()]
+    for row in rows:
+        row["avg_queries"] = round(row["queries"] / row["calls"], 1)
+        row["avg_db_ms"] = round(row["db_ms"] / row["calls"], 1)
+        row["db_ms"] = round(row["db_ms"], 1)
+        row["max_db_ms"] = round(row["max_db_ms"], 1)
+    rows.sort(key=lambda row: row.get(sort_by, 0), reverse=True)
+    return rows[:limit]
+
+
+def clear_query_stats():
+    with _routes_lock:
+        _routes.clear()
+
+
+def _route_label(request) -> str:
+    # The matched route template (/groups/{group_id}), not the raw path
+    route = request.scope.get("route")
+    path = getattr(route, "path", None) or request.url.path
+    return f"{request.method} {path}"
+
+
+async def track_request_queries(request, call_next):
+    """HTTP middleware: per-request query counts, N+1 warnings and the debug header."""
+    if not QUERY_STATS_ENABLED:
+        return await call_next(request)
+    tracking = begin_tracking(f"{request.method} {request.url.path}")
+    stats = tracking[0]
+    try:
+        response = await call_next(request)
+    finally:
+        stats.label = _route_label(request)
+        end_tracking(tracking)
+    if QUERY_STATS_HEADER:
+        response.headers[QUERY_STATS_HEADER_NAME] = f"{stats.count}; time_ms={stats.milliseconds:.1f}"
+    return response
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if QUERY_STATS_ENABLED and _current.get() is not None:
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("query_started_at")
+    if stats is None or not started:
+        return
+    stats.record(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # Drop the failed statement's start time so later timings stay paired
+    started = context.connection.info.get("query_started_at") if context.connection is not None else None
+    if started:
+        started.pop()
@@ -0,0 +1,195 @@
+"""
+Read-replica routing for get_read_db / get_async_read_db.
+
+Read-only endpoints go to the READ_REPLICA_URL pool, except:
+
+* read-your-writes: for READ_YOUR_WRITES_SECONDS after a caller's own
+  successful write request (any non-GET/HEAD/OPTIONS), their reads stay on
+  the primary so they see what they just changed;
+* lag and outages: the replica is checked at most every
+  REPLICA_CHECK_INTERVAL_SECONDS. While it lags more than
+  REPLICA_MAX_LAG_SECONDS, or after a connection error on it, reads fall
+  back to the primary until a later check passes.
+
+Callers are keyed by the user_id claim of their bearer token (routing only,
+the token is verified by the route itself). Stickiness is process-local;
+set READ_ROUTING_BACKEND=redis to share it across workers.
+"""
+from typing import Dict, Optional, Tuple
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import jwt
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+READ_ROUTING_BACKEND = os.getenv("READ_ROUTING_BACKEND", "memory").lower()  # 'memory' or 'redis'
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "15"))
+MAX_STICKY_CALLERS = 10000
+REDIS_KEY_PREFIX = "read_sticky:"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Seconds since the last replayed transaction; 0 when fully caught up or not a standby
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# caller key -> monotonic time their stickiness ends
+_sticky: Dict[str, float] = {}
+# replica url -> (usable, checked_at monotonic)
+_replica_state: Dict[str, Tuple[bool, float]] = {}
+_lock = threading.Lock()
+
+
+def _redis():
+    if READ_ROUTING_BACKEND != "redis":
+        return None
+    try:
+        from db.redis_client import get_redis
+        return get_redis()
+    except Exception:
+        return None
+
+
+def caller_key(request) -> Optional[str]:
+    """Identity of the request's caller: their user id, else a hash of their token."""
+    if request is None:
+        return None
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    token = authorization[7:].strip()
+    try:
+        user_id = jwt.decode(token, options={"verify_signature": False}).get("user_id")
+        if user_id is not None:
+            return f"user:{user_id}"
+    except jwt.PyJWTError:
+        pass
+    return "token:" + hashlib.sha1(token.encode("utf-8")).hexdigest()
+
+
+def mark_write(key: str):
+    """Keep `key`'s reads on the primary for READ_YOUR_WRITES_SECONDS."""
+    r = _redis()
+    if r is not None:
+        try:
+            r.setex(REDIS_KEY_PREFIX + key, READ_YOUR_WRITES_SECONDS, "1")
+        except Exception as e:
+            logger.warning(f"Read routing Redis write failed, using local stickiness: {e}")
+    now = time.monotonic()
+    with _lock:
+        _sticky[key] = now + READ_YOUR_WRITES_SECONDS
+        if len(_sticky) > MAX_STICKY_CALLERS:
+            for stale in [k for k, until in _sticky.items() if until < now]:
+                del _sticky[stale]
+
+
+def wrote_recently(key: Optional[str]) -> bool:
+    if key is None:
+        return False
+    r = _redis()
+    if r is not None:
+        try:
+            if r.exists(REDIS_KEY_PREFIX + key):
+                return True
+        except Exception as e:
+            logger.warning(f"Read routing Redis read failed, using local stickiness: {e}")
+    with _lock:
+        return _sticky.get(key, 0) >= time.monotonic()
+
+
+def _state_key(engine) -> str:
+    return engine.url.render_as_string(hide_password=True)
+
+
+def _needs_check(engine) -> Optional[bool]:
+    """Cached usability of the replica, or None when it is due for a check."""
+    with _lock:
+        state = _replica_state.get(_state_key(engine))
+    if state is not None and time.monotonic() - state[1] < REPLICA_CHECK_INTERVAL_SECONDS:
+        return state[0]
+    return None
+
+
+def _record(engine, lag: Optional[float], error: Optional[Exception] = None) -> bool:
+    usable = error is None and (lag or 0) <= REPLICA_MAX_LAG_SECONDS
+    key = _state_key(engine)
+    with _lock:
+        was_usable = _replica_state.get(key, (True, 0))[0]
+        _replica_state[key] = (usable, time.monotonic())
+    if was_usable and not usable:
+        reason = error if error is not None else f"lag {lag:.1f}s > {REPLICA_MAX_LAG_SECONDS}s"
+        logger.warning(f"⚠️ Read replica unavailable ({reason}); reading from the primary")
+    elif usable and not was_usable:
+        logger.info("✅ Read replica back in service")
+    return usable
+
+
+def replica_usable(engine) -> bool:
+    """Whether reads can go to the (sync) replica engine right now."""
+    cached = _needs_check(engine)
+    if cached is not None:
+        return cached
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                lag = conn.execute(POSTGRES_LAG_SQL).scalar()
+            else:
+                conn.execute(text("SELECT 1"))
+                lag = 0
+        return _record(engine, float(lag or 0))
+    except Exception as e:
+        return _record(engine, None, e)
+
+
+async def replica_usable_async(engine) -> bool:
+    """Whether reads can go to the async replica engine right now."""
+    cached = _needs_check(engine)
+    if cached is not None:
+        return cached
+    try:
+        async with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                lag = (await conn.execute(POSTGRES_LAG_SQL)).scalar()
+            else:
+                await conn.execute(text("SELECT 1"))
+                lag = 0
+        return _record(engine, float(lag or 0))
+    except Exception as e:
+        return _record(engine, None, e)
+
+
+def mark_replica_down(engine, error: Exception):
+    """Stop routing to the replica until its next check (after a failed query on it)."""
+    _record(engine, None, error)
+
+
+def use_replica(request, engine) -> bool:
+    return not wrote_recently(caller_key(request)) and replica_usable(engine)
+
+
+async def use_replica_async(request, engine) -> bool:
+    return not wrote_recently(caller_key(request)) and await replica_usable_async(engine)
+
+
+async def track_primary_writes(request, call_next):
+    """HTTP middleware: make callers sticky to the primary after their writes."""
+    response = await call_next(request)
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        key = caller_key(request)
+        if key is not None:
+            mark_write(key)
+    return response
+
+
+def clear_read_routing():
+    with _lock:
+        _sticky.clear()
+        _replica_state.clear()
@@ -1,10 +1,12 @@
 import os
 import json
-from typing import Any, Callable, Optional
-from functools import wraps
+from typing import Any, Optional
 
 import redis
 
+# The cache decorator lives in db.cache (two-tier, tag invalidation); kept importable from here
+from db.cache import cached, invalidate_tags
+
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 _redis_client: Optional[redis.Redis] = None
@@ -30,28 +32,6 @@ def cache_get(key: str) -> Optional[Any]:
     except Exception:
         return payload
 
-def cached(ttl_seconds: int = 300, make_key: Optional[Callable[..., str]] = None):
-    """Simple cache decorator backed by Redis."""
-    def decorator(fn: Callable[..., Any]):
-        @wraps(fn)
-        def wrapper(*args, **kwargs):
-            key = None
-            if make_key:
-                key = make_key(*args, **kwargs)
-            else:
-                key = f"cache:{fn.__module__}.{fn.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
-            cached_value = cache_get(key)
-            if cached_value is not None:
-                return cached_value
-            result = fn(*args, **kwargs)
-            try:
-                cache_set(key, result, ttl_seconds)
-            except Exception:
-                pass
-            return result
-        return wrapper
-    return decorator
-
 # Session helpers (optional)
 SESSION_PREFIX = "session:"
 
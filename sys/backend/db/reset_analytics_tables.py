@@ -12,10 +12,14 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db.database import engine
 from models.analytics_models import (
     EventsRaw,
+    EventsArchive,
+    EventDailyUserRollup,
+    EventDailyGroupRollup,
     UserBehaviorFeatures,
     GroupPerformanceMetrics,
     UserGroupInteractionMatrix,
     UserSimilarity,
+    ProductTransition,
     FeatureStore,
     SessionMetrics,
     SearchQuery,
@@ -29,10 +33,14 @@ def reset_analytics_tables():
         SearchQuery.__table__,
         SessionMetrics.__table__,
         FeatureStore.__table__,
+        ProductTransition.__table__,
         UserSimilarity.__table__,
         UserGroupInteractionMatrix.__table__,
         GroupPerformanceMetrics.__table__,
         UserBehaviorFeatures.__table__,
+        EventDailyGroupRollup.__table__,
+        EventDailyUserRollup.__table__,
+        EventsArchive.__table__,
         EventsRaw.__table__,
     ]
     
@@ -0,0 +1,19 @@
+"""
+INSERT ... ON CONFLICT for the databases this app runs on (Postgres in
+production, SQLite in development and tests).
+
+    stmt = upsert_insert(db, Model).values(...)
+    db.execute(stmt.on_conflict_do_nothing(index_elements=['key']))
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def upsert_insert(db: Session, model):
+    """insert(model) with on_conflict_do_nothing/on_conflict_do_update for the session's database."""
+    dialect = db.get_bind().dialect.name
+    try:
+        return _INSERTS[dialect](model)
+    except KeyError:
+        raise NotImplementedError(f"No upsert support for the {dialect} dialect") from None
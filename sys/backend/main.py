@@ -13,7 +13,11 @@ load_dotenv()
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from api.responses import CompressionMiddleware, FastJSONResponse
+from db import database
 from db.database import engine, Base, SessionLocal
+from db.read_routing import track_primary_writes
+from db.query_stats import track_queries, track_request_queries
 from authentication.auth import router as auth_router
 from models.products import router as products_router
 from models.groups import router as groups_router
@@ -27,6 +31,9 @@ from payment.payment_router import router as payment_router
 from analytics.analytics_router import router as analytics_router
 from ml.ml_scheduler import scheduler, start_scheduler
 from websocket.websocket_manager import manager
+from models.chat import manager as chat_manager
+from monitoring.metrics import router as metrics_router, track_request_metrics, watch_pool, watch_websocket_manager
+from monitoring.profiler import RequestProfilerMiddleware
 
 # Centralized logging configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -75,6 +82,7 @@ Base.metadata.create_all(bind=engine)
 
 # Initialize FastAPI app
 app = FastAPI(
+    default_response_class=FastJSONResponse,
     title="Group-Buy System API",
     description="""
     # AI-Driven Group-Buy Recommendation Platform for Informal Traders
@@ -111,6 +119,12 @@ app = FastAPI(
     },
 )
 
+# On-demand request profiling; added first so it runs innermost, in the route's own task
+app.add_middleware(RequestProfilerMiddleware)
+
+# Brotli/gzip for large JSON responses
+app.add_middleware(CompressionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -120,6 +134,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Keep callers' reads on the primary database briefly after their own writes
+app.middleware("http")(track_primary_writes)
+
+# Per-request query counts, slow-query and N+1 logging
+app.middleware("http")(track_request_queries)
+
+# Prometheus request latency and in-flight metrics (served at /metrics)
+app.middleware("http")(track_request_metrics)
+for pool_name, pool_engine in [("primary", database.engine), ("replica", database.read_engine),
+                               ("primary_async", database.async_engine), ("replica_async", database.async_read_engine)]:
+    if pool_engine is not None:
+        watch_pool(pool_name, getattr(pool_engine, "sync_engine", pool_engine))
+watch_websocket_manager("notifications", manager.connection_count)
+watch_websocket_manager("chat", chat_manager.connection_count)
+
 # Background task for OTP cleanup
 async def cleanup_expired_otps_task():
     """Background task to periodically clean up expired OTP records"""
@@ -127,10 +156,11 @@ async def cleanup_expired_otps_task():
         await asyncio.sleep(3600)  # Sleep for 1 hour
         db = SessionLocal()
         try:
-            db.query(PendingRegistration).filter(
-                PendingRegistration.otp_expires < datetime.utcnow()
-            ).delete()
-            db.commit()
+            with track_queries("job:otp_cleanup"):
+                db.query(PendingRegistration).filter(
+                    PendingRegistration.otp_expires < datetime.utcnow()
+                ).delete()
+                db.commit()
         except Exception:
             pass  # Silent operation as requested
         finally:
@@ -248,7 +278,7 @@ async def ml_training_websocket(websocket: WebSocket):
             # Keep connection alive, wait for client messages if needed
             data = await websocket.receive_text()
             # Echo back for connection health
-            await websocket.send_text(f"Connected: {data}")
+            manager.send(websocket, f"Connected: {data}")
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
@@ -297,6 +327,7 @@ app.include_router(settings_router, prefix="/api/settings", tags=["Settings"])
 app.include_router(supplier_router, prefix="/api/supplier", tags=["Supplier"])
 app.include_router(payment_router, prefix="/api/payment", tags=["Payment"])
 app.include_router(analytics_router, tags=["Analytics"])
+app.include_router(metrics_router, tags=["Monitoring"])
 
 # Only used for development. Disabled in production.
 if __name__ == "__main__":
@@ -4,21 +4,27 @@ Integrates behavioral analytics with recommendation models
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, or_, and_, select
 from typing import List, Dict, Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
+import json
 import logging
+import threading
+import time
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.analytics_models import EventsRaw, UserBehaviorFeatures, SessionMetrics
+from models.analytics_models import EventsRaw, UserBehaviorFeatures, SessionMetrics, FeatureStore
 from models.models import User, Product, GroupBuy, Transaction, Contribution
+from analytics.transition_index import next_products
+from analytics.session_store import get_session_state, seed_session
+from monitoring.metrics import record_cache
 
 logger = logging.getLogger(__name__)
 
@@ -63,9 +69,14 @@ class BehavioralFeatureExtractor:
         Uses time decay: recent events matter more
         """
         try:
-            # Get all events for this user-product pair
-            events = self.db.query(EventsRaw).filter(
-                EventsRaw.user_id == user_id
+            # Get events for this user-product pair via the indexed entity columns
+            # (an event relates to the product by product_id, else by group_id)
+            events = self.db.query(EventsRaw.event_type, EventsRaw.timestamp).filter(
+                EventsRaw.user_id == user_id,
+                or_(
+                    EventsRaw.product_id == product_id,
+                    and_(EventsRaw.product_id.is_(None), EventsRaw.group_id == product_id)
+                )
             ).all()
             
             if not events:
@@ -73,13 +84,6 @@ class BehavioralFeatureExtractor:
             
             score = 0.0
             for event in events:
-                # Check if event relates to this product
-                props = event.properties or {}
-                event_product_id = props.get('product_id') or props.get('group_id')
-                
-                if event_product_id != product_id:
-                    continue
-                
                 # Get behavior weight
                 weight = self.BEHAVIOR_WEIGHTS.get(event.event_type, 0)
                 
@@ -303,7 +307,7 @@ class BehavioralContentFilter:
             behavioral_features = self.feature_extractor.extract_user_features(user_id)
             
             # Get category preferences from behavior
-            category_events = self.db.query(EventsRaw).filter(
+            category_events = self.db.query(EventsRaw.event_type, EventsRaw.properties).filter(
                 EventsRaw.user_id == user_id,
                 EventsRaw.event_type.in_(['group_view', 'product_view', 'group_join_complete'])
             ).all()
@@ -405,6 +409,45 @@ class BehavioralContentFilter:
         except Exception as e:
             logger.error(f"Error calculating content similarity: {e}")
             return 0.0
+    
+    def score_groups(
+        self,
+        user_profile: Dict,
+        groups: "GroupFeatureIndex"
+    ) -> np.ndarray:
+        """
+        Vectorised calculate_content_similarity_with_behavior over every
+        group in the index at once.
+        """
+        if not user_profile or not len(groups):
+            return np.zeros(len(groups))
+        
+        static_prefs = set(user_profile['static_preferences']['preferred_categories'])
+        behavioral_prefs = set(user_profile['behavioral_preferences']['top_categories'])
+        scores = np.zeros(len(groups))
+        
+        # 1. Category match (40% weight)
+        scores += 0.2 * groups.category_in(static_prefs)
+        scores += 0.2 * groups.category_in(behavioral_prefs)
+        
+        # 2. Price sensitivity match (30% weight)
+        budget_range = user_profile['static_preferences']['budget_range']
+        scores += 0.3 * (groups.price_band == budget_range)
+        
+        # 3. Engagement match (20% weight)
+        conversion_rate = user_profile['behavioral_preferences']['conversion_rate']
+        moq_progress = groups.moq_progress / 100.0
+        if conversion_rate > 0.5:
+            # High converters prefer nearly-complete groups
+            scores += 0.2 * (moq_progress > 0.7)
+        elif conversion_rate < 0.2:
+            # Low converters prefer new groups
+            scores += 0.2 * (moq_progress < 0.3)
+        
+        # 4. Recency boost (10% weight)
+        scores += 0.1 * user_profile['behavioral_features']['recency_score']
+        
+        return np.minimum(1.0, scores)
 
 
 # ============================================================================
@@ -453,41 +496,12 @@ class SequentialPatternMiner:
         recent_views: List[int],
         top_k: int = 10
     ) -> List[Tuple[int, float]]:
-        """Predict next likely products based on sequence patterns"""
+        """Predict next likely products from the Markov transition index (all users)"""
         try:
             if not recent_views:
                 return []
             
-            # Get all users' sequences (sample for performance)
-            all_users = self.db.query(User.id).limit(200).all()
-            user_ids = [u.id for u in all_users]
-            
-            # Find matching patterns
-            next_products = defaultdict(int)
-            
-            for uid in user_ids:
-                sequences = self.extract_user_sequences(uid, len(recent_views) + 1)
-                
-                for seq in sequences:
-                    if len(seq) > len(recent_views):
-                        # Check if prefix matches recent views
-                        if seq[:-1] == recent_views:
-                            next_product = seq[-1]
-                            next_products[next_product] += 1
-            
-            # Normalize to probabilities
-            total = sum(next_products.values())
-            if total == 0:
-                return []
-            
-            probabilities = [
-                (pid, count / total)
-                for pid, count in next_products.items()
-            ]
-            
-            # Sort by probability and return top-k
-            probabilities.sort(key=lambda x: x[1], reverse=True)
-            return probabilities[:top_k]
+            return next_products(self.db, [int(pid) for pid in recent_views], top_k)
         except Exception as e:
             logger.error(f"Error finding next products: {e}")
             return []
@@ -503,57 +517,24 @@ class SessionBasedRecommender:
         self,
         session_id: str
     ) -> Dict[str, any]:
-        """Get context from current session"""
+        """Get context from current session (kept up to date by event ingestion)"""
         try:
-            events = self.db.query(EventsRaw).filter(
-                EventsRaw.session_id == session_id
-            ).order_by(EventsRaw.timestamp).all()
-            
-            if not events:
-                return {}
-            
-            viewed_products = []
-            viewed_categories = []
-            viewed_groups = []
-            
-            for event in events:
-                props = event.properties or {}
-                if 'product_id' in props:
-                    viewed_products.append(props['product_id'])
-                if 'category' in props:
-                    viewed_categories.append(props['category'])
-                if 'group_id' in props:
-                    viewed_groups.append(props['group_id'])
-            
-            return {
-                "session_id": session_id,
-                "duration": (events[-1].timestamp - events[0].timestamp).seconds,
-                "event_count": len(events),
-                "viewed_products": viewed_products,
-                "viewed_categories": viewed_categories,
-                "viewed_groups": viewed_groups,
-                "last_category": viewed_categories[-1] if viewed_categories else None,
-                "session_intent": self._infer_intent(events)
-            }
+            state = get_session_state(session_id)
+            if state is None:
+                # Store is cold (e.g. after a restart): rebuild once from stored events
+                events = self.db.query(
+                    EventsRaw.event_type, EventsRaw.timestamp, EventsRaw.properties,
+                    EventsRaw.user_id, EventsRaw.product_id, EventsRaw.group_id
+                ).filter(
+                    EventsRaw.session_id == session_id
+                ).order_by(EventsRaw.timestamp).all()
+                state = seed_session(session_id, events)
+            
+            return state.context() if state else {}
         except Exception as e:
             logger.error(f"Error getting session context: {e}")
             return {}
     
-    def _infer_intent(self, events: List[EventsRaw]) -> str:
-        """Infer user intent from session events"""
-        event_types = [e.event_type for e in events]
-        
-        if 'purchase_completed' in event_types:
-            return 'transactional'
-        elif 'product_search' in event_types or 'filter_applied' in event_types:
-            return 'research'
-        elif event_types.count('group_view') > 5:
-            return 'browsing'
-        elif 'add_to_cart' in event_types:
-            return 'consideration'
-        else:
-            return 'exploratory'
-    
     def recommend_for_session(
         self,
         session_id: str,
@@ -643,6 +624,74 @@ class RealTimeUpdater:
 # Main Behavioral ML Service
 # ============================================================================
 
+GROUP_FEATURE_TTL_SECONDS = int(os.getenv("GROUP_FEATURE_TTL_SECONDS", "60"))
+
+
+def price_band(price: float) -> str:
+    """Budget band a bulk price falls in ('low' < $20 <= 'medium' < $50 <= 'high')"""
+    if price < 20:
+        return 'low'
+    elif price < 50:
+        return 'medium'
+    return 'high'
+
+
+class GroupFeatureIndex:
+    """Array view of the active group buys, one slot per group"""
+    
+    def __init__(self, rows):
+        self.group_ids = np.array([row.id for row in rows], dtype=np.int64)
+        self.product_ids = np.array([row.product_id for row in rows], dtype=np.int64)
+        self.product_names = [row.name for row in rows]
+        self.categories = np.array([row.category for row in rows], dtype=object)
+        self.price_band = np.array([price_band(row.bulk_price) for row in rows], dtype=object)
+        self.moq_progress = np.array([
+            (row.total_quantity or 0) / row.moq * 100 if row.moq and row.moq > 0 else 0.0
+            for row in rows
+        ], dtype=float)
+        self.built_at = time.monotonic()
+    
+    def __len__(self):
+        return len(self.group_ids)
+    
+    def category_in(self, categories) -> np.ndarray:
+        return np.array([category in categories for category in self.categories], dtype=bool)
+    
+    @classmethod
+    def load(cls, db: Session) -> "GroupFeatureIndex":
+        rows = db.query(
+            GroupBuy.id, GroupBuy.product_id, GroupBuy.total_quantity,
+            Product.name, Product.category, Product.bulk_price, Product.moq
+        ).join(Product, Product.id == GroupBuy.product_id).filter(
+            GroupBuy.status == 'active',
+            GroupBuy.deadline > datetime.now()
+        ).order_by(GroupBuy.id).all()
+        return cls(rows)
+
+
+_group_features: Optional[GroupFeatureIndex] = None
+_group_features_lock = threading.Lock()
+
+
+def get_group_feature_index(db: Session) -> GroupFeatureIndex:
+    """Active group features, rebuilt at most every GROUP_FEATURE_TTL_SECONDS"""
+    global _group_features
+    index = _group_features
+    stale = index is None or time.monotonic() - index.built_at > GROUP_FEATURE_TTL_SECONDS
+    record_cache("group_features", not stale)
+    if stale:
+        index = GroupFeatureIndex.load(db)
+        with _group_features_lock:
+            _group_features = index
+    return index
+
+
+def clear_group_feature_index():
+    global _group_features
+    with _group_features_lock:
+        _group_features = None
+
+
 class BehavioralMLService:
     """Complete behavioral ML service integrating all phases"""
     
@@ -677,71 +726,63 @@ class BehavioralMLService:
             if not user_profile:
                 return []
             
-            # Get available groups
-            active_groups = self.db.query(GroupBuy).filter(
-                GroupBuy.status == 'active',
-                GroupBuy.deadline > datetime.now()
-            ).all()
+            # Get available groups (cached feature arrays)
+            groups = get_group_feature_index(self.db)
+            if not len(groups):
+                return []
             
-            recommendations = []
+            # 1. Content-based score (with behavioral enhancement)
+            content_scores = self.content_filter.score_groups(user_profile, groups)
+            
+            # 2. Sequential pattern score, from the user's recent views (computed once)
+            sequential_probs = np.zeros(len(groups))
+            if user_profile.get('behavioral_features'):
+                recent_views = [row.product_id for row in self.db.query(EventsRaw.product_id).filter(
+                    EventsRaw.user_id == user_id,
+                    EventsRaw.event_type.in_(['product_view', 'group_view']),
+                    EventsRaw.product_id.isnot(None)
+                ).order_by(EventsRaw.timestamp.desc()).limit(3).all()]
+                
+                if recent_views:
+                    sequential_recs = dict(self.sequential_miner.find_next_likely_products(
+                        user_id, recent_views[::-1], top_k=20
+                    ))
+                    sequential_probs = np.array([sequential_recs.get(pid, 0.0) for pid in groups.product_ids])
+            
+            # 3. Session-based score
+            session_matches = np.zeros(len(groups), dtype=bool)
+            if session_id:
+                last_category = self.session_recommender.get_session_context(session_id).get('last_category')
+                if last_category:
+                    session_matches = groups.categories == last_category
+            
+            scores = (
+                weights['content'] * content_scores
+                + weights['sequential'] * sequential_probs
+                + weights['session'] * 0.8 * session_matches
+            )
             
-            for group in active_groups:
-                score = 0.0
+            recommendations = []
+            for i in np.argsort(-scores, kind='stable')[:limit]:
                 reasons = []
-                
-                # 1. Content-based score (with behavioral enhancement)
-                content_score = self.content_filter.calculate_content_similarity_with_behavior(
-                    user_profile, group
-                )
-                score += weights['content'] * content_score
-                if content_score > 0.5:
+                if content_scores[i] > 0.5:
                     reasons.append("Matches your interests")
-                
-                # 2. Sequential pattern score
-                recent_views = []
-                if user_profile.get('behavioral_features'):
-                    # Get recent product views
-                    recent_events = self.db.query(EventsRaw).filter(
-                        EventsRaw.user_id == user_id,
-                        EventsRaw.event_type.in_(['product_view', 'group_view'])
-                    ).order_by(EventsRaw.timestamp.desc()).limit(5).all()
-                    
-                    for event in recent_events:
-                        props = event.properties or {}
-                        if 'product_id' in props:
-                            recent_views.append(props['product_id'])
-                    
-                    if recent_views:
-                        sequential_recs = self.sequential_miner.find_next_likely_products(
-                            user_id, recent_views[:3], top_k=20
-                        )
-                        for prod_id, prob in sequential_recs:
-                            if prod_id == group.product_id:
-                                score += weights['sequential'] * prob
-                                reasons.append("Based on your browsing pattern")
-                                break
-                
-                # 3. Session-based score
-                if session_id:
-                    session_context = self.session_recommender.get_session_context(session_id)
-                    if session_context.get('last_category') == group.product.category:
-                        score += weights['session'] * 0.8
-                        reasons.append("Relevant to your current search")
+                if sequential_probs[i] > 0:
+                    reasons.append("Based on your browsing pattern")
+                if session_matches[i]:
+                    reasons.append("Relevant to your current search")
                 
                 recommendations.append({
-                    "group_buy_id": group.id,
-                    "product_id": group.product_id,
-                    "product_name": group.product.name,
-                    "recommendation_score": score,
+                    "group_buy_id": int(groups.group_ids[i]),
+                    "product_id": int(groups.product_ids[i]),
+                    "product_name": groups.product_names[i],
+                    "recommendation_score": float(scores[i]),
                     "reasons": reasons,
                     "weights_used": weights,
                     "behavioral_enhanced": True
                 })
             
-            # Sort by score
-            recommendations.sort(key=lambda x: x['recommendation_score'], reverse=True)
-            
-            return recommendations[:limit]
+            return recommendations
         except Exception as e:
             logger.error(f"Error getting enhanced recommendations: {e}")
             return []
@@ -765,17 +806,207 @@ def get_behavioral_ml_service(db: Session) -> BehavioralMLService:
     return BehavioralMLService(db)
 
 
+# Users whose events are pulled per query, and worker processes for the chunks
+FEATURE_BATCH_CHUNK_SIZE = int(os.getenv("FEATURE_BATCH_CHUNK_SIZE", "2000"))
+FEATURE_BATCH_WORKERS = int(os.getenv("FEATURE_BATCH_WORKERS", "1"))
+BEHAVIORAL_FEATURES_KEY = "user:{user_id}:behavioral_features"
+EVENT_FRAME_COLUMNS = ["user_id", "event_type", "timestamp", "product_id", "group_id", "properties"]
+COUNT_FEATURES = [
+    "total_events", "unique_products", "unique_groups", "purchases", "cart_adds",
+    "product_views", "group_views", "group_joins", "searches", "peak_activity_hour",
+    "peak_activity_day", "is_weekend_shopper", "categories_explored", "days_since_last_event",
+]
+
+
+def _property(properties, key):
+    if isinstance(properties, str):
+        try:
+            properties = json.loads(properties)
+        except ValueError:
+            return None
+    return properties.get(key) if isinstance(properties, dict) else None
+
+
+def _peak(events: pd.DataFrame, values: pd.Series) -> pd.Series:
+    """Most frequent value per user (ties go to the smallest value)."""
+    counts = events.groupby([events["user_id"], values.rename("value")]).size().reset_index(name="n")
+    counts = counts.sort_values(["user_id", "n", "value"], ascending=[True, False, True])
+    return counts.drop_duplicates("user_id").set_index("user_id")["value"]
+
+
+def _naive_utc(timestamps) -> pd.Series:
+    """Timestamps as naive UTC (Postgres returns timezone-aware values, SQLite naive ones)."""
+    return pd.to_datetime(timestamps, utc=True, errors="coerce").dt.tz_localize(None)
+
+
+def compute_behavioral_features(
+    events: pd.DataFrame,
+    user_ids: List[int],
+    window_days: int = 30,
+    now: Optional[datetime] = None
+) -> pd.DataFrame:
+    """
+    Vectorised BehavioralFeatureExtractor.extract_user_features for many users.
+    `events` holds EVENT_FRAME_COLUMNS for the window; users without events get
+    the default features.
+    """
+    now = now or datetime.now()
+    if now.tzinfo is not None:
+        now = now.astimezone(timezone.utc).replace(tzinfo=None)
+    defaults = BehavioralFeatureExtractor(None)._default_features()
+    index = pd.Index(user_ids, name="user_id")
+    if events.empty:
+        features = pd.DataFrame([defaults] * len(index), index=index)
+        return features.reset_index()[list(defaults) + ["user_id"]]
+
+    events = events[events["user_id"].isin(index)]
+    timestamps = _naive_utc(events["timestamp"])
+    by_user = events.groupby("user_id")
+    counts = pd.crosstab(events["user_id"], events["event_type"])
+    count = lambda event_type: counts[event_type] if event_type in counts else pd.Series(0, index=counts.index)
+
+    views = count("group_view") + count("product_view")
+    clicks = count("group_join_click")
+    joins = count("group_join_complete")
+    purchases = count("purchase_completed")
+    total = by_user.size()
+
+    categories = events["properties"].map(lambda p: _property(p, "category"))
+    categories = events.assign(category=categories).dropna(subset=["category"])
+    category_counts = categories.groupby(["user_id", "category"]).size()
+    shares = category_counts / category_counts.groupby(level=0).transform("sum")
+    entropy = (-(shares * np.log(shares + 1e-10))).groupby(level=0).sum()
+
+    peak_day = _peak(events, timestamps.dt.weekday)
+    days_since = (now - timestamps.groupby(events["user_id"]).max()).dt.days
+
+    features = pd.DataFrame({
+        "total_events": total,
+        "unique_products": by_user["product_id"].nunique(),
+        "unique_groups": by_user["group_id"].nunique(),
+        "events_per_day": total / window_days,
+        "purchases": purchases,
+        "cart_adds": count("add_to_cart"),
+        "product_views": count("product_view"),
+        "group_views": count("group_view"),
+        "group_joins": joins,
+        "searches": count("product_search"),
+        "view_to_click_rate": clicks / views.clip(lower=1),
+        "click_to_join_rate": joins / clicks.clip(lower=1),
+        "join_to_purchase_rate": purchases / joins.clip(lower=1),
+        "overall_conversion_rate": purchases / views.clip(lower=1),
+        "peak_activity_hour": _peak(events, timestamps.dt.hour),
+        "peak_activity_day": peak_day,
+        "is_weekend_shopper": (peak_day >= 5).astype(int),
+        "category_diversity": entropy,
+        "categories_explored": category_counts.groupby(level=0).size(),
+        "days_since_last_event": days_since,
+        "recency_score": 1.0 / (1.0 + days_since),
+    }).reindex(index)
+
+    features = features.fillna(defaults)
+    features[COUNT_FEATURES] = features[COUNT_FEATURES].astype(int)
+    return features.reset_index()[list(defaults) + ["user_id"]]
+
+
+def load_event_frame(db: Session, user_ids: List[int], since: datetime) -> pd.DataFrame:
+    """Events of `user_ids` since `since` as a DataFrame, with one query."""
+    result = db.execute(
+        select(*[getattr(EventsRaw, c) for c in EVENT_FRAME_COLUMNS]).where(
+            EventsRaw.user_id.in_(user_ids),
+            EventsRaw.timestamp >= since
+        )
+    )
+    return pd.DataFrame(result.fetchall(), columns=EVENT_FRAME_COLUMNS)
+
+
+def _init_extract_worker() -> None:
+    """
+    Process-pool initializer: drop the connections inherited from the parent
+    so the worker opens its own instead of sharing the parent's sockets.
+    """
+    from db.database import engine
+    engine.dispose(close=False)
+
+
+def _extract_chunk(user_ids: List[int], window_days: int, now: datetime) -> pd.DataFrame:
+    """Process-pool entry point: extract one chunk with the worker's own session."""
+    from db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        events = load_event_frame(db, user_ids, now - timedelta(days=window_days))
+        return compute_behavioral_features(events, user_ids, window_days, now)
+    finally:
+        db.close()
+
+
+def _exported_event_frame(db: Session, since: datetime) -> Optional[pd.DataFrame]:
+    """The window's events from the columnar export (OFFLINE_DATA_SOURCE=export), else None."""
+    from analytics import columnar_export
+    if columnar_export.OFFLINE_DATA_SOURCE != "export" or not columnar_export.pyarrow_available():
+        return None
+    try:
+        columnar_export.export_table(db, "events_raw")
+        if not columnar_export.export_available("events_raw"):
+            return None
+        events = columnar_export.read_export("events_raw", start=since.date(), columns=EVENT_FRAME_COLUMNS)
+        return events[_naive_utc(events["timestamp"]) >= since]
+    except Exception as e:
+        logger.warning(f"Falling back to database for behavioral features: {e}")
+        return None
+
+
 def extract_behavioral_features_batch(
     user_ids: List[int],
-    db: Session
+    db: Session,
+    window_days: int = 30,
+    chunk_size: int = FEATURE_BATCH_CHUNK_SIZE,
+    workers: int = FEATURE_BATCH_WORKERS
 ) -> pd.DataFrame:
-    """Extract behavioral features for multiple users (for batch training)"""
-    extractor = BehavioralFeatureExtractor(db)
-    
-    features_list = []
-    for user_id in user_ids:
-        features = extractor.extract_user_features(user_id)
-        features['user_id'] = user_id
-        features_list.append(features)
-    
-    return pd.DataFrame(features_list)
+    """
+    Extract behavioral features for multiple users (for batch training).
+    Events are read once per chunk of users (or once from the columnar export)
+    and features are computed with group-bys; with workers > 1 the chunks are
+    spread over a process pool.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    now = datetime.now()
+    since = now - timedelta(days=window_days)
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+    exported = _exported_event_frame(db, since)
+    if exported is not None:
+        frames = [compute_behavioral_features(exported, user_ids, window_days, now)]
+    elif workers > 1 and len(chunks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                 initializer=_init_extract_worker) as pool:
+            frames = list(pool.map(_extract_chunk, chunks, [window_days] * len(chunks), [now] * len(chunks)))
+    else:
+        frames = [
+            compute_behavioral_features(load_event_frame(db, chunk, since), chunk, window_days, now)
+            for chunk in chunks
+        ]
+
+    if not frames:
+        return pd.DataFrame(columns=list(BehavioralFeatureExtractor(None)._default_features()) + ["user_id"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def store_behavioral_features(db: Session, features: pd.DataFrame) -> int:
+    """Replace the feature store's per-user behavioral features with `features`."""
+    now = datetime.utcnow()
+    records = features.to_dict(orient="records")
+    keys = [BEHAVIORAL_FEATURES_KEY.format(user_id=r["user_id"]) for r in records]
+    for start in range(0, len(keys), FEATURE_BATCH_CHUNK_SIZE):
+        db.query(FeatureStore).filter(
+            FeatureStore.feature_key.in_(keys[start:start + FEATURE_BATCH_CHUNK_SIZE])
+        ).delete(synchronize_session=False)
+    db.bulk_insert_mappings(FeatureStore, [
+        {'feature_key': key,
+         'feature_value': {k: v for k, v in r.items() if k != "user_id"},
+         'feature_type': 'user', 'entity_id': r["user_id"], 'computed_at': now}
+        for key, r in zip(keys, records)
+    ])
+    db.commit()
+    return len(records)
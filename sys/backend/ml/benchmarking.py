@@ -19,6 +19,7 @@ import logging
 from db.database import get_db
 from models.models import User, Product, Transaction, BenchmarkResult
 from authentication.auth import verify_admin
+from analytics.columnar_export import load_table_frame
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.decomposition import NMF
 from sklearn.preprocessing import MinMaxScaler
@@ -244,34 +245,28 @@ def prepare_test_set(db: Session, test_ratio: float = 0.2) -> Tuple[Dict, Dict]:
     logger.info(f"Preparing test set with {test_ratio*100}% test ratio...")
     
     # Get all traders (non-admin, non-supplier)
-    traders = db.query(User).filter(
+    trader_ids = [t.id for t in db.query(User.id).filter(
         User.is_admin == False,
         User.is_supplier == False
-    ).all()
-    trader_ids = [t.id for t in traders]
+    ).all()]
     
-    # Get all transactions, sorted by time
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id.in_(trader_ids)
-    ).order_by(Transaction.created_at).all()
+    # Get all transactions as a columnar frame, sorted by time
+    transactions = load_table_frame(
+        db, "transactions", columns=["user_id", "product_id", "quantity", "created_at"]
+    )
+    transactions = transactions[transactions["user_id"].isin(trader_ids)]
     
-    if not transactions:
+    if transactions.empty:
         logger.warning("No transactions found for test set preparation")
         return {}, {}
     
-    # Group transactions by user
-    user_transactions = defaultdict(list)
-    for tx in transactions:
-        user_transactions[tx.user_id].append(tx)
+    transactions = transactions.sort_values("created_at", kind="stable")
     
     train_data = {}
     test_data = {}
     
     # For each user, split their transactions temporally
-    for user_id, user_txs in user_transactions.items():
-        # Sort by time
-        user_txs.sort(key=lambda tx: tx.created_at)
-        
+    for user_id, user_txs in transactions.groupby("user_id", sort=False):
         # Split point (use last 20% as test)
         split_idx = int(len(user_txs) * (1 - test_ratio))
         
@@ -279,22 +274,20 @@ def prepare_test_set(db: Session, test_ratio: float = 0.2) -> Tuple[Dict, Dict]:
         if split_idx == len(user_txs) and len(user_txs) > 1:
             split_idx = len(user_txs) - 1
         
-        train_txs = user_txs[:split_idx]
-        test_txs = user_txs[split_idx:]
+        train_txs = user_txs.iloc[:split_idx]
+        test_txs = user_txs.iloc[split_idx:]
         
         # Build train set
-        if train_txs:
-            train_data[user_id] = defaultdict(float)
-            for tx in train_txs:
-                train_data[user_id][tx.product_id] += tx.quantity
-            train_data[user_id] = dict(train_data[user_id])
+        if not train_txs.empty:
+            train_data[int(user_id)] = {
+                int(pid): float(qty) for pid, qty in train_txs.groupby("product_id")["quantity"].sum().items()
+            }
         
         # Build test set
-        if test_txs:
-            test_data[user_id] = defaultdict(float)
-            for tx in test_txs:
-                test_data[user_id][tx.product_id] += tx.quantity
-            test_data[user_id] = dict(test_data[user_id])
+        if not test_txs.empty:
+            test_data[int(user_id)] = {
+                int(pid): float(qty) for pid, qty in test_txs.groupby("product_id")["quantity"].sum().items()
+            }
     
     logger.info(f"Train set: {len(train_data)} users, Test set: {len(test_data)} users")
     return train_data, test_data
@@ -0,0 +1,119 @@
+"""
+Cluster x AdminGroup participation index.
+
+Holds AdminGroupJoin counts per (user cluster_id, admin_group_id) as a dense
+matrix so admin-group recommendations can read "how many traders from my
+cluster joined each group" for every candidate group in one vectorised
+lookup instead of two queries per group.
+
+The index is built with a single grouped query, kept per process, bumped on
+every confirmed AdminGroupJoin, rebuilt by the analytics ETL and after model
+training (cluster ids change), and expires after a TTL so other worker
+processes pick up joins they did not see.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Iterable, Optional
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from models.models import User, AdminGroupJoin
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_PARTICIPATION_TTL_SECONDS = int(os.getenv("CLUSTER_PARTICIPATION_TTL_SECONDS", "900"))
+
+
+class ClusterParticipation:
+    """Dense join-count matrix: one row per cluster, one column per admin group."""
+
+    def __init__(self, cluster_ids, group_ids, joins):
+        self.cluster_row = {int(cid): i for i, cid in enumerate(cluster_ids)}
+        self.group_col = {int(gid): j for j, gid in enumerate(group_ids)}
+        self.joins = joins
+
+    def add_join(self, cluster_id: int, group_id: int, count: int = 1):
+        row = self.cluster_row.get(cluster_id)
+        if row is None:
+            row = self.cluster_row[cluster_id] = self.joins.shape[0]
+            self.joins = np.vstack([self.joins, np.zeros((1, self.joins.shape[1]), dtype=np.int32)])
+        col = self.group_col.get(group_id)
+        if col is None:
+            col = self.group_col[group_id] = self.joins.shape[1]
+            self.joins = np.hstack([self.joins, np.zeros((self.joins.shape[0], 1), dtype=np.int32)])
+        self.joins[row, col] += count
+
+    def cluster_joins(self, cluster_id: Optional[int], group_ids: Iterable[int]) -> np.ndarray:
+        """Join counts of `cluster_id` for each group (zeros for unknown clusters/groups)."""
+        group_ids = list(group_ids)
+        row = self.cluster_row.get(cluster_id) if cluster_id is not None else None
+        if row is None:
+            return np.zeros(len(group_ids), dtype=np.int32)
+        cols = np.fromiter((self.group_col.get(gid, -1) for gid in group_ids), dtype=np.int64, count=len(group_ids))
+        counts = np.zeros(len(group_ids), dtype=np.int32)
+        known = cols >= 0
+        counts[known] = self.joins[row, cols[known]]
+        return counts
+
+
+def build_cluster_participation(db: Session) -> ClusterParticipation:
+    """Aggregate AdminGroupJoin by (cluster_id, admin_group_id) with one query."""
+    rows = db.query(
+        User.cluster_id,
+        AdminGroupJoin.admin_group_id,
+        func.count(AdminGroupJoin.id)
+    ).join(User, User.id == AdminGroupJoin.user_id).filter(
+        User.cluster_id.isnot(None)
+    ).group_by(User.cluster_id, AdminGroupJoin.admin_group_id).all()
+
+    cluster_ids = sorted({row[0] for row in rows})
+    group_ids = sorted({row[1] for row in rows})
+    index = ClusterParticipation(cluster_ids, group_ids, np.zeros((len(cluster_ids), len(group_ids)), dtype=np.int32))
+    for cluster_id, group_id, count in rows:
+        index.joins[index.cluster_row[cluster_id], index.group_col[group_id]] = count
+    return index
+
+
+_participation: Optional[ClusterParticipation] = None
+_participation_built_at = 0.0
+_participation_lock = threading.Lock()
+
+
+def get_cluster_participation(db: Session) -> ClusterParticipation:
+    """Process-wide participation index, rebuilt when older than the TTL."""
+    global _participation, _participation_built_at
+    if _participation is None or time.monotonic() - _participation_built_at > CLUSTER_PARTICIPATION_TTL_SECONDS:
+        refresh_cluster_participation(db)
+    return _participation
+
+
+def refresh_cluster_participation(db: Session) -> ClusterParticipation:
+    """Rebuild the index from the database (ETL, after training)."""
+    global _participation, _participation_built_at
+    index = build_cluster_participation(db)
+    with _participation_lock:
+        _participation = index
+        _participation_built_at = time.monotonic()
+    return index
+
+
+def record_admin_group_join(db: Session, user_id: int, admin_group_id: int):
+    """Count a newly committed AdminGroupJoin (no-op until the index is built)."""
+    if _participation is None:
+        return
+    cluster_id = db.query(User.cluster_id).filter(User.id == user_id).scalar()
+    if cluster_id is None:
+        return
+    with _participation_lock:
+        if _participation is not None:
+            _participation.add_join(int(cluster_id), int(admin_group_id))
+
+
+def clear_cluster_participation():
+    global _participation
+    with _participation_lock:
+        _participation = None
@@ -0,0 +1,114 @@
+"""
+Per-cluster trader profiles, computed once per training run.
+
+Cluster assignments only change when the hybrid model is retrained, so the
+training job summarises every cluster (size, spend, location/budget mix,
+categories and products its centroid leans towards, representative traders)
+and stores the snapshot in the model bundle's feature_store.json. The
+/clusters endpoint and cluster explanations read that snapshot instead of
+querying cluster members on every request.
+"""
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+REPRESENTATIVE_TRADERS = 5
+TYPICAL_PRODUCTS = 5
+TOP_CATEGORIES = 3
+
+
+def _counts(values) -> Dict[str, int]:
+    return dict(Counter(v for v in values if v).most_common())
+
+
+def _members_by_category(members) -> Dict[str, List[int]]:
+    """Preferred category -> ids of the members preferring it."""
+    by_category: Dict[str, List[int]] = {}
+    for u in members:
+        for cat in set(u.preferred_categories or []):
+            by_category.setdefault(cat, []).append(int(u.id))
+    return {cat: sorted(ids) for cat, ids in sorted(by_category.items())}
+
+
+def build_cluster_profiles(
+    users: Sequence[Any],
+    labels: Sequence[int],
+    purchase_matrix: np.ndarray,
+    products: Sequence[Any],
+    transactions: pd.DataFrame,
+    centroid_distances: np.ndarray,
+) -> List[Dict[str, Any]]:
+    """
+    Summarise each cluster of a training run.
+
+    Args:
+        users: Clustered traders, in purchase_matrix row order
+        labels: Cluster id of each trader
+        purchase_matrix: Traders x products purchased quantities
+        products: Products, in purchase_matrix column order
+        transactions: Transactions frame with user_id, quantity, amount, location_zone
+        centroid_distances: Traders x clusters distances (KMeans.transform)
+    """
+    labels = np.asarray(labels)
+    user_ids = np.array([u.id for u in users])
+    categories = np.array([p.category or 'general' for p in products])
+    cluster_of_user = dict(zip(user_ids.tolist(), labels.tolist()))
+    tx = transactions.assign(cluster_id=transactions["user_id"].map(cluster_of_user)).dropna(subset=["cluster_id"])
+
+    profiles = []
+    for cluster_id in sorted(set(labels.tolist())):
+        rows = np.flatnonzero(labels == cluster_id)
+        members = [users[i] for i in rows]
+
+        # Centroid of the purchase part, decoded into categories and products
+        mean_purchases = purchase_matrix[rows].mean(axis=0)
+        category_weights = pd.Series(mean_purchases).groupby(categories).sum().sort_values(ascending=False)
+        top_categories = [cat for cat, weight in category_weights.items() if weight > 0][:TOP_CATEGORIES]
+        typical = np.argsort(-mean_purchases, kind="stable")[:TYPICAL_PRODUCTS]
+        typical_products = [
+            {"product_id": int(products[j].id), "name": products[j].name, "avg_quantity": round(float(mean_purchases[j]), 2)}
+            for j in typical if mean_purchases[j] > 0
+        ]
+
+        closest = rows[np.argsort(centroid_distances[rows, cluster_id], kind="stable")[:REPRESENTATIVE_TRADERS]]
+        representatives = [
+            {"id": int(users[i].id), "location": users[i].location_zone,
+             "categories": (users[i].preferred_categories or [])[:3]}
+            for i in closest
+        ]
+
+        cluster_tx = tx[tx["cluster_id"] == cluster_id]
+        locations = cluster_tx["location_zone"].dropna()
+        profiles.append({
+            "cluster_id": int(cluster_id),
+            "size": len(members),
+            "transaction_count": int(len(cluster_tx)),
+            "avg_quantity": float(cluster_tx["quantity"].mean()) if len(cluster_tx) else 0.0,
+            "avg_contribution": float(cluster_tx["amount"].mean()) if len(cluster_tx) else 0.0,
+            "dominant_location": locations.value_counts().index[0] if len(locations) else "Unknown",
+            "top_categories": top_categories,
+            "typical_products": typical_products,
+            "location_counts": _counts(u.location_zone for u in members),
+            "budget_counts": _counts(u.budget_range for u in members),
+            "member_ids": sorted(int(u.id) for u in members),
+            "preferred_category_members": _members_by_category(members),
+            "representative_traders": representatives,
+        })
+    return profiles
+
+
+def get_cluster_profiles() -> Optional[List[Dict[str, Any]]]:
+    """Profiles of the loaded model bundle (None for bundles trained before profiles existed)."""
+    from ml.ml import feature_store
+    return (feature_store or {}).get("cluster_profiles")
+
+
+def get_cluster_profile(cluster_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    if cluster_id is None:
+        return None
+    for profile in get_cluster_profiles() or []:
+        if profile["cluster_id"] == cluster_id:
+            return profile
+    return None
@@ -5,12 +5,22 @@ Provides human-readable explanations for recommendations without requiring SHAP/
 Implements lightweight explainability techniques aligned with research proposal objectives.
 """
 
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional
 from models.models import User, GroupBuy, Transaction
-from sqlalchemy.orm import Session
+from monitoring.metrics import record_cache
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.util import identity_key
+from collections import OrderedDict
+import copy
+import os
 import random
+import threading
 from datetime import datetime
 
+# Cluster explanations cached per (user, cluster, model version)
+CLUSTER_EXPLANATION_CACHE_SIZE = int(os.getenv("CLUSTER_EXPLANATION_CACHE_SIZE", "1024"))
+
 # =============================================================================
 # EXPLANATION TEMPLATES - Varied, product-specific phrasings
 # =============================================================================
@@ -108,7 +118,8 @@ def explain_recommendation(
     user: User,
     group_buy: GroupBuy,
     ml_scores: Dict[str, float],
-    db: Session
+    db: Session,
+    purchase_counts: Optional[Dict[int, int]] = None
 ) -> Dict[str, Any]:
     """
     Generate comprehensive explanation for a recommendation.
@@ -121,6 +132,8 @@ def explain_recommendation(
         group_buy: Recommended group-buy
         ml_scores: ML component scores (CF, CBF, popularity, hybrid)
         db: Database session
+        purchase_counts: The user's transaction count per product_id, when
+            already loaded for a batch of explanations
     
     Returns:
         Structured explanation with factors, contributions, and natural language
@@ -178,10 +191,13 @@ def explain_recommendation(
     factors = []
     
     # Check purchase history
-    user_transactions = db.query(Transaction).filter(
-        Transaction.user_id == user.id,
-        Transaction.product_id == group_buy.product_id
-    ).count()
+    if purchase_counts is not None:
+        user_transactions = purchase_counts.get(group_buy.product_id, 0)
+    else:
+        user_transactions = db.query(Transaction).filter(
+            Transaction.user_id == user.id,
+            Transaction.product_id == group_buy.product_id
+        ).count()
     
     if user_transactions > 0:
         factors.append({
@@ -333,6 +349,85 @@ def explain_recommendation(
     return explanation
 
 
+def load_group_buys(db: Session, group_buy_ids: Iterable[int]) -> Dict[int, GroupBuy]:
+    """
+    Group-buys by id, reusing those the session already holds (e.g. from the
+    ranking pass) and loading the rest, with products and contributions, in one query.
+    """
+    found = {}
+    missing = []
+    for gid in dict.fromkeys(group_buy_ids):
+        group_buy = db.identity_map.get(identity_key(GroupBuy, gid))
+        if group_buy is not None:
+            found[gid] = group_buy
+        else:
+            missing.append(gid)
+    if missing:
+        for group_buy in db.query(GroupBuy).options(
+            joinedload(GroupBuy.product), selectinload(GroupBuy.contributions)
+        ).filter(GroupBuy.id.in_(missing)):
+            found[group_buy.id] = group_buy
+    return found
+
+
+def explain_recommendations(user: User, recommendations: List[Dict[str, Any]], db: Session) -> List[Dict[str, Any]]:
+    """
+    Explain a ranked list of recommendations from the component scores the
+    ranking pass computed, with one lookup of the user's purchase counts.
+    """
+    group_buys = load_group_buys(db, [rec['group_buy_id'] for rec in recommendations])
+    product_ids = {gb.product_id for gb in group_buys.values()}
+    purchase_counts = dict(db.query(Transaction.product_id, func.count(Transaction.id)).filter(
+        Transaction.user_id == user.id,
+        Transaction.product_id.in_(product_ids)
+    ).group_by(Transaction.product_id).all()) if product_ids else {}
+
+    explanations = []
+    for rec in recommendations:
+        group_buy = group_buys.get(rec['group_buy_id'])
+        if group_buy:
+            explanations.append(explain_recommendation(
+                user, group_buy, rec.get('ml_scores', {}), db, purchase_counts=purchase_counts
+            ))
+    return explanations
+
+
+_cluster_explanations: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_cluster_explanations_lock = threading.Lock()
+
+
+def get_cluster_explanation(user: User, db: Session) -> Dict[str, Any]:
+    """
+    explain_cluster_assignment, cached per user and model version (cluster
+    assignments only change when the model is retrained). The profile fields
+    the factors are built from are part of the key, so a profile update is
+    explained afresh. Callers get their own copy.
+    """
+    from ml.ml import get_model_version
+
+    key = (user.id, user.cluster_id, get_model_version(), user.location_zone, user.budget_range,
+           tuple(sorted(user.preferred_categories or [])))
+    with _cluster_explanations_lock:
+        cached = _cluster_explanations.get(key)
+        if cached is not None:
+            _cluster_explanations.move_to_end(key)
+    record_cache("cluster_explanations", cached is not None)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
+    explanation = explain_cluster_assignment(user, db)
+    with _cluster_explanations_lock:
+        _cluster_explanations[key] = explanation
+        while len(_cluster_explanations) > CLUSTER_EXPLANATION_CACHE_SIZE:
+            _cluster_explanations.popitem(last=False)
+    return copy.deepcopy(explanation)
+
+
+def clear_cluster_explanations():
+    with _cluster_explanations_lock:
+        _cluster_explanations.clear()
+
+
 def explain_cluster_assignment(user: User, db: Session) -> Dict[str, Any]:
     """
     Explain why a user was assigned to a specific cluster.
@@ -352,6 +447,12 @@ def explain_cluster_assignment(user: User, db: Session) -> Dict[str, Any]:
             "factors": []
         }
     
+    from ml.cluster_profiles import get_cluster_profile
+    profile = get_cluster_profile(user.cluster_id)
+    # Profiles from bundles trained before member ids were recorded use the queries below
+    if profile is not None and "member_ids" in profile:
+        return explain_cluster_from_profile(user, profile)
+    
     # Get other users in the same cluster
     cluster_users = db.query(User).filter(
         User.cluster_id == user.cluster_id,
@@ -413,6 +514,57 @@ def explain_cluster_assignment(user: User, db: Session) -> Dict[str, Any]:
     return explanation
 
 
+def explain_cluster_from_profile(user: User, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Explain a cluster assignment from the cluster profile snapshotted at
+    training time (no database access).
+    """
+    # Counts in the profile include the user only if they were clustered at training time
+    is_member = user.id in profile["member_ids"]
+    others = profile["size"] - is_member
+    factors = []
+    
+    same_location = max(profile["location_counts"].get(user.location_zone, 0) - is_member, 0)
+    if others and same_location > others * 0.3:
+        factors.append({
+            "factor": "location",
+            "description": f"{same_location}/{others} traders in your cluster are from {user.location_zone}",
+            "strength": "high"
+        })
+    
+    user_cats = set(user.preferred_categories or [])
+    if user_cats and others:
+        # Other traders sharing at least one of the user's preferred categories
+        members_by_category = profile["preferred_category_members"]
+        sharing = set().union(*(members_by_category.get(cat, []) for cat in user_cats)) - {user.id}
+        similar_prefs = len(sharing)
+        if similar_prefs > others * 0.4:
+            factors.append({
+                "factor": "preferences",
+                "description": f"You share product preferences with {similar_prefs}/{others} traders in your cluster",
+                "strength": "medium"
+            })
+    
+    same_budget = max(profile["budget_counts"].get(user.budget_range, 0) - is_member, 0)
+    if others and same_budget > others * 0.5:
+        factors.append({
+            "factor": "budget",
+            "description": f"{same_budget}/{others} traders in your cluster have a similar '{user.budget_range}' budget range",
+            "strength": "medium"
+        })
+    
+    return {
+        "cluster_id": user.cluster_id,
+        "cluster_size": others + 1,
+        "explanation": f"You were assigned to Cluster {user.cluster_id} based on your purchase patterns and preferences",
+        "factors": factors,
+        "similar_traders": [t for t in profile["representative_traders"] if t["id"] != user.id][:5],
+        "top_categories": profile["top_categories"],
+        "typical_products": profile["typical_products"],
+        "budget_mix": profile["budget_counts"]
+    }
+
+
 def generate_counterfactual_explanation(
     user: User,
     group_buy: GroupBuy,
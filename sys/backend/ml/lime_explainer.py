@@ -5,16 +5,45 @@ Uses LIME (Local Interpretable Model-agnostic Explanations) to provide
 interpretable explanations for individual recommendations.
 
 This complements the existing component-decomposition explainability.
+
+The explainer (background data + LimeTabularExplainer) is built once per
+loaded model version and shared by the process; explanations are memoised
+per (user, group-buy) on it with LRU eviction.
 """
 
-from typing import Dict, List, Any, Tuple
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Any, Optional, Tuple
+import copy
+import os
+import threading
+import time
+
 import numpy as np
 from lime.lime_tabular import LimeTabularExplainer
 from sklearn.preprocessing import StandardScaler
 
 from models.models import User, Product, GroupBuy, Transaction
+from monitoring.metrics import record_cache
 from sqlalchemy.orm import Session
 
+# User-product pairs sampled (per side) for the LIME background data
+TRAINING_SAMPLE_SIZE = 20
+# Explanations memoised per explainer (i.e. per model version)
+LIME_CACHE_SIZE = int(os.getenv("LIME_CACHE_SIZE", "512"))
+# Perturbation budget: default per explanation and the most a request may ask for
+LIME_NUM_SAMPLES = int(os.getenv("LIME_NUM_SAMPLES", "1000"))
+LIME_MAX_SAMPLES = int(os.getenv("LIME_MAX_SAMPLES", "5000"))
+# Threads scoring sample chunks, and seconds after which a partial result is returned (0 = none)
+LIME_WORKERS = int(os.getenv("LIME_WORKERS", "1"))
+LIME_DEADLINE_SECONDS = float(os.getenv("LIME_DEADLINE_SECONDS", "0"))
+LIME_SAMPLE_CHUNKS = int(os.getenv("LIME_SAMPLE_CHUNKS", "4"))
+MIN_CHUNK_SAMPLES = 50
+
+
+class ChunkAbandoned(Exception):
+    """Raised inside a sample chunk whose result is no longer wanted."""
+
 
 class LIMEExplainer:
     """
@@ -36,7 +65,12 @@ class LIMEExplainer:
         self.scaler = StandardScaler()
         self.feature_names = []
         self.training_data = None
+        self.product_categories = []
+        self.locations = []
         self.is_initialized = False
+        # (user_id, group_buy_id) -> (feature vector, explanation), LRU order
+        self._explanations: "OrderedDict[Tuple[int, int], Tuple[tuple, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
 
     def _prepare_training_data(self) -> Tuple[np.ndarray, List[str]]:
         """
@@ -47,9 +81,12 @@ class LIMEExplainer:
         Returns:
             Tuple of (feature_matrix, feature_names)
         """
-        # Get all users and products
-        users = self.db.query(User).filter(~User.is_admin).all()
-        products = self.db.query(Product).all()
+        # Only the columns the feature vectors use
+        users = self.db.query(
+            User.id, User.budget_range, User.experience_level,
+            User.participation_frequency, User.location_zone
+        ).filter(~User.is_admin).order_by(User.id).limit(TRAINING_SAMPLE_SIZE).all()
+        products = self.db.query(Product.id, Product.category).order_by(Product.id).limit(TRAINING_SAMPLE_SIZE).all()
 
         if not users or not products:
             raise ValueError("Insufficient data for LIME training")
@@ -64,34 +101,36 @@ class LIMEExplainer:
         ]
 
         # Product category features
-        product_categories = list(set(p.category for p in products if p.category))
+        product_categories = sorted(c for (c,) in self.db.query(Product.category).distinct() if c)
         product_feature_names = [f'category_{cat}' for cat in product_categories]
 
         # Location features
-        locations = list(set(u.location_zone for u in users))
+        locations = sorted(
+            (loc for (loc,) in self.db.query(User.location_zone).filter(~User.is_admin).distinct()),
+            key=lambda loc: (loc is None, loc or "")
+        )
         location_feature_names = [f'location_{loc}' for loc in locations]
+        self.product_categories = product_categories
+        self.locations = locations
 
         # Combine all feature names
         self.feature_names = user_feature_names + product_feature_names + location_feature_names
 
+        # Target: whether user has purchased this product (simplified), for all pairs at once
+        purchased = {(uid, pid) for uid, pid in self.db.query(Transaction.user_id, Transaction.product_id).filter(
+            Transaction.user_id.in_([u.id for u in users]),
+            Transaction.product_id.in_([p.id for p in products])
+        ).distinct()}
+
         # Create training examples (user-product pairs)
         training_examples = []
         targets = []
 
-        for user in users[:min(20, len(users))]:  # Reduced for performance
-            for product in products[:min(20, len(products))]:  # Reduced for performance
-
-                # Create feature vector
+        for user in users:
+            for product in products:
                 features = self._create_feature_vector(user, product, product_categories, locations)
                 training_examples.append(features)
-
-                # Target: whether user has purchased this product (simplified)
-                has_purchased = self.db.query(Transaction).filter(
-                    Transaction.user_id == user.id,
-                    Transaction.product_id == product.id
-                ).count() > 0
-
-                targets.append(1 if has_purchased else 0)
+                targets.append(1 if (user.id, product.id) in purchased else 0)
 
         if not training_examples:
             raise ValueError("No training examples generated")
@@ -194,19 +233,87 @@ class LIMEExplainer:
             print(f"❌ Failed to initialize LIME explainer: {e}")
             self.explainer = None
 
-    def explain_recommendation(self, user: User, group_buy: GroupBuy,
-                             predict_fn: callable) -> Dict[str, Any]:
+    def _explain_chunk(self, data_row: np.ndarray, predict_fn: callable, num_samples: int, seed: int,
+                       stop: Optional[threading.Event] = None):
+        """
+        One LIME run on its own random stream (safe to run next to other chunks).
+        Once `stop` is set the chunk gives up at its next check, before scoring
+        its perturbations, so abandoned chunks do not keep burning CPU.
+        """
+        def check():
+            if stop is not None and stop.is_set():
+                raise ChunkAbandoned()
+
+        def checked_predict_fn(X):
+            check()
+            return predict_fn(X)
+
+        check()
+        explainer = copy.copy(self.explainer)
+        explainer.random_state = np.random.RandomState(seed)
+        explainer.base = copy.copy(self.explainer.base)
+        explainer.base.random_state = explainer.random_state
+        explanation = explainer.explain_instance(
+            data_row=data_row, predict_fn=checked_predict_fn, num_features=10, num_samples=num_samples
+        )
+        return explanation.as_list(), float(explanation.local_pred[0]), float(explanation.intercept[1]), num_samples
+
+    def _run_lime(self, data_row: np.ndarray, predict_fn: callable, num_samples: int,
+                  deadline_seconds: float) -> Tuple[List[Tuple[str, float]], float, float, int]:
+        """
+        Explain `data_row` with `num_samples` perturbations. With LIME_WORKERS > 1
+        or a deadline, the budget is split into chunks run on a thread pool and the
+        chunks finished by the deadline are merged, weighted by their samples.
+        Returns (feature weights, local prediction, intercept, samples used).
+        """
+        n_chunks = min(max(LIME_WORKERS, LIME_SAMPLE_CHUNKS), num_samples // MIN_CHUNK_SAMPLES)
+        if n_chunks <= 1 or (LIME_WORKERS <= 1 and not deadline_seconds):
+            return self._explain_chunk(data_row, predict_fn, num_samples, seed=0)
+
+        sizes = [num_samples // n_chunks + (i < num_samples % n_chunks) for i in range(n_chunks)]
+        pool = ThreadPoolExecutor(max_workers=max(1, LIME_WORKERS))
+        stop = threading.Event()
+        try:
+            futures = [pool.submit(self._explain_chunk, data_row, predict_fn, size, i, stop)
+                       for i, size in enumerate(sizes)]
+            done, _ = wait(futures, timeout=deadline_seconds or None)
+            if not done:
+                # Nothing finished in time: settle for the first chunk that does
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            results = [f.result() for f in done]
+        finally:
+            # Queued chunks are cancelled; running ones stop at their next check
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        used = sum(r[3] for r in results)
+        weights = defaultdict(float)
+        for feature_weights, _, _, samples in results:
+            for feature, weight in feature_weights:
+                weights[feature] += weight * samples / used
+        merged = sorted(weights.items(), key=lambda item: abs(item[1]), reverse=True)[:10]
+        local_pred = sum(r[1] * r[3] for r in results) / used
+        intercept = sum(r[2] * r[3] for r in results) / used
+        return merged, local_pred, intercept, used
+
+    def explain_recommendation(self, user: User, group_buy: GroupBuy, predict_fn: callable,
+                               num_samples: Optional[int] = None,
+                               deadline_seconds: Optional[float] = None) -> Dict[str, Any]:
         """
         Generate LIME explanation for a specific recommendation.
 
         Args:
             user: Target user
             group_buy: Recommended group-buy
-            predict_fn: Function that takes feature vector and returns prediction
+            predict_fn: Function that takes a matrix of feature vectors and returns predictions
+            num_samples: Perturbation budget (default LIME_NUM_SAMPLES, capped at LIME_MAX_SAMPLES)
+            deadline_seconds: Seconds after which a partial explanation is returned
 
         Returns:
             LIME explanation as structured dictionary
         """
+        num_samples = max(MIN_CHUNK_SAMPLES, min(num_samples or LIME_NUM_SAMPLES, LIME_MAX_SAMPLES))
+        deadline_seconds = LIME_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
         if not self.is_initialized:
             self.initialize_explainer()
 
@@ -219,22 +326,27 @@ class LIMEExplainer:
 
         try:
             # Create feature vector for this user-product pair
-            product_categories = list(set(p.category for p in self.db.query(Product).all() if p.category))
-            locations = list(set(u.location_zone for u in self.db.query(User).filter(~User.is_admin).all()))
-
-            feature_vector = self._create_feature_vector(user, group_buy.product, product_categories, locations)
+            feature_vector = self._create_feature_vector(user, group_buy.product, self.product_categories, self.locations)
+            key = (user.id, group_buy.id)
+            with self._lock:
+                cached = self._explanations.get(key)
+                # Reuse an explanation computed with at least this budget
+                hit = cached is not None and cached[0] == tuple(feature_vector) and cached[1]["num_samples"] >= num_samples
+                if hit:
+                    self._explanations.move_to_end(key)
+            record_cache("lime_explanations", hit)
+            if hit:
+                return dict(cached[1])
 
             # Generate LIME explanation
-            explanation = self.explainer.explain_instance(
-                data_row=np.array(feature_vector),  # Convert to numpy array
-                predict_fn=predict_fn,  # Use the provided prediction function directly
-                num_features=10,  # Top 10 features
-                num_samples=1000  # Number of perturbations
+            started = time.monotonic()
+            feature_weights, local_pred, intercept, samples_used = self._run_lime(
+                np.array(feature_vector), predict_fn, num_samples, deadline_seconds
             )
 
             # Extract feature importances
             feature_importances = []
-            for feature_name, importance in explanation.as_list():
+            for feature_name, importance in feature_weights:
                 feature_importances.append({
                     "feature": feature_name,
                     "importance": round(importance, 4),
@@ -244,15 +356,27 @@ class LIMEExplainer:
             # Sort by absolute importance
             feature_importances.sort(key=lambda x: abs(x["importance"]), reverse=True)
 
-            return {
+            result = {
                 "method": "lime",
-                "prediction": explanation.local_pred[0] if hasattr(explanation, 'local_pred') else 0.7,
-                "intercept": explanation.intercept[1] if isinstance(explanation.intercept, dict) and 1 in explanation.intercept else 0,
+                "prediction": local_pred,
+                "intercept": intercept,
+                "num_samples": samples_used,
+                "requested_samples": num_samples,
+                "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
                 "feature_importances": feature_importances,
                 "top_features": feature_importances[:5],
                 "explanation_summary": self._generate_summary(feature_importances, group_buy.product.name),
                 "confidence": self._calculate_confidence(feature_importances)
             }
+            if samples_used < num_samples:
+                # Partial (deadline) results are returned but not memoised
+                return result
+            with self._lock:
+                self._explanations[key] = (tuple(feature_vector), result)
+                self._explanations.move_to_end(key)
+                while len(self._explanations) > LIME_CACHE_SIZE:
+                    self._explanations.popitem(last=False)
+            return dict(result)
 
         except Exception as e:
             print(f"❌ LIME explanation failed: {e}")
@@ -367,26 +491,91 @@ class LIMEExplainer:
             return "low"
 
 
-# Global explainer instance
+# Global explainer instance and the model version it was built for
 _lime_explainer = None
+_lime_model_version = None
+_lime_lock = threading.Lock()
 
 def get_lime_explainer(db: Session) -> LIMEExplainer:
     """
-    Get or create global LIME explainer instance.
+    Get the process-wide LIME explainer, building it (background data and
+    LimeTabularExplainer) only when the loaded model version changes.
 
     Args:
-        db: Database session
+        db: Database session (used only when the explainer is (re)built)
 
     Returns:
         LIMEExplainer instance
     """
-    global _lime_explainer
-    if _lime_explainer is None:
-        _lime_explainer = LIMEExplainer(db)
-    return _lime_explainer
-
+    global _lime_explainer, _lime_model_version
+    from ml.ml import get_model_version
+
+    version = get_model_version()
+    with _lime_lock:
+        if _lime_explainer is None or _lime_model_version != version:
+            _lime_explainer, _lime_model_version = LIMEExplainer(db), version
+        if not _lime_explainer.is_initialized:
+            # First use, or an earlier initialisation failed: (re)try with this session
+            _lime_explainer.db = db
+            _lime_explainer.initialize_explainer()
+        return _lime_explainer
+
+
+def clear_lime_explainer():
+    """Drop the cached explainer and its memoised explanations."""
+    global _lime_explainer, _lime_model_version
+    with _lime_lock:
+        _lime_explainer, _lime_model_version = None, None
+
+
+# Rule weights of the simulated hybrid scorer: budget, experience and
+# frequency one-hots (rows) -> (cf, cbf, popularity) adjustments
+PROFILE_SCORE_WEIGHTS = np.array([
+    [0.3, 0.2, 0.0],    # budget_medium
+    [0.2, 0.0, 0.3],    # budget_high
+    [-0.4, -0.3, 0.0],  # budget_low
+    [-0.5, -0.4, 0.0],  # experience_beginner
+    [0.3, 0.2, 0.0],    # experience_intermediate
+    [0.2, 0.4, 0.0],    # experience_advanced
+    [-0.3, 0.0, -0.2],  # frequency_occasional
+    [0.2, 0.0, 0.1],    # frequency_regular
+    [0.4, 0.0, 0.3],    # frequency_frequent
+])
+BASE_COMPONENT_SCORES = np.array([0.4, 0.4, 0.2])
+CATEGORY_MATCH_SCORES = np.array([0.0, 0.6, 0.0])
+LOCATION_MATCH_SCORES = np.array([0.2, 0.0, 0.0])
+HYBRID_WEIGHTS = np.array([0.6, 0.3, 0.1])  # Same as the main system's ALPHA, BETA, GAMMA
+
+
+def build_predict_fn(n_categories: int):
+    """
+    Prediction function that simulates hybrid recommender logic for LIME,
+    scoring the whole perturbation matrix at once.
+    """
+    n_profile = len(PROFILE_SCORE_WEIGHTS)
+    category_end = n_profile + n_categories
 
-def explain_with_lime(user: User, group_buy: GroupBuy, db: Session) -> Dict[str, Any]:
+    def predict_fn(X):
+        X = np.asarray(X, dtype=float)
+        active = X > 0
+        components = BASE_COMPONENT_SCORES + active[:, :n_profile] @ PROFILE_SCORE_WEIGHTS
+        components += np.outer(active[:, n_profile:category_end].any(axis=1), CATEGORY_MATCH_SCORES)
+        components += np.outer(active[:, category_end:].any(axis=1), LOCATION_MATCH_SCORES)
+
+        # Sigmoid for smoother scaling into 0-1
+        hybrid_score = 1 / (1 + np.exp(-(components @ HYBRID_WEIGHTS)))
+        return np.column_stack([1 - hybrid_score, hybrid_score])
+
+    return predict_fn
+
+
+def explain_with_lime(
+    user: User,
+    group_buy: GroupBuy,
+    db: Session,
+    num_samples: Optional[int] = None,
+    deadline_seconds: Optional[float] = None
+) -> Dict[str, Any]:
     """
     Convenience function to get LIME explanation for a recommendation.
 
@@ -394,79 +583,13 @@ def explain_with_lime(user: User, group_buy: GroupBuy, db: Session) -> Dict[str,
         user: Target user
         group_buy: Recommended group-buy
         db: Database session
+        num_samples: Perturbation budget (default LIME_NUM_SAMPLES)
+        deadline_seconds: Return a best-effort explanation after this long
+            (default LIME_DEADLINE_SECONDS, 0 = no deadline)
 
     Returns:
         LIME explanation dictionary
     """
     explainer = get_lime_explainer(db)
-
-    # Create a prediction function that simulates the hybrid recommender logic
-    def predict_fn(X):
-        """
-        Prediction function that simulates hybrid recommender logic.
-        This gives LIME realistic variations to explain.
-        """
-        predictions = []
-
-        for features in X:
-            # Simulate hybrid recommender scoring based on features
-            cf_score = 0.4  # Base collaborative filtering score
-            cbf_score = 0.4  # Base content-based score
-            pop_score = 0.2  # Base popularity score
-
-            # Adjust scores based on user features with stronger effects
-            # Budget features (indices 0-2)
-            if features[0] > 0:  # medium budget
-                cf_score += 0.3  # Strong positive effect
-                cbf_score += 0.2
-            if features[1] > 0:  # high budget
-                cf_score += 0.2
-                pop_score += 0.3  # High budget users like popular items
-            if features[2] > 0:  # low budget
-                cf_score -= 0.4  # Strong negative effect
-                cbf_score -= 0.3
-
-            # Experience features (indices 3-5)
-            if features[3] > 0:  # beginner
-                cf_score -= 0.5  # Beginners are much less likely
-                cbf_score -= 0.4
-            if features[4] > 0:  # intermediate
-                cf_score += 0.3
-                cbf_score += 0.2
-            if features[5] > 0:  # advanced
-                cf_score += 0.2
-                cbf_score += 0.4  # Advanced users match categories well
-
-            # Frequency features (indices 6-8)
-            if features[6] > 0:  # occasional
-                cf_score -= 0.3
-                pop_score -= 0.2
-            if features[7] > 0:  # regular
-                cf_score += 0.2
-                pop_score += 0.1
-            if features[8] > 0:  # frequent
-                cf_score += 0.4  # Frequent users are much more likely
-                pop_score += 0.3
-
-            # Category features (strong impact for content-based filtering)
-            category_start_idx = 9
-            if any(features[category_start_idx:category_start_idx+8] > 0):
-                cbf_score += 0.6  # Very strong category matching boost
-
-            # Location features (moderate impact)
-            location_start_idx = category_start_idx + 8
-            if any(features[location_start_idx:] > 0):
-                cf_score += 0.2  # Location proximity helps
-
-            # Combine scores using hybrid weights (same as main system)
-            ALPHA, BETA, GAMMA = 0.6, 0.3, 0.1
-            hybrid_score = ALPHA * cf_score + BETA * cbf_score + GAMMA * pop_score
-
-            # Normalize to 0-1 range with sigmoid-like transformation
-            hybrid_score = 1 / (1 + np.exp(-hybrid_score))  # Sigmoid for smoother scaling
-
-            predictions.append([1 - hybrid_score, hybrid_score])
-
-        return np.array(predictions)
-
-    return explainer.explain_recommendation(user, group_buy, predict_fn)
\ No newline at end of file
+    predict_fn = build_predict_fn(len(explainer.product_categories))
+    return explainer.explain_recommendation(user, group_buy, predict_fn, num_samples, deadline_seconds)
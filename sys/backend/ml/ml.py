@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
@@ -15,16 +16,27 @@ from sklearn.preprocessing import MinMaxScaler
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.decomposition import NMF
 # import shap  # Temporarily disabled due to llvmlite compatibility issue
-from db.database import get_db
+from api.responses import model_response
+from db.database import get_db, get_async_read_db
 # Cold-start handler removed - all recommendations are now ML-based
 from models.models import User, GroupBuy, Transaction, Product, MLModel, Contribution, AdminGroup, AdminGroupJoin
 from models.analytics_models import UserBehaviorFeatures as AnalyticsUserBehaviorFeatures
 from authentication.auth import verify_token, get_current_user, verify_trader, verify_admin
 from websocket.websocket_manager import manager
-from .explainability import explain_recommendation, explain_cluster_assignment, generate_counterfactual_explanation
-from .lime_explainer import explain_with_lime
+from .explainability import (
+    explain_recommendation,
+    explain_recommendations,
+    get_cluster_explanation,
+    generate_counterfactual_explanation,
+)
+from .lime_explainer import LIME_NUM_SAMPLES, explain_with_lime
+from .cluster_profiles import build_cluster_profiles, get_cluster_profiles
 import logging
 from .ml_dashboard import router as dashboard_router
+from analytics.columnar_export import load_table_frame
+from .user_similarity import get_similar_users, find_similar_traders, SIMILARITY_TOP_N
+from .cluster_participation import get_cluster_participation, refresh_cluster_participation
+from monitoring.metrics import SCORING_SECONDS, TrainingStageTimer
 
 # ======================
 # BEHAVIORAL ANALYTICS INTEGRATION
@@ -525,6 +537,10 @@ class TrainingVisualization(BaseModel):
     inertia_scores: List[float]
 
 # Helper Functions
+def get_model_version() -> str:
+    """Version stamp of the loaded model bundle; changes on retraining/reload."""
+    return (feature_store or {}).get("model_version", "untrained")
+
 def load_models():
     """Load trained ML models from disk (Hybrid Recommender)"""
     global clustering_model, nmf_model, tfidf_model, scaler, feature_store
@@ -562,6 +578,8 @@ def load_models():
         if os.path.exists(feature_store_path):
             with open(feature_store_path, 'r') as f:
                 feature_store = json.load(f)
+            # Bundles saved before versioning are identified by their save time
+            feature_store.setdefault("model_version", str(int(os.path.getmtime(feature_store_path))))
             print("[OK] Loaded feature_store.json")
     except Exception as e:
         print(f"[WARNING] Error loading models: {e}")
@@ -587,11 +605,13 @@ async def train_clustering_model_with_progress(db: Session):
     # Store training status in a global variable (in production, use Redis/database)
     global current_training_status
     current_training_status = training_status
+    stage_timer = TrainingStageTimer()
     
     try:
         # Stage 1: Data Collection (10%)
         print("[1/7] Data Collection...")
         training_status["current_stage"] = "data_collection"
+        stage_timer.start("data_collection")
         training_status["progress"] = 10
         training_status["stages_completed"].append("data_collection")
         
@@ -621,17 +641,22 @@ async def train_clustering_model_with_progress(db: Session):
                 'bulk_price': p.bulk_price
             })
         
-        # Get transaction data for all users
-        transactions = db.query(Transaction).all()
+        # Get transaction data for all users (columnar frames, not ORM objects)
+        transactions = load_table_frame(
+            db, "transactions", columns=["user_id", "product_id", "quantity", "amount", "location_zone"]
+        )
         if len(transactions) < 10:
             raise ValueError(f"Not enough transactions for training (minimum 10 required, found {len(transactions)})")
         
         # Get recommendation events (clicks and joins) for implicit feedback
-        from models import RecommendationEvent
-        recommendation_events = db.query(RecommendationEvent).all()
-        click_events = [e for e in recommendation_events if e.clicked]
-        join_events = [e for e in recommendation_events if e.joined]
-        print(f"   [OK] Found {len(click_events)} click events, {len(join_events)} join events")
+        recommendation_events = load_table_frame(
+            db, "recommendation_events", columns=["user_id", "group_buy_id", "clicked", "joined"]
+        )
+        clicked_mask = recommendation_events["clicked"].fillna(False).astype(bool)
+        joined_mask = recommendation_events["joined"].fillna(False).astype(bool)
+        n_click_events = int(clicked_mask.sum())
+        n_join_events = int(joined_mask.sum())
+        print(f"   [OK] Found {n_click_events} click events, {n_join_events} join events")
         
         users = db.query(User).filter(~User.is_admin).all()
         if len(users) < 4:
@@ -647,6 +672,7 @@ async def train_clustering_model_with_progress(db: Session):
         # Stage 2: Matrix Building (20%)
         print("[2/7] Building User-Product Matrix...")
         training_status["current_stage"] = "matrix_building"
+        stage_timer.start("matrix_building")
         training_status["progress"] = 20
         training_status["stages_completed"].append("matrix_building")
         
@@ -659,68 +685,52 @@ async def train_clustering_model_with_progress(db: Session):
             "timestamp": datetime.utcnow().isoformat()
         }))
         
-        user_product_matrix = np.zeros((n_users, n_products))
+        user_index = pd.Index(user_ids)
+        product_index = pd.Index(product_ids)
+        
+        def _interaction_matrix(frame: pd.DataFrame, weights) -> np.ndarray:
+            """Scatter-add weights into a users x products matrix, skipping unknown ids"""
+            matrix = np.zeros((n_users, n_products))
+            rows = user_index.get_indexer(frame["user_id"])
+            cols = product_index.get_indexer(frame["product_id"])
+            valid = (rows >= 0) & (cols >= 0)
+            np.add.at(matrix, (rows[valid], cols[valid]), np.asarray(weights, dtype=float)[valid])
+            return matrix
         
         # 1. Add transaction data (explicit feedback - strongest signal)
-        for tx in transactions:
-            try:
-                if tx.user_id not in user_ids:
-                    continue
-                user_idx = user_ids.index(tx.user_id)
-                
-                if tx.product_id not in product_ids:
-                    continue
-                prod_idx = product_ids.index(tx.product_id)
-                
-                user_product_matrix[user_idx, prod_idx] += tx.quantity
-            except (ValueError, IndexError):
-                continue
+        purchase_matrix = _interaction_matrix(transactions, transactions["quantity"].fillna(0))
+        
+        # Resolve group buys to products with one query instead of one per event
+        group_ids = recommendation_events.loc[clicked_mask | joined_mask, "group_buy_id"].dropna().unique().tolist()
+        group_products = dict(
+            db.query(GroupBuy.id, GroupBuy.product_id).filter(GroupBuy.id.in_(group_ids)).all()
+        ) if group_ids else {}
+        recommendation_events["product_id"] = recommendation_events["group_buy_id"].map(group_products)
         
         # 2. Add click events as implicit feedback (weaker signal)
         # Clicks indicate interest even without purchase
         click_weight = 0.3  # Click = 30% of a purchase
-        for event in click_events:
-            try:
-                if event.user_id not in user_ids:
-                    continue
-                user_idx = user_ids.index(event.user_id)
-                
-                # Get product_id from group_buy
-                group_buy = db.query(GroupBuy).filter(GroupBuy.id == event.group_buy_id).first()
-                if not group_buy or group_buy.product_id not in product_ids:
-                    continue
-                prod_idx = product_ids.index(group_buy.product_id)
-                
-                user_product_matrix[user_idx, prod_idx] += click_weight
-            except (ValueError, IndexError):
-                continue
+        clicks = recommendation_events[clicked_mask]
         
         # 3. Add join events as stronger implicit feedback
         # Joins indicate strong intent (even if payment not completed)
         join_weight = 0.7  # Join = 70% of a purchase
-        for event in join_events:
-            try:
-                if event.user_id not in user_ids:
-                    continue
-                user_idx = user_ids.index(event.user_id)
-                
-                # Get product_id from group_buy
-                group_buy = db.query(GroupBuy).filter(GroupBuy.id == event.group_buy_id).first()
-                if not group_buy or group_buy.product_id not in product_ids:
-                    continue
-                prod_idx = product_ids.index(group_buy.product_id)
-                
-                user_product_matrix[user_idx, prod_idx] += join_weight
-            except (ValueError, IndexError):
-                continue
+        joins = recommendation_events[joined_mask]
+        
+        user_product_matrix = (
+            purchase_matrix
+            + _interaction_matrix(clicks, np.full(len(clicks), click_weight))
+            + _interaction_matrix(joins, np.full(len(joins), join_weight))
+        )
         
         sparsity = (user_product_matrix == 0).sum() / user_product_matrix.size * 100
         print(f"   [OK] Matrix built: {user_product_matrix.shape}, sparsity: {sparsity:.1f}%")
-        print(f"   [OK] Incorporated {len(click_events)} clicks, {len(join_events)} joins as implicit feedback")
+        print(f"   [OK] Incorporated {n_click_events} clicks, {n_join_events} joins as implicit feedback")
         
         # Stage 3: Clustering (40%)
         print("[3/7] Clustering Users...")
         training_status["current_stage"] = "clustering"
+        stage_timer.start("clustering")
         training_status["progress"] = 40
         training_status["stages_completed"].append("clustering")
         
@@ -735,15 +745,8 @@ async def train_clustering_model_with_progress(db: Session):
         
         # Build trader features
         trader_features = []
-        for user in users:
-            user_vector = np.zeros(n_products)
-            user_transactions = [tx for tx in transactions if tx.user_id == user.id]
-            for tx in user_transactions:
-                try:
-                    prod_idx = product_ids.index(tx.product_id)
-                    user_vector[prod_idx] += tx.quantity
-                except ValueError:
-                    continue
+        for user_idx, user in enumerate(users):
+            user_vector = purchase_matrix[user_idx]
             
             pref_features = np.zeros(10)
             if user.preferred_categories:
@@ -804,16 +807,21 @@ async def train_clustering_model_with_progress(db: Session):
         clustering_model = KMeans(n_clusters=best_k, init="k-means++", n_init=10, random_state=42)
         clustering_model.fit(mat_scaled)
         
-        for idx, user_id in enumerate(user_ids):
-            user = db.query(User).filter(User.id == user_id).first()
-            if user:
-                user.cluster_id = int(clustering_model.labels_[idx])
+        for idx, user in enumerate(users):
+            user.cluster_id = int(clustering_model.labels_[idx])
+        
+        # Snapshot per-cluster profiles for /clusters and cluster explanations
+        cluster_profiles = build_cluster_profiles(
+            users, clustering_model.labels_, purchase_matrix, products, transactions,
+            clustering_model.transform(mat_scaled)
+        )
         
         print(f"   [OK] Clustering complete: {best_k} clusters, silhouette={best_score:.4f}")
         
         # Stage 4: NMF Training (60%)
         print("[4/7] Training NMF (Collaborative Filtering)...")
         training_status["current_stage"] = "nmf_training"
+        stage_timer.start("nmf_training")
         training_status["progress"] = 60
         training_status["stages_completed"].append("nmf_training")
         
@@ -835,6 +843,7 @@ async def train_clustering_model_with_progress(db: Session):
         # Stage 5: TF-IDF Processing (75%)
         print("[5/7] Processing TF-IDF (Content-Based Filtering)...")
         training_status["current_stage"] = "tfidf_processing"
+        stage_timer.start("tfidf_processing")
         training_status["progress"] = 75
         training_status["stages_completed"].append("tfidf_processing")
         
@@ -858,6 +867,7 @@ async def train_clustering_model_with_progress(db: Session):
         # Stage 6: Hybrid Fusion (90%)
         print("[6/7] Creating Hybrid Model...")
         training_status["current_stage"] = "hybrid_fusion"
+        stage_timer.start("hybrid_fusion")
         training_status["progress"] = 90
         training_status["stages_completed"].append("hybrid_fusion")
         
@@ -873,6 +883,7 @@ async def train_clustering_model_with_progress(db: Session):
         # Stage 7: Saving Models (100%)
         print("[7/7] Saving Models...")
         training_status["current_stage"] = "model_saving"
+        stage_timer.start("model_saving")
         training_status["progress"] = 100
         training_status["stages_completed"].append("model_saving")
         
@@ -905,9 +916,11 @@ async def train_clustering_model_with_progress(db: Session):
             "silhouette_score": float(best_score),
             "user_ids": user_ids,
             "product_ids": [int(p.id) for p in products],
+            "model_version": datetime.utcnow().strftime("%Y%m%d%H%M%S%f"),
+            "cluster_profiles": cluster_profiles,
             "events_used": {
-                "click_events": len(click_events),
-                "join_events": len(join_events),
+                "click_events": n_click_events,
+                "join_events": n_join_events,
                 "click_weight": click_weight,
                 "join_weight": join_weight
             }
@@ -932,6 +945,10 @@ async def train_clustering_model_with_progress(db: Session):
         db.add(ml_model)
         db.commit()
         
+        # Cluster ids changed: rebuild the admin-group participation index
+        refresh_cluster_participation(db)
+        
+        stage_timer.finish()
         training_status["status"] = "completed"
         training_status["completed_at"] = datetime.utcnow()
         
@@ -992,8 +1009,34 @@ current_training_status = {
     "error": None
 }
 
-def get_recommendations_for_user(user: User, db: Session) -> List[dict]:
-    """Generate recommendations using Hybrid Recommender with Analytics"""
+async def load_recommendation_candidates(adb: AsyncSession, user: User, db: Session):
+    """
+    Active group-buys to score for `user` (their zone first, else all zones)
+    and the ids of groups they already joined, read on the async session.
+    The groups are merged into `db` without further queries.
+    """
+    candidates = select(GroupBuy).where(
+        GroupBuy.status == "active",
+        GroupBuy.deadline > datetime.utcnow()
+    ).options(selectinload(GroupBuy.product), selectinload(GroupBuy.contributions))
+    
+    active_groups = (await adb.scalars(
+        candidates.where(GroupBuy.location_zone == (user.location_zone or "Harare"))
+    )).all()
+    if not active_groups:
+        active_groups = (await adb.scalars(candidates)).all()
+    
+    joined_group_ids = set((await adb.scalars(
+        select(Contribution.group_buy_id).where(Contribution.user_id == user.id)
+    )).all())
+    return [db.merge(group, load=False) for group in active_groups], joined_group_ids
+
+def get_recommendations_for_user(user: User, db: Session, candidates=None) -> List[dict]:
+    """
+    Generate recommendations using Hybrid Recommender with Analytics.
+    `candidates` is an optional (active_groups, joined_group_ids) pair from
+    load_recommendation_candidates; otherwise they are queried here.
+    """
     global nmf_model, tfidf_model, clustering_model, scaler, feature_store
     
     # Load behavioral features
@@ -1009,20 +1052,24 @@ def get_recommendations_for_user(user: User, db: Session) -> List[dict]:
                          if user_behavior else []
     }
     
-    # Get active group-buys in user's zone or all zones for category matching
-    user_location = user.location_zone or "Harare"
-    active_groups = db.query(GroupBuy).filter(
-        GroupBuy.location_zone == user_location,
-        GroupBuy.status == "active",
-        GroupBuy.deadline > datetime.utcnow()
-    ).all()
-    
-    # If no groups in user's zone, get all active groups
-    if not active_groups:
+    user_joined_group_ids = None
+    if candidates is not None:
+        active_groups, user_joined_group_ids = candidates
+    else:
+        # Get active group-buys in user's zone or all zones for category matching
+        user_location = user.location_zone or "Harare"
         active_groups = db.query(GroupBuy).filter(
+            GroupBuy.location_zone == user_location,
             GroupBuy.status == "active",
             GroupBuy.deadline > datetime.utcnow()
         ).all()
+        
+        # If no groups in user's zone, get all active groups
+        if not active_groups:
+            active_groups = db.query(GroupBuy).filter(
+                GroupBuy.status == "active",
+                GroupBuy.deadline > datetime.utcnow()
+            ).all()
     
     if not active_groups:
         # Fallback to all AdminGroups if no Mbare GroupBuys
@@ -1032,11 +1079,11 @@ def get_recommendations_for_user(user: User, db: Session) -> List[dict]:
         return get_admin_group_recommendations(user, admin_groups, db)
     
     # Filter out groups the user has already joined
-    user_joined_group_ids = set()
-    user_contributions = db.query(Contribution.group_buy_id).filter(
-        Contribution.user_id == user.id
-    ).all()
-    user_joined_group_ids = {contrib.group_buy_id for contrib in user_contributions}
+    if user_joined_group_ids is None:
+        user_contributions = db.query(Contribution.group_buy_id).filter(
+            Contribution.user_id == user.id
+        ).all()
+        user_joined_group_ids = {contrib.group_buy_id for contrib in user_contributions}
     
     # Filter active groups to exclude joined ones
     available_groups = [g for g in active_groups if g.id not in user_joined_group_ids]
@@ -1081,47 +1128,50 @@ def get_recommendations_for_user(user: User, db: Session) -> List[dict]:
         
         # === HYBRID SCORING ===
         # 1. Collaborative Filtering (NMF)
-        W_user = nmf_model.transform(user_vector.reshape(1, -1))
-        H = nmf_model.components_
-        cf_scores = np.dot(W_user, H).flatten()
-        
+        with SCORING_SECONDS.labels("cf").time():
+            W_user = nmf_model.transform(user_vector.reshape(1, -1))
+            H = nmf_model.components_
+            cf_scores = np.dot(W_user, H).flatten()
+
         # 2. Content-Based Filtering (TF-IDF)
-        products = db.query(Product).filter(Product.id.in_(product_ids)).all()
-        prod_texts = []
-        for pid in product_ids:
-            p = next((prod for prod in products if prod.id == pid), None)
-            if p:
-                text = f"{p.name} {p.description or ''} {p.category or 'general'}"
-                prod_texts.append(text)
-            else:
-                prod_texts.append("")
-        
-        prod_tfidf = tfidf_model.transform(prod_texts)
-        user_profile = user_vector @ prod_tfidf.toarray()
-        user_norm = np.linalg.norm(user_profile) + 1e-9
-        user_profile_norm = user_profile / user_norm
-        
-        prod_norms = np.linalg.norm(prod_tfidf.toarray(), axis=1, keepdims=True) + 1e-9
-        prod_vecs_norm = prod_tfidf.toarray() / prod_norms
-        
-        cbf_scores = np.dot(user_profile_norm, prod_vecs_norm.T).flatten()
-        
+        with SCORING_SECONDS.labels("cbf").time():
+            products = db.query(Product).filter(Product.id.in_(product_ids)).all()
+            prod_texts = []
+            for pid in product_ids:
+                p = next((prod for prod in products if prod.id == pid), None)
+                if p:
+                    text = f"{p.name} {p.description or ''} {p.category or 'general'}"
+                    prod_texts.append(text)
+                else:
+                    prod_texts.append("")
+        
+            prod_tfidf = tfidf_model.transform(prod_texts)
+            user_profile = user_vector @ prod_tfidf.toarray()
+            user_norm = np.linalg.norm(user_profile) + 1e-9
+            user_profile_norm = user_profile / user_norm
+        
+            prod_norms = np.linalg.norm(prod_tfidf.toarray(), axis=1, keepdims=True) + 1e-9
+            prod_vecs_norm = prod_tfidf.toarray() / prod_norms
+        
+            cbf_scores = np.dot(user_profile_norm, prod_vecs_norm.T).flatten()
+
         # 3. Popularity Boost
-        all_transactions = db.query(Transaction).all()
-        product_popularity = np.zeros(n_products)
-        for tx in all_transactions:
-            try:
-                prod_idx = product_ids.index(tx.product_id)
-                product_popularity[prod_idx] += tx.quantity
-            except ValueError:
-                continue
-        
-        pop_min, pop_max = product_popularity.min(), product_popularity.max()
-        if pop_max > pop_min:
-            pop_norm = (product_popularity - pop_min) / (pop_max - pop_min)
-        else:
-            pop_norm = product_popularity * 0
+        with SCORING_SECONDS.labels("popularity").time():
+            all_transactions = db.query(Transaction).all()
+            product_popularity = np.zeros(n_products)
+            for tx in all_transactions:
+                try:
+                    prod_idx = product_ids.index(tx.product_id)
+                    product_popularity[prod_idx] += tx.quantity
+                except ValueError:
+                    continue
         
+            pop_min, pop_max = product_popularity.min(), product_popularity.max()
+            if pop_max > pop_min:
+                pop_norm = (product_popularity - pop_min) / (pop_max - pop_min)
+            else:
+                pop_norm = product_popularity * 0
+
         # Enhanced hybrid scoring with behavioral factors
         cf_weight = ALPHA * (0.5 + (behavior_factors['engagement_weight'] * 0.5))
         cbf_weight = BETA * category_boost(available_groups[0].product.category, behavior_factors['top_categories'])
@@ -1442,46 +1492,27 @@ def get_simple_recommendations(user: User, db: Session, active_groups) -> List[d
 def get_similarity_based_recommendations(user: User, db: Session, active_groups: List[GroupBuy], top_k: int = 10) -> List[dict]:
     """Get recommendations based on user similarity for new users without transaction history"""
     
-    # Get all users with preferences (exclude the target user)
-    all_users = db.query(User).filter(
-        User.id != user.id,
-        User.preferred_categories.isnot(None)
-    ).all()
-    
-    if not all_users:
-        return []
-    
-    # Calculate similarity scores for all users
-    user_similarities = []
-    for other_user in all_users:
-        similarity = calculate_user_similarity(user, other_user)
-        if similarity > 0.3:  # Only consider users with reasonable similarity
-            user_similarities.append((other_user, similarity))
-    
-    # Sort by similarity (highest first)
-    user_similarities.sort(key=lambda x: x[1], reverse=True)
-    
-    # Take top 50 most similar users to avoid too many queries
-    top_similar_users = user_similarities[:50]
+    # Top 50 traders with reasonable similarity, scored against the in-memory preference index
+    top_similar_users = find_similar_traders(db, user, min_similarity=0.3, limit=50)
     
     if not top_similar_users:
         return []
     
-    # Get groups that similar users have joined
-    similar_user_ids = [u.id for u, _ in top_similar_users]
-    contributions = db.query(Contribution).filter(
-        Contribution.user_id.in_(similar_user_ids)
-    ).all()
+    # Count how often similar users joined each active group (one grouped query)
+    similarity_by_user = dict(top_similar_users)
+    active_by_id = {gb.id: gb for gb in active_groups}
+    participation = db.query(
+        Contribution.group_buy_id,
+        Contribution.user_id,
+        func.count(Contribution.id)
+    ).filter(
+        Contribution.user_id.in_(list(similarity_by_user)),
+        Contribution.group_buy_id.in_(list(active_by_id))
+    ).group_by(Contribution.group_buy_id, Contribution.user_id).all()
     
     # Count group participation and average similarity
     group_scores = {}
-    for contrib in contributions:
-        group_id = contrib.group_buy_id
-        user_id = contrib.user_id
-        
-        # Find similarity score for this user
-        user_similarity = next((sim for u, sim in top_similar_users if u.id == user_id), 0)
-        
+    for group_id, member_id, n_contributions in participation:
         if group_id not in group_scores:
             group_scores[group_id] = {
                 'total_similarity': 0.0,
@@ -1489,8 +1520,8 @@ def get_similarity_based_recommendations(user: User, db: Session, active_groups:
                 'avg_similarity': 0.0
             }
         
-        group_scores[group_id]['total_similarity'] += user_similarity
-        group_scores[group_id]['participant_count'] += 1
+        group_scores[group_id]['total_similarity'] += similarity_by_user[member_id] * n_contributions
+        group_scores[group_id]['participant_count'] += n_contributions
     
     # Calculate average similarity for each group
     for group_id, scores in group_scores.items():
@@ -1498,11 +1529,10 @@ def get_similarity_based_recommendations(user: User, db: Session, active_groups:
     
     # Create recommendations from active groups
     recommendations = []
-    active_group_ids = {gb.id for gb in active_groups}
     
     for group_id, scores in group_scores.items():
-        if group_id in active_group_ids:
-            group_buy = next((gb for gb in active_groups if gb.id == group_id), None)
+        if group_id in active_by_id:
+            group_buy = active_by_id[group_id]
             if group_buy:
                 # Base score on average similarity of participants
                 base_score = scores['avg_similarity']
@@ -1593,13 +1623,17 @@ def get_similarity_based_recommendations(user: User, db: Session, active_groups:
 @router.get("/recommendations", response_model=List[RecommendationResponse])
 async def get_recommendations(
     user: User = Depends(verify_trader),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    adb: AsyncSession = Depends(get_async_read_db)
 ):
     """Get personalized recommendations for the current user using hybrid approach"""
     from models import RecommendationEvent
     
+    # Candidate groups are fetched without blocking the event loop
+    candidates = await load_recommendation_candidates(adb, user, db)
+    
     # Use hybrid recommendations (ML for established users, similarity for new users)
-    recommendations = get_hybrid_recommendations(user.id, db)
+    recommendations = get_hybrid_recommendations(user.id, db, candidates=candidates)
     
     # Track that recommendations were shown
     for rec in recommendations:
@@ -1615,7 +1649,7 @@ async def get_recommendations(
     if recommendations:
         db.commit()
     
-    return recommendations
+    return model_response(recommendations, RecommendationResponse)
 
 
 # ===== RECOMMENDATION EVENT TRACKING ENDPOINTS =====
@@ -1747,7 +1781,21 @@ async def get_clusters(
     db: Session = Depends(get_db)
 ):
     """Get cluster information (for admin/analysis)"""
-    # Get cluster statistics
+    # Served from the profiles snapshotted at training time
+    profiles = get_cluster_profiles()
+    if profiles is not None:
+        return [
+            ClusterInfo(
+                cluster_id=p["cluster_id"],
+                size=p["size"],
+                avg_quantity=p["avg_quantity"],
+                avg_contribution=p["avg_contribution"],
+                dominant_location=p["dominant_location"]
+            )
+            for p in profiles
+        ]
+    
+    # Models trained before profiles were stored: compute from the database
     cluster_stats = db.query(
         User.cluster_id,
         func.count(User.id).label('size')
@@ -2340,28 +2388,11 @@ def get_user_similarity_based_recommendations(user_id: int, db: Session, limit:
         if not target_user:
             return []
         
-        # Get all other users with complete profiles
-        other_users = db.query(User).filter(
-            User.id != user_id,
-            User.preferred_categories.isnot(None),
-            User.budget_range.isnot(None),
-            User.experience_level.isnot(None),
-            User.preferred_group_sizes.isnot(None),
-            User.participation_frequency.isnot(None)
-        ).all()
-        
-        if not other_users:
+        # Precomputed neighbours, most similar first (one indexed query)
+        similarities = get_similar_users(db, user_id, limit=SIMILARITY_TOP_N)
+        if not similarities:
             return []
         
-        # Calculate similarity scores
-        similarities = []
-        for user in other_users:
-            sim_score = calculate_user_similarity(target_user, user)
-            similarities.append((user, sim_score))
-        
-        # Sort by similarity (highest first)
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        
         # Get groups that similar users have joined (using Contribution table for GroupBuy)
         recommended_groups = []
         seen_group_ids = set()
@@ -2373,19 +2404,24 @@ def get_user_similarity_based_recommendations(user_id: int, db: Session, limit:
         ).all()
         user_joined_group_ids = {contrib.group_buy_id for contrib in user_contributions}
         
-        for similar_user, sim_score in similarities[:20]:  # Top 20 most similar users
-            # Get groups this user has joined (using Contribution table for GroupBuy)
-            user_groups = db.query(GroupBuy).join(Contribution).filter(
-                Contribution.user_id == similar_user.id,
-                Contribution.is_fully_paid  # Only count fully paid participations
-            ).all()
-            
-            for group in user_groups:
+        # Active groups joined by any neighbour, fetched in one query
+        groups_by_user = defaultdict(list)
+        neighbour_groups = db.query(GroupBuy, Contribution.user_id).join(Contribution).options(
+            joinedload(GroupBuy.product)
+        ).filter(
+            Contribution.user_id.in_([similar_user_id for similar_user_id, _ in similarities]),
+            Contribution.is_fully_paid,  # Only count fully paid participations
+            GroupBuy.status == 'active'
+        ).all()
+        for group, member_id in neighbour_groups:
+            groups_by_user[member_id].append(group)
+        
+        for similar_user_id, sim_score in similarities:
+            for group in groups_by_user[similar_user_id]:
                 if (group.id not in seen_group_ids and 
-                    group.status == 'active' and 
                     group.id not in user_joined_group_ids):  # Exclude already joined groups
                     # Calculate recommendation score based on similarity and group metrics
-                    rec_score = sim_score * 0.8 + (group.current_members / group.max_members) * 0.2
+                    rec_score = sim_score * 0.8 + (min(group.moq_progress, 100.0) / 100.0) * 0.2
                     
                     recommended_groups.append({
                         'group': group,
@@ -2417,7 +2453,7 @@ def get_user_similarity_based_recommendations(user_id: int, db: Session, limit:
             'savings': (rec['group'].product.savings_factor * 100) if rec['group'].product else 10,
             'location_zone': rec['group'].location_zone,
             'deadline': rec['group'].deadline,
-            'total_quantity': rec['group'].participants,
+            'total_quantity': rec['group'].total_quantity,
             'moq_progress': rec['group'].moq_progress,
             'participants_count': rec['group'].participants_count,
             'recommendation_score': rec['recommendation_score'],
@@ -2541,7 +2577,7 @@ def get_fallback_recommendations(user: User, db: Session, limit: int = 10) -> Li
         logger.error(f"Error getting fallback recommendations: {str(e)}")
         return []
 
-def get_hybrid_recommendations(user_id: int, db: Session, limit: int = 10) -> List[Dict[str, Any]]:
+def get_hybrid_recommendations(user_id: int, db: Session, limit: int = 10, candidates=None) -> List[Dict[str, Any]]:
     """Get hybrid recommendations combining ML models and user similarity"""
     try:
         # Get user and check if they have enough data for ML recommendations
@@ -2555,7 +2591,7 @@ def get_hybrid_recommendations(user_id: int, db: Session, limit: int = 10) -> Li
         # If user has transaction history, use ML models
         if user_transactions > 0:
             try:
-                ml_recommendations = get_recommendations_for_user(user, db)
+                ml_recommendations = get_recommendations_for_user(user, db, candidates)
                 return ml_recommendations
             except Exception as e:
                 logger.warning(f"ML recommendations failed, falling back to similarity: {str(e)}")
@@ -2689,7 +2725,7 @@ async def explain_user_cluster(
     Provides transparency about the clustering algorithm's decisions.
     """
     try:
-        explanation = explain_cluster_assignment(user, db)
+        explanation = get_cluster_explanation(user, db)
         return explanation
         
     except Exception as e:
@@ -2714,17 +2750,11 @@ async def explain_all_user_recommendations(
         # Get recommendations
         recommendations = get_recommendations_for_user(user, db)[:limit]
         
-        # Generate explanations for each
-        explanations = []
-        for rec in recommendations:
-            group_buy = db.query(GroupBuy).filter(GroupBuy.id == rec['group_buy_id']).first()
-            if group_buy:
-                ml_scores = rec.get('ml_scores', {})
-                explanation = explain_recommendation(user, group_buy, ml_scores, db)
-                explanations.append(explanation)
+        # Explain them from the ranking pass's scores and loaded group-buys
+        explanations = explain_recommendations(user, recommendations, db)
         
-        # Get cluster explanation
-        cluster_explanation = explain_cluster_assignment(user, db)
+        # Get cluster explanation (cached per model version)
+        cluster_explanation = get_cluster_explanation(user, db)
         
         # Overall model information
         model_info = {
@@ -2752,7 +2782,9 @@ async def explain_all_user_recommendations(
 @router.get("/explain/lime/{group_buy_id}")
 async def explain_group_buy_with_lime(
     group_buy_id: int,
-    user: User = Depends(verify_trader),
+    num_samples: Optional[int] = Query(None, ge=1),
+    deadline_ms: Optional[int] = Query(None, ge=0),
+    user: User = Depends(verify_token),
     db: Session = Depends(get_db)
 ):
     """
@@ -2763,7 +2795,18 @@ async def explain_group_buy_with_lime(
     a surrogate model around the prediction of interest.
 
     This complements the existing component-decomposition explainability.
+
+    - **num_samples**: perturbation budget (fewer = faster, less faithful); budgets above
+      LIME_NUM_SAMPLES are admin-only and all are capped by LIME_MAX_SAMPLES
+    - **deadline_ms**: return a best-effort explanation after this many milliseconds
     """
+    if not user.is_admin:
+        verify_trader(user)
+        if num_samples is not None and num_samples > LIME_NUM_SAMPLES:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Admin access required for more than {LIME_NUM_SAMPLES} samples"
+            )
     try:
         # Get group-buy
         group_buy = db.query(GroupBuy).filter(GroupBuy.id == group_buy_id).first()
@@ -2771,7 +2814,11 @@ async def explain_group_buy_with_lime(
             raise HTTPException(status_code=404, detail="Group-buy not found")
 
         # Generate LIME explanation
-        lime_explanation = explain_with_lime(user, group_buy, db)
+        lime_explanation = explain_with_lime(
+            user, group_buy, db,
+            num_samples=num_samples,
+            deadline_seconds=deadline_ms / 1000 if deadline_ms is not None else None
+        )
 
         # Add additional context
         lime_explanation.update({
@@ -2800,56 +2847,61 @@ def get_admin_group_recommendations(user: User, admin_groups: List[AdminGroup],
     
     # Filter admin groups to exclude joined ones
     available_admin_groups = [g for g in admin_groups if g.id not in user_joined_admin_group_ids]
+    if not available_admin_groups:
+        return []
+    
+    group_ids = [g.id for g in available_admin_groups]
+    now = datetime.utcnow()
+    
+    # Collaborative Filtering: joins by traders in the user's cluster, for every group at once
+    cluster_joins = get_cluster_participation(db).cluster_joins(user.cluster_id, group_ids)
+    
+    # Actual participant counts from joins (one grouped query)
+    joins_by_group = dict(db.query(
+        AdminGroupJoin.admin_group_id, func.count(AdminGroupJoin.id)
+    ).filter(
+        AdminGroupJoin.admin_group_id.in_(group_ids)
+    ).group_by(AdminGroupJoin.admin_group_id).all())
+    
+    # Per-group signals as arrays, scored in one vectorised pass (no cold-start)
+    preferred = {cat.lower() for cat in (user.preferred_categories or [])}
+    category_match = np.array([bool(g.category) and g.category.lower() in preferred for g in available_admin_groups])
+    participation_progress = np.array([
+        (g.participants / g.max_participants) * 100 if g.max_participants > 0 else 0
+        for g in available_admin_groups
+    ], dtype=float)
+    days_remaining = np.array([
+        (g.end_date - now).days if g.end_date else 999 for g in available_admin_groups
+    ])
+    discounts = np.array([g.discount_percentage or 0 for g in available_admin_groups], dtype=float)
+    
+    scores = np.full(len(available_admin_groups), 0.5)  # Base score
+    scores += 0.2 * category_match
+    scores += np.minimum(0.2, cluster_joins * 0.05)
+    scores += np.where(participation_progress >= 75, 0.1, np.where(participation_progress >= 50, 0.05, 0.0))
+    scores += 0.05 * (days_remaining <= 3)
+    scores += 0.1 * (discounts >= 15)
+    scores = np.minimum(scores, 1.0)
     
     recommendations = []
     
-    for admin_group in available_admin_groups:
-        # ML-based scoring (no cold-start)
-        score = 0.5  # Base score
+    # Stable sort keeps the input order among equal scores
+    for i in np.argsort(-scores, kind="stable")[:10]:
+        admin_group = available_admin_groups[i]
+        score = float(scores[i])
         reasons = []
         
-        # Content-Based Filtering: Category match
-        if user.preferred_categories and admin_group.category:
-            if admin_group.category.lower() in [cat.lower() for cat in user.preferred_categories]:
-                score += 0.2
-                reasons.append(_pick_reason("category", admin_group.name, admin_group.category))
-        
-        # Collaborative Filtering: Check if similar users joined this admin group
-        if user.cluster_id is not None:
-            cluster_users = db.query(User).filter(
-                User.cluster_id == user.cluster_id,
-                User.id != user.id
-            ).limit(20).all()
-            cluster_user_ids = [u.id for u in cluster_users]
-            cluster_joins = db.query(AdminGroupJoin).filter(
-                AdminGroupJoin.user_id.in_(cluster_user_ids),
-                AdminGroupJoin.admin_group_id == admin_group.id
-            ).count()
-            if cluster_joins > 0:
-                score += min(0.2, cluster_joins * 0.05)
-                reasons.append(_pick_reason("similar_users", admin_group.name, cluster_joins))
-        
-        # Boost for groups with good participation
-        moq_progress = (admin_group.participants / admin_group.max_participants) * 100 if admin_group.max_participants > 0 else 0
-        if moq_progress >= 75:
-            score += 0.1
-            reasons.append(_pick_reason("progress", admin_group.name, moq_progress))
-        elif moq_progress >= 50:
-            score += 0.05
-        
-        # Boost for ending soon
-        days_remaining = (admin_group.end_date - datetime.utcnow()).days if admin_group.end_date else 999
-        if days_remaining <= 3:
-            score += 0.05
-            reasons.append(_pick_reason("urgency", admin_group.name, days_remaining))
-        
-        # Boost for high savings
-        if admin_group.discount_percentage and admin_group.discount_percentage >= 15:
-            score += 0.1
+        if category_match[i]:
+            reasons.append(_pick_reason("category", admin_group.name, admin_group.category))
+        if cluster_joins[i] > 0:
+            reasons.append(_pick_reason("similar_users", admin_group.name, int(cluster_joins[i])))
+        if participation_progress[i] >= 75:
+            reasons.append(_pick_reason("progress", admin_group.name, participation_progress[i]))
+        if days_remaining[i] <= 3:
+            reasons.append(_pick_reason("urgency", admin_group.name, int(days_remaining[i])))
+        if discounts[i] >= 15:
             reasons.append(_pick_reason("savings", admin_group.name, admin_group.discount_percentage))
         
-        score = min(score, 1.0)
-        
         # Ensure at least one reason
         if not reasons:
             reasons.append(_pick_reason("default", admin_group.name))
@@ -2861,10 +2913,7 @@ def get_admin_group_recommendations(user: User, admin_groups: List[AdminGroup],
             "hybrid": score
         }
         
-        # Calculate actual participant count from joins
-        joins_count = db.query(AdminGroupJoin).filter(
-            AdminGroupJoin.admin_group_id == admin_group.id
-        ).count()
+        joins_count = joins_by_group.get(admin_group.id, 0)
         
         # Calculate moq_progress for display
         moq_progress = (joins_count / admin_group.max_participants) * 100 if admin_group.max_participants > 0 else 0
@@ -2909,5 +2958,4 @@ def get_admin_group_recommendations(user: User, admin_groups: List[AdminGroup],
             "amount_progress": round(amount_progress, 1)
         })
     
-    recommendations.sort(key=lambda x: x["recommendation_score"], reverse=True)
-    return recommendations[:10]
\ No newline at end of file
+    return recommendations
@@ -4,6 +4,7 @@ ML Model Scheduler - Auto-retrain daily and maintain best models only
 import asyncio
 from sqlalchemy.orm import Session
 from db.database import SessionLocal
+from db.query_stats import track_queries
 from models.models import MLModel, Transaction
 from .ml import train_clustering_model_with_progress
 import os
@@ -21,7 +22,8 @@ class MLModelScheduler:
         while self.is_running:
             try:
                 await asyncio.sleep(self.training_interval)
-                await self.auto_retrain()
+                with track_queries("job:ml.auto_retrain"):
+                    await self.auto_retrain()
             except Exception as e:
                 print(f"⚠️  Scheduler error: {e}")
                 await asyncio.sleep(3600)  # Wait 1 hour on error
@@ -0,0 +1,524 @@
+"""
+Precomputed trader-to-trader similarity ("neighbour") table.
+
+Registration preferences (categories, budget, experience, group sizes,
+participation frequency) are encoded into arrays once, compared in row
+chunks with vectorised weighted Jaccard/ordinal maths - the same weights as
+ml.calculate_user_similarity - and the top-N neighbours of every trader are
+bulk-written to user_similarity, with the common-groups Jaccard of each pair.
+Request paths read them back with a single query on idx_similarity_user_score;
+only traders the last rebuild did not cover are computed on first use.
+
+The same encoding also backs a process-wide in-memory preference index used
+for cold-start users: it is upserted on registration and profile update and
+scored with a single vectorised pass instead of loading every User.
+"""
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import delete
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Set, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from db.upsert import upsert_insert
+from models.models import User, Contribution, AdminGroupJoin
+from models.analytics_models import UserSimilarity, FeatureStore, IS_POSTGRES
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_TOP_N = int(os.getenv("USER_SIMILARITY_TOP_N", "20"))
+SIMILARITY_CHUNK_SIZE = int(os.getenv("USER_SIMILARITY_CHUNK_SIZE", "512"))
+SIMILARITY_TYPE = "demographic"
+# Markers: when the last full rebuild started, and users computed on demand since
+SIMILARITY_REBUILT_KEY = "user_similarity_rebuilt_at"
+NEIGHBOURS_COMPUTED_KEY = "user:{user_id}:neighbours_computed"
+# Full rebuild interval of the in-memory index, so workers converge on profile
+# changes made through other processes
+PREFERENCE_INDEX_TTL_SECONDS = int(os.getenv("PREFERENCE_INDEX_TTL_SECONDS", "900"))
+
+# feature -> weight, matching calculate_user_similarity
+SET_FEATURES = {
+    "preferred_categories": 0.3,
+    "preferred_group_sizes": 0.25,
+}
+# feature -> (weight, ordinal scale); unknown values sit in the middle of the scale
+ORDINAL_FEATURES = {
+    "budget_range": (0.2, {'low': 1, 'medium': 2, 'high': 3}),
+    "experience_level": (0.15, {'beginner': 1, 'intermediate': 2, 'advanced': 3}),
+    "participation_frequency": (0.1, {'occasional': 1, 'regular': 2, 'frequent': 3}),
+}
+PREFERENCE_COLUMNS = list(SET_FEATURES) + list(ORDINAL_FEATURES)
+
+
+class PreferenceMatrix:
+    """
+    Array encoding of user preferences, one row per user.
+
+    sets[feature]     -> (multi-hot float32 matrix, presence mask)
+    ordinals[feature] -> (float32 scale values, presence mask)
+    complete          -> rows with every preference set (not NULL)
+    has_categories    -> rows whose preferred_categories is set (not NULL)
+    """
+
+    def __init__(self, user_ids, sets, ordinals, vocab, complete, has_categories):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.sets = sets
+        self.ordinals = ordinals
+        self.vocab = vocab
+        self.complete = complete
+        self.has_categories = has_categories
+        self.row_of = {int(uid): i for i, uid in enumerate(self.user_ids)}
+        self.token_col = {feature: {token: i for i, token in enumerate(tokens)} for feature, tokens in vocab.items()}
+
+    def upsert(self, user):
+        """Insert or re-encode one user's row in place (new tokens add columns)."""
+        row = self.row_of.get(user.id)
+        if row is None:
+            row = len(self)
+            self.user_ids = np.append(self.user_ids, user.id)
+            self.complete = np.append(self.complete, False)
+            self.has_categories = np.append(self.has_categories, False)
+            for feature, (hot, present) in self.sets.items():
+                self.sets[feature] = (
+                    np.vstack([hot, np.zeros((1, hot.shape[1]), dtype=np.float32)]),
+                    np.append(present, False),
+                )
+            for feature, (values, present) in self.ordinals.items():
+                self.ordinals[feature] = (np.append(values, np.float32(0)), np.append(present, False))
+            self.row_of[int(user.id)] = row
+
+        complete = True
+        for feature in SET_FEATURES:
+            tokens = getattr(user, feature)
+            complete &= tokens is not None
+            columns = self.token_col[feature]
+            new_tokens = [token for token in dict.fromkeys(tokens or []) if token not in columns]
+            hot, present = self.sets[feature]
+            if new_tokens:
+                hot = np.hstack([hot, np.zeros((hot.shape[0], len(new_tokens)), dtype=np.float32)])
+                for token in new_tokens:
+                    columns[token] = len(columns)
+                    self.vocab[feature].append(token)
+            hot[row] = 0.0
+            if tokens:
+                hot[row, [columns[token] for token in tokens]] = 1.0
+            present[row] = bool(tokens)
+            self.sets[feature] = (hot, present)
+
+        for feature, (_, scale) in ORDINAL_FEATURES.items():
+            value = getattr(user, feature)
+            complete &= value is not None
+            values, present = self.ordinals[feature]
+            values[row] = scale.get(value, _scale_middle(scale))
+            present[row] = bool(value)
+        self.complete[row] = complete
+        self.has_categories[row] = user.preferred_categories is not None
+        return row
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def scores(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Similarity of the given rows against every user.
+        Returns (scores, category_jaccard), both shaped (len(rows), len(self)).
+        """
+        n = len(self)
+        numerator = np.zeros((len(rows), n), dtype=np.float32)
+        weights = np.zeros((len(rows), n), dtype=np.float32)
+        category_jaccard = np.zeros((len(rows), n), dtype=np.float32)
+
+        for feature, weight in SET_FEATURES.items():
+            hot, present = self.sets[feature]
+            both = present[rows][:, None] & present[None, :]
+            intersection = hot[rows] @ hot.T
+            sizes = hot.sum(axis=1)
+            union = sizes[rows][:, None] + sizes[None, :] - intersection
+            jaccard = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+            numerator += weight * both * jaccard
+            weights += weight * both
+            if feature == "preferred_categories":
+                category_jaccard = jaccard * both
+
+        for feature, (weight, scale) in ORDINAL_FEATURES.items():
+            values, present = self.ordinals[feature]
+            both = present[rows][:, None] & present[None, :]
+            spread = float(max(scale.values()) - min(scale.values()))
+            similarity = 1.0 - np.abs(values[rows][:, None] - values[None, :]) / spread
+            numerator += weight * both * similarity
+            weights += weight * both
+
+        scores = np.divide(numerator, weights, out=np.zeros_like(numerator), where=weights > 0)
+        return scores, category_jaccard
+
+    def common_categories(self, row: int, other: int) -> List[str]:
+        hot, _ = self.sets["preferred_categories"]
+        shared = np.flatnonzero(hot[row] * hot[other])
+        vocab = self.vocab["preferred_categories"]
+        return sorted(str(vocab[i]) for i in shared)
+
+
+def _scale_middle(scale: Dict[str, int]) -> float:
+    return float(sorted(scale.values())[len(scale) // 2])
+
+
+def encode_preferences(rows) -> PreferenceMatrix:
+    """Build a PreferenceMatrix from rows exposing id + PREFERENCE_COLUMNS."""
+    rows = list(rows)
+    n = len(rows)
+    complete = np.ones(n, dtype=bool)
+
+    sets, vocab = {}, {}
+    for feature in SET_FEATURES:
+        tokens = {}
+        for row in rows:
+            for token in getattr(row, feature) or []:
+                tokens.setdefault(token, len(tokens))
+        hot = np.zeros((n, len(tokens)), dtype=np.float32)
+        present = np.zeros(n, dtype=bool)
+        for i, row in enumerate(rows):
+            values = getattr(row, feature)
+            complete[i] &= values is not None
+            if values:
+                present[i] = True
+                hot[i, [tokens[token] for token in values]] = 1.0
+        sets[feature] = (hot, present)
+        vocab[feature] = list(tokens)
+
+    ordinals = {}
+    for feature, (_, scale) in ORDINAL_FEATURES.items():
+        middle = _scale_middle(scale)
+        values = np.full(n, middle, dtype=np.float32)
+        present = np.zeros(n, dtype=bool)
+        for i, row in enumerate(rows):
+            value = getattr(row, feature)
+            complete[i] &= value is not None
+            if value:
+                present[i] = True
+                values[i] = scale.get(value, middle)
+        ordinals[feature] = (values, present)
+
+    has_categories = np.array([row.preferred_categories is not None for row in rows], dtype=bool)
+    return PreferenceMatrix([row.id for row in rows], sets, ordinals, vocab, complete, has_categories)
+
+
+def load_preference_matrix(db: Session, extra_user_ids: Optional[List[int]] = None) -> PreferenceMatrix:
+    """Encode every trader's preferences (plus any extra users) with one query."""
+    trader_filter = (User.is_admin == False) & (User.is_supplier == False)
+    if extra_user_ids:
+        trader_filter = trader_filter | User.id.in_(extra_user_ids)
+    rows = db.query(User.id, *[getattr(User, c) for c in PREFERENCE_COLUMNS]).filter(
+        trader_filter
+    ).order_by(User.id).all()
+    return encode_preferences(rows)
+
+
+def top_neighbours(matrix: PreferenceMatrix, rows: np.ndarray, top_n: int):
+    """
+    Yield (row, neighbour_rows, scores) for each requested row.
+    Only users with a complete profile are neighbour candidates; self is excluded.
+    """
+    scores, _ = matrix.scores(rows)
+    scores[:, ~matrix.complete] = -np.inf
+    scores[np.arange(len(rows)), rows] = -np.inf
+
+    k = min(top_n, len(matrix) - 1)
+    if k <= 0:
+        return
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    for i, row in enumerate(rows):
+        picked = candidates[i]
+        picked_scores = scores[i, picked]
+        # Highest score first, lowest user id breaks ties
+        order = np.lexsort((matrix.user_ids[picked], -picked_scores))
+        picked = picked[order][np.isfinite(picked_scores[order])]
+        yield row, picked, scores[i, picked]
+
+
+def group_memberships(db: Session, user_ids: Optional[List[int]] = None) -> Dict[int, Set[tuple]]:
+    """Groups each user took part in: group-buy contributions and admin-group joins."""
+    memberships = defaultdict(set)
+    for kind, user_column, group_column in (
+        ("group_buy", Contribution.user_id, Contribution.group_buy_id),
+        ("admin_group", AdminGroupJoin.user_id, AdminGroupJoin.admin_group_id),
+    ):
+        query = db.query(user_column, group_column).distinct()
+        if user_ids is not None:
+            query = query.filter(user_column.in_(user_ids))
+        for user_id, group_id in query:
+            memberships[user_id].add((kind, group_id))
+    return memberships
+
+
+def _similarity_rows(
+    db: Session,
+    matrix: PreferenceMatrix,
+    rows: np.ndarray,
+    top_n: int,
+    computed_at: datetime,
+    memberships: Optional[Dict[int, Set[tuple]]] = None,
+) -> List[dict]:
+    neighbours = list(top_neighbours(matrix, rows, top_n))
+    if memberships is None:
+        involved = {int(matrix.user_ids[row]) for row, _, _ in neighbours}
+        involved.update(int(matrix.user_ids[other]) for _, picked, _ in neighbours for other in picked)
+        memberships = group_memberships(db, list(involved))
+
+    mappings = []
+    for row, picked, scores in neighbours:
+        user_id = int(matrix.user_ids[row])
+        groups = memberships.get(user_id, set())
+        for other, score in zip(picked, scores):
+            similar_user_id = int(matrix.user_ids[other])
+            other_groups = memberships.get(similar_user_id, set())
+            common_groups = len(groups & other_groups)
+            all_groups = len(groups | other_groups)
+            common = matrix.common_categories(row, other)
+            mappings.append({
+                'user_id': user_id,
+                'similar_user_id': similar_user_id,
+                'similarity_score': float(score),
+                'similarity_type': SIMILARITY_TYPE,
+                'jaccard_similarity': common_groups / all_groups if all_groups else 0.0,
+                'demographic_similarity': float(score),
+                'common_groups_count': common_groups,
+                'common_categories': common if IS_POSTGRES else json.dumps(common),
+                'computed_at': computed_at,
+            })
+    return mappings
+
+
+def _replace_neighbours(db: Session, user_ids: List[int], mappings: List[dict]):
+    db.execute(delete(UserSimilarity).where(UserSimilarity.user_id.in_(user_ids)))
+    if mappings:
+        db.bulk_insert_mappings(UserSimilarity, mappings)
+
+
+def _set_marker(db: Session, key: str, entity_id: int, computed_at: datetime):
+    db.execute(upsert_insert(db, FeatureStore).values(
+        feature_key=key, feature_value={"computed_at": computed_at.isoformat()},
+        feature_type='system' if entity_id == 0 else 'user', entity_id=entity_id, computed_at=computed_at
+    ).on_conflict_do_update(
+        index_elements=['feature_key'],
+        set_={'feature_value': {"computed_at": computed_at.isoformat()}, 'computed_at': computed_at}
+    ))
+
+
+def rebuild_user_similarity(
+    db: Session,
+    top_n: int = SIMILARITY_TOP_N,
+    chunk_size: int = SIMILARITY_CHUNK_SIZE,
+) -> int:
+    """
+    Recompute the top-N neighbours of every trader and bulk-write them.
+    Memory is bounded by chunk_size x n_traders. Returns rows written.
+    """
+    try:
+        # Taken before loading: traders registered after this are not covered
+        computed_at = datetime.utcnow()
+        matrix = load_preference_matrix(db)
+        if len(matrix) < 2:
+            logger.info("Not enough traders to compute user similarity")
+            return 0
+
+        memberships = group_memberships(db)
+        written = 0
+        for start in range(0, len(matrix), chunk_size):
+            rows = np.arange(start, min(start + chunk_size, len(matrix)))
+            mappings = _similarity_rows(db, matrix, rows, top_n, computed_at, memberships)
+            _replace_neighbours(db, [int(uid) for uid in matrix.user_ids[rows]], mappings)
+            db.commit()
+            written += len(mappings)
+
+        # Every trader is covered now, including those with no neighbours
+        _set_marker(db, SIMILARITY_REBUILT_KEY, 0, computed_at)
+        db.execute(delete(FeatureStore).where(
+            FeatureStore.feature_key.like(NEIGHBOURS_COMPUTED_KEY.format(user_id="%"))
+        ))
+        db.commit()
+        logger.info(f"✅ Wrote {written} user similarity rows for {len(matrix)} traders")
+        return written
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Failed to rebuild user similarity: {e}")
+        return 0
+
+
+def refresh_user_neighbours(db: Session, user_id: int, top_n: int = SIMILARITY_TOP_N) -> int:
+    """
+    Recompute and store the neighbours of a single user (e.g. a new trader),
+    marking them computed even when there are none.
+    """
+    computed_at = datetime.utcnow()
+    matrix = load_preference_matrix(db, extra_user_ids=[user_id])
+    row = matrix.row_of.get(user_id)
+    if row is None:
+        return 0
+    mappings = _similarity_rows(db, matrix, np.array([row]), top_n, computed_at)
+    _replace_neighbours(db, [user_id], mappings)
+    _set_marker(db, NEIGHBOURS_COMPUTED_KEY.format(user_id=user_id), user_id, computed_at)
+    db.commit()
+    return len(mappings)
+
+
+def neighbours_computed(db: Session, user_id: int) -> bool:
+    """Whether the user's neighbour set (possibly empty) is already stored."""
+    keys = [NEIGHBOURS_COMPUTED_KEY.format(user_id=user_id), SIMILARITY_REBUILT_KEY]
+    markers = {
+        record.feature_key: record.computed_at
+        for record in db.query(FeatureStore).filter(FeatureStore.feature_key.in_(keys))
+    }
+    if keys[0] in markers:
+        return True
+    rebuilt_at = markers.get(SIMILARITY_REBUILT_KEY)
+    if rebuilt_at is None:
+        return False
+    created_at = db.query(User.created_at).filter(User.id == user_id).scalar()
+    return created_at is not None and created_at <= rebuilt_at.replace(tzinfo=None)
+
+
+def get_similar_users(db: Session, user_id: int, limit: int = SIMILARITY_TOP_N) -> List[Tuple[int, float]]:
+    """
+    (similar_user_id, similarity_score) pairs, most similar first.
+    Users the last rebuild did not cover get theirs computed and stored on
+    first use; an empty result is remembered, refreshes are left to the ETL.
+    """
+    query = db.query(UserSimilarity.similar_user_id, UserSimilarity.similarity_score).filter(
+        UserSimilarity.user_id == user_id
+    ).order_by(UserSimilarity.similarity_score.desc(), UserSimilarity.similar_user_id).limit(limit)
+
+    neighbours = query.all()
+    if not neighbours and not neighbours_computed(db, user_id):
+        try:
+            if refresh_user_neighbours(db, user_id):
+                neighbours = query.all()
+        except Exception as e:
+            # e.g. a concurrent request stored them first
+            db.rollback()
+            logger.warning(f"Could not compute neighbours for user {user_id}: {e}")
+            neighbours = query.all()
+    return [(row.similar_user_id, row.similarity_score) for row in neighbours]
+
+
+_preference_index: Optional[PreferenceMatrix] = None
+_preference_index_built_at = 0.0
+_preference_index_lock = threading.Lock()
+_preference_index_build_lock = threading.Lock()
+_preference_index_rebuilding = False
+# Profile changes made while a background rebuild is loading, re-applied on swap
+_pending_upserts: List[SimpleNamespace] = []
+
+
+def _rebuild_preference_index(session_factory):
+    """Load a fresh index in the background and swap it in; the old one is served meanwhile."""
+    global _preference_index, _preference_index_built_at, _preference_index_rebuilding
+    db = session_factory()
+    try:
+        index = load_preference_matrix(db)
+        with _preference_index_lock:
+            for user in _pending_upserts:
+                index.upsert(user)
+            _preference_index = index
+    except Exception as e:
+        logger.exception(f"Failed to rebuild the preference index, keeping the old one: {e}")
+    finally:
+        db.close()
+        with _preference_index_lock:
+            # Also after a failure, so a broken database is retried once per TTL
+            _preference_index_built_at = time.monotonic()
+            _preference_index_rebuilding = False
+            _pending_upserts.clear()
+
+
+def get_preference_index(db: Session) -> PreferenceMatrix:
+    """
+    Process-wide trader preference index. Built on first use; when older than
+    the TTL it is rebuilt on a background thread (one at a time) while the
+    current index keeps serving requests.
+    """
+    global _preference_index, _preference_index_built_at, _preference_index_rebuilding
+    with _preference_index_lock:
+        index = _preference_index
+        if (index is not None and not _preference_index_rebuilding
+                and time.monotonic() - _preference_index_built_at > PREFERENCE_INDEX_TTL_SECONDS):
+            _preference_index_rebuilding = True
+            threading.Thread(
+                target=_rebuild_preference_index, args=(sessionmaker(bind=db.get_bind()),),
+                name="preference-index-rebuild", daemon=True
+            ).start()
+    if index is not None:
+        return index
+
+    # First build: one caller loads, concurrent callers wait for it
+    with _preference_index_build_lock:
+        if _preference_index is None:
+            index = load_preference_matrix(db)
+            with _preference_index_lock:
+                _preference_index = index
+                _preference_index_built_at = time.monotonic()
+        return _preference_index
+
+
+def update_preference_index(user: User):
+    """Upsert a trader after registration or a profile update (no-op until the index is built)."""
+    if user.is_admin or user.is_supplier:
+        return
+    with _preference_index_lock:
+        if _preference_index is not None:
+            _preference_index.upsert(user)
+        if _preference_index_rebuilding:
+            _pending_upserts.append(SimpleNamespace(
+                id=user.id, **{column: getattr(user, column) for column in PREFERENCE_COLUMNS}
+            ))
+
+
+def clear_preference_index():
+    global _preference_index
+    with _preference_index_lock:
+        _preference_index = None
+
+
+def find_similar_traders(
+    db: Session,
+    user: User,
+    min_similarity: float = 0.0,
+    limit: int = SIMILARITY_TOP_N,
+) -> List[Tuple[int, float]]:
+    """
+    (user_id, similarity) of the traders most similar to `user`, best first,
+    scored against the in-memory index in one vectorised pass. Candidates are
+    traders with preferred categories set.
+    """
+    index = get_preference_index(db)
+    with _preference_index_lock:
+        row = index.row_of.get(user.id)
+        if row is None:
+            row = index.upsert(user)
+        scores, _ = index.scores(np.array([row]))
+        scores = scores[0]
+        scores[~index.has_categories] = -np.inf
+        scores[row] = -np.inf
+        user_ids = index.user_ids
+
+    candidates = np.flatnonzero(scores > min_similarity)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    order = np.lexsort((user_ids[candidates], -scores[candidates]))
+    return [(int(user_ids[c]), float(scores[c])) for c in candidates[order]]
+
+
+if __name__ == "__main__":
+    from db.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"✅ Wrote {rebuild_user_similarity(session)} user similarity rows")
+    finally:
+        session.close()
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
-from db.database import get_db
+from api.responses import model_response
+from db.database import get_db, get_read_db
 from models.models import User, GroupBuy, Product, Transaction, MLModel, AdminGroup, AdminGroupJoin, QRCodeGenerateRequest, QRCodeGenerateResponse, QRCodeScanResponse, UserProductPurchaseInfo, QRCodePickup, QRScanHistory, Contribution, ChatMessage, SupplierOrder, SupplierPayment
 from models.groups import decrypt_qr_data
 from authentication.auth import verify_admin
@@ -115,7 +118,7 @@ class ImageUploadResponse(BaseModel):
 @router.get("/dashboard", response_model=DashboardStats)
 async def get_dashboard_stats(
     admin = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get dashboard statistics"""
     print(f"📊 Admin dashboard request from: {admin.email}")
@@ -188,12 +191,12 @@ async def get_all_group_buys(
             is_fully_funded=is_fully_funded
         ))
     
-    return result
+    return model_response(result, GroupBuyDetail)
 
 @router.get("/users/stats")
 async def get_user_statistics(
     admin = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get user statistics for admin dashboard"""
     total_users = db.query(User).filter(~User.is_admin).count()
@@ -964,7 +967,7 @@ async def process_admin_group_payment(
 async def get_reports(
     period: str = "month",  # week, month, year
     admin = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Generate reports"""
     now = datetime.utcnow()
@@ -1046,7 +1049,7 @@ async def get_reports(
 async def get_activity_data(
     months: int = 6,
     admin = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Return activity time series for the last `months` months.
 
@@ -1134,7 +1137,7 @@ class MLModelPerformance(BaseModel):
 @router.get("/ml-performance", response_model=List[MLModelPerformance])
 async def get_ml_performance(
     admin = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get ML model performance history"""
     models = db.query(MLModel).filter(
@@ -1251,6 +1254,45 @@ async def cleanup_poor_models(
         "best_score": best_model.metrics.get('silhouette_score', 0)
     }
 
+@router.get("/query-stats")
+async def get_query_stats(
+    sort_by: str = "queries",
+    limit: int = 20,
+    admin = Depends(verify_admin)
+):
+    """Endpoints and jobs ranked by database queries/time since startup (this worker)"""
+    from db.query_stats import route_query_stats
+    if sort_by not in {"queries", "db_ms", "avg_queries", "avg_db_ms", "max_queries", "max_db_ms", "n_plus_one"}:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by {sort_by}")
+    return {"routes": route_query_stats(sort_by=sort_by, limit=limit)}
+
+@router.get("/profiles")
+async def get_request_profiles(admin = Depends(verify_admin)):
+    """Stored request profiles (X-Profile: 1 or sampled), newest first (this worker)"""
+    from monitoring.profiler import list_profiles
+    return {"profiles": await run_in_threadpool(list_profiles)}
+
+@router.get("/profiles/{profile_id}")
+async def download_request_profile(
+    profile_id: str,
+    format: str = "speedscope",
+    admin = Depends(verify_admin)
+):
+    """Download a request profile as speedscope JSON or collapsed stacks"""
+    from monitoring.profiler import load_profile, to_collapsed
+    if format not in {"speedscope", "collapsed"}:
+        raise HTTPException(status_code=400, detail=f"Unknown profile format {format}")
+    profile = await run_in_threadpool(load_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(to_collapsed(profile), headers={
+            "Content-Disposition": f'attachment; filename="{profile_id}.collapsed.txt"'
+        })
+    return JSONResponse(profile, headers={
+        "Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'
+    })
+
 @router.get("/ml-system-status")
 async def get_ml_system_status(
     admin = Depends(verify_admin),
@@ -1706,7 +1748,7 @@ async def get_completed_groups(
 @router.get("/groups/moderation-stats")
 async def get_group_moderation_stats(
     admin = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get statistics for group moderation dashboard"""
     try:
@@ -7,7 +7,7 @@ python backend/migrate_db.py analytics
 ```
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Index, ARRAY, func
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Text, Index, ARRAY, func
 from sqlalchemy.dialects.postgresql import JSONB as PG_JSONB  # type: ignore
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID  # type: ignore
 from sqlalchemy.dialects.postgresql import ARRAY as PG_ARRAY  # type: ignore
@@ -53,6 +53,10 @@ class EventsRaw(Base):
     # Event data
     properties = Column(JSONType, nullable=True)
     
+    # Entity ids promoted out of properties at ingestion for indexed lookups
+    group_id = Column(Integer, nullable=True)
+    product_id = Column(Integer, nullable=True)
+    
     # Context data
     url = Column(Text)
     path = Column(String(500), index=True)
@@ -78,6 +82,8 @@ class EventsRaw(Base):
             Index('idx_events_user_timestamp', 'user_id', 'timestamp'),
             Index('idx_events_session_timestamp', 'session_id', 'timestamp'),
             Index('idx_events_type_timestamp', 'event_type', 'timestamp'),
+            Index('idx_events_group_type_timestamp', 'group_id', 'event_type', 'timestamp'),
+            Index('idx_events_product_timestamp', 'product_id', 'timestamp'),
             Index('idx_events_properties_gin', 'properties', postgresql_using='gin'),
         )
     else:
@@ -85,8 +91,91 @@ class EventsRaw(Base):
             Index('idx_events_user_timestamp', 'user_id', 'timestamp'),
             Index('idx_events_session_timestamp', 'session_id', 'timestamp'),
             Index('idx_events_type_timestamp', 'event_type', 'timestamp'),
+            Index('idx_events_group_type_timestamp', 'group_id', 'event_type', 'timestamp'),
+            Index('idx_events_product_timestamp', 'product_id', 'timestamp'),
         )
 
+class EventsArchive(Base):
+    """
+    Cold storage for raw events past the retention window.
+    Keeps only the columns needed for replay; wide context columns
+    (url, referrer, user_agent, ...) are dropped on archival.
+    """
+    __tablename__ = "events_archive"
+    
+    id = Column(String(36), primary_key=True)
+    event_id = Column(String(100), nullable=False, index=True)
+    event_type = Column(String(50), nullable=False)
+    user_id = Column(Integer, nullable=True, index=True)
+    session_id = Column(String(100), nullable=False)
+    timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
+    properties = Column(JSONType, nullable=True)
+    group_id = Column(Integer, nullable=True)
+    product_id = Column(Integer, nullable=True)
+    path = Column(String(500))
+    
+    archived_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+# === DAILY EVENT ROLLUPS ===
+
+class EventDailyUserRollup(Base):
+    """
+    Per-day, per-user event aggregates written by the compaction job.
+    Dashboards read these instead of scanning events_raw.
+    """
+    __tablename__ = "event_daily_user_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    # Activity
+    total_events = Column(Integer, default=0)
+    event_counts = Column(JSONType, default={})  # {event_type: count}
+    unique_sessions = Column(Integer, default=0)
+    
+    # Funnel steps
+    group_views = Column(Integer, default=0)
+    group_clicks = Column(Integer, default=0)
+    joins = Column(Integer, default=0)
+    payments = Column(Integer, default=0)
+    
+    computed_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_user_rollup_day_user', 'day', 'user_id', unique=True),
+        Index('idx_user_rollup_user_day', 'user_id', 'day'),
+    )
+
+class EventDailyGroupRollup(Base):
+    """
+    Per-day, per-group event aggregates written by the compaction job.
+    """
+    __tablename__ = "event_daily_group_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    group_id = Column(Integer, nullable=False)
+    
+    # Activity
+    total_events = Column(Integer, default=0)
+    event_counts = Column(JSONType, default={})  # {event_type: count}
+    unique_sessions = Column(Integer, default=0)
+    unique_users = Column(Integer, default=0)
+    
+    # Funnel steps
+    group_views = Column(Integer, default=0)
+    group_clicks = Column(Integer, default=0)
+    joins = Column(Integer, default=0)
+    payments = Column(Integer, default=0)
+    
+    computed_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_group_rollup_day_group', 'day', 'group_id', unique=True),
+        Index('idx_group_rollup_group_day', 'group_id', 'day'),
+    )
+
 # === USER BEHAVIOR FEATURES ===
 
 class UserBehaviorFeatures(Base):
@@ -354,6 +443,30 @@ class UserSimilarity(Base):
         Index('idx_similarity_pair', 'user_id', 'similar_user_id', unique=True),
     )
 
+# === SEQUENTIAL PATTERNS ===
+
+class ProductTransition(Base):
+    """
+    Markov transition counts between viewed products, for orders 1-3.
+    `context` is the comma-joined ids of the last `ngram_order` products viewed;
+    `count` is how often `next_product_id` was viewed right after it.
+    Built in bulk from events and kept current by event ingestion.
+    """
+    __tablename__ = "product_transitions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    ngram_order = Column(Integer, nullable=False)  # 1, 2 or 3
+    context = Column(String(100), nullable=False)  # e.g. "12,7,31"
+    next_product_id = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_transition_key', 'ngram_order', 'context', 'next_product_id', unique=True),
+        Index('idx_transition_context_count', 'ngram_order', 'context', 'count'),
+    )
+
 # === FEATURE STORE ===
 
 class FeatureStore(Base):
@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from pydantic import BaseModel
 from typing import List
 from datetime import datetime
-from db.database import get_db
+from db.database import get_db, get_async_db
 from models.models import ChatMessage, GroupBuy, User
 from authentication.auth import verify_token
 import json
 import logging
 
+from websocket.fanout import FanoutManager
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -28,27 +32,20 @@ class ChatMessageResponse(BaseModel):
         from_attributes = True
 
 # WebSocket Connection Manager
-class ConnectionManager:
+class ConnectionManager(FanoutManager):
+    """Chat sockets by group_id; messages are queued per connection, never awaited per member"""
+
     def __init__(self):
-        self.active_connections: dict[int, list[WebSocket]] = {}
+        super().__init__("chat")
 
     async def connect(self, websocket: WebSocket, group_id: int):
-        await websocket.accept()
-        if group_id not in self.active_connections:
-            self.active_connections[group_id] = []
-        self.active_connections[group_id].append(websocket)
+        await super().connect(websocket, group_id)
 
     def disconnect(self, websocket: WebSocket, group_id: int):
-        if group_id in self.active_connections:
-            self.active_connections[group_id].remove(websocket)
+        super().disconnect(websocket, group_id)
 
     async def broadcast(self, message: str, group_id: int):
-        if group_id in self.active_connections:
-            for connection in self.active_connections[group_id]:
-                try:
-                    await connection.send_text(message)
-                except Exception as e:
-                    logger.error(f"Error parsing message: {e}")
+        self.publish(group_id, message)
 
 manager = ConnectionManager()
 
@@ -57,23 +54,27 @@ manager = ConnectionManager()
 async def get_messages(
     group_id: int,
     user: User = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all messages for a group-buy"""
-    group = db.query(GroupBuy).filter(GroupBuy.id == group_id).first()
-    if not group:
+    group_exists = await db.scalar(select(GroupBuy.id).where(GroupBuy.id == group_id))
+    if not group_exists:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group-buy not found")
     
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.group_buy_id == group_id
-    ).order_by(ChatMessage.created_at.asc()).all()
+    # Author emails joined in, rather than one user lookup per message
+    messages = await db.execute(
+        select(ChatMessage.id, ChatMessage.user_id, User.email, ChatMessage.message, ChatMessage.created_at)
+        .join(User, ChatMessage.user_id == User.id)
+        .where(ChatMessage.group_buy_id == group_id)
+        .order_by(ChatMessage.created_at.asc())
+    )
     
     result = []
     for msg in messages:
         result.append(ChatMessageResponse(
             id=msg.id,
             user_id=msg.user_id,
-            user_email=msg.user.email,
+            user_email=msg.email,
             message=msg.message,
             created_at=msg.created_at
         ))
@@ -0,0 +1,15 @@
+"""
+Helpers for the fields of stored analytics events, shared by event ingestion
+and the events_raw migrations.
+"""
+from typing import Optional
+
+def event_entity_id(properties: Optional[dict], key: str) -> Optional[int]:
+    """Extract an integer entity id (e.g. group_id, product_id) from event properties."""
+    if not properties:
+        return None
+    try:
+        value = properties.get(key)
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, contains_eager, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel
 from typing import List, Optional
 import os
@@ -12,7 +13,8 @@ import io
 import secrets
 import logging
 from cryptography.fernet import Fernet
-from db.database import get_db
+from api.responses import model_response
+from db.database import get_db, get_async_read_db
 from models.models import User, AdminGroup, Contribution, GroupBuy, AdminGroupJoin, QRCodePickup, SupplierOrder
 from authentication.auth import verify_token, verify_trader, verify_supplier
 
@@ -789,29 +791,33 @@ async def get_past_groups_summary(
     tags=["Groups"]
 )
 async def get_all_groups(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: Optional[User] = Depends(lambda: None)  # Optional authentication - allows public access
 ):
     """Get all active groups for browsing (both AdminGroups and GroupBuy groups)"""
     result = []
     
     # Get active AdminGroups
-    admin_groups = db.query(AdminGroup).filter(AdminGroup.is_active == True).all()
+    admin_groups = (await db.scalars(select(AdminGroup).where(AdminGroup.is_active == True))).all()
+    # Joined quantities and the user's joins for all admin groups, one query each
+    quantity_sums = dict((await db.execute(
+        select(AdminGroupJoin.admin_group_id, func.sum(AdminGroupJoin.quantity))
+        .group_by(AdminGroupJoin.admin_group_id)
+    )).all())
+    joined_admin_ids = set()
+    if current_user:
+        joined_admin_ids = set((await db.scalars(
+            select(AdminGroupJoin.admin_group_id).where(AdminGroupJoin.user_id == current_user.id)
+        )).all())
+    
     for group in admin_groups:
         # Check if user has joined this admin group (only if authenticated)
-        joined = False
-        if current_user:
-            joined = db.query(AdminGroupJoin).filter(
-                AdminGroupJoin.admin_group_id == group.id,
-                AdminGroupJoin.user_id == current_user.id
-            ).first() is not None
+        joined = group.id in joined_admin_ids
         
         # Calculate money tracking for AdminGroups
         target_amount = group.price * group.max_participants
         # Calculate current amount from all joins (quantity * price is more accurate)
-        total_quantity_sum = db.query(func.sum(AdminGroupJoin.quantity)).filter(
-            AdminGroupJoin.admin_group_id == group.id
-        ).scalar() or 0
+        total_quantity_sum = quantity_sums.get(group.id) or 0
         current_amount = float(total_quantity_sum) * group.price
         
         # Calculate dynamic status based on deadline and progress
@@ -870,21 +876,25 @@ async def get_all_groups(
             continue
     
     # Get all GroupBuy groups (not just active ones - we'll filter by status dynamically)
-    group_buy_groups = db.query(GroupBuy).join(GroupBuy.product).all()
+    group_buy_groups = (await db.scalars(
+        select(GroupBuy).join(GroupBuy.product)
+        .options(contains_eager(GroupBuy.product), selectinload(GroupBuy.creator))
+    )).all()
+    contribution_counts = dict((await db.execute(
+        select(Contribution.group_buy_id, func.count(Contribution.id)).group_by(Contribution.group_buy_id)
+    )).all())
+    joined_group_ids = set()
+    if current_user:
+        joined_group_ids = set((await db.scalars(
+            select(Contribution.group_buy_id).where(Contribution.user_id == current_user.id)
+        )).all())
     
     for group in group_buy_groups:
         # Calculate participants count
-        participants_count = db.query(Contribution).filter(
-            Contribution.group_buy_id == group.id
-        ).count()
+        participants_count = contribution_counts.get(group.id, 0)
         
         # Check if user has joined this group buy (only if authenticated)
-        joined = False
-        if current_user:
-            joined = db.query(Contribution).filter(
-                Contribution.group_buy_id == group.id,
-                Contribution.user_id == current_user.id
-            ).first() is not None
+        joined = group.id in joined_group_ids
         
         # Calculate dynamic status
         now = datetime.utcnow()
@@ -944,7 +954,8 @@ async def get_all_groups(
                 target_amount=round(group.target_amount, 2)
             ))
     
-    return result
+    # Already-built GroupResponse models: serialise without re-validating
+    return model_response(result, GroupResponse)
 
 @router.get(
     "/{group_id}",
@@ -996,19 +1007,19 @@ async def get_all_groups(
 )
 async def get_group_detail(
     group_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get detailed information about a specific group (AdminGroup or GroupBuy)"""
     
     # First try to find as AdminGroup
-    admin_group = db.query(AdminGroup).filter(AdminGroup.id == group_id).first()
+    admin_group = await db.get(AdminGroup, group_id)
     if admin_group:
         # Calculate money tracking for AdminGroups
         target_amount = admin_group.price * admin_group.max_participants
         # Calculate current amount from all joins (quantity * price is more accurate)
-        total_quantity_sum = db.query(func.sum(AdminGroupJoin.quantity)).filter(
-            AdminGroupJoin.admin_group_id == admin_group.id
-        ).scalar() or 0
+        total_quantity_sum = await db.scalar(
+            select(func.sum(AdminGroupJoin.quantity)).where(AdminGroupJoin.admin_group_id == admin_group.id)
+        ) or 0
         current_amount = float(total_quantity_sum) * admin_group.price
         
         return GroupDetailResponse(
@@ -1046,12 +1057,15 @@ async def get_group_detail(
         )
     
     # If not AdminGroup, try GroupBuy
-    group_buy = db.query(GroupBuy).join(GroupBuy.product).filter(GroupBuy.id == group_id).first()
+    group_buy = (await db.scalars(
+        select(GroupBuy).join(GroupBuy.product).where(GroupBuy.id == group_id)
+        .options(contains_eager(GroupBuy.product), selectinload(GroupBuy.creator))
+    )).first()
     if group_buy:
         # Calculate participants count
-        participants_count = db.query(Contribution).filter(
-            Contribution.group_buy_id == group_id
-        ).count()
+        participants_count = await db.scalar(
+            select(func.count(Contribution.id)).where(Contribution.group_buy_id == group_id)
+        )
         
         # Calculate progress
         progress_percentage = group_buy.moq_progress
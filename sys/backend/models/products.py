@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
+from db.cache import cached, tag_model_changes
 from db.database import get_db
 from models.models import Product
 from authentication.auth import verify_admin
@@ -55,14 +57,11 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
-# Routes
-@router.get("/", response_model=List[ProductResponse])
-async def get_products(
-    is_active: bool = True,
-    category: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    """Get all active products for webshop"""
+# Any committed product change (here, in supplier/group flows or seed scripts) refreshes the catalog
+tag_model_changes(Product, lambda product: ["products", f"product:{product.id}"])
+
+@cached(ttl_seconds=300, key="products:{is_active}:{category}", tags=["products"])
+def list_products(db: Session, is_active: Optional[bool], category: Optional[str]) -> List[dict]:
     query = db.query(Product)
     
     if is_active is not None:
@@ -71,8 +70,17 @@ async def get_products(
     if category:
         query = query.filter(Product.category == category)
     
-    products = query.all()
-    return products
+    return [ProductResponse.model_validate(product).model_dump() for product in query.all()]
+
+# Routes
+@router.get("/", response_model=List[ProductResponse])
+async def get_products(
+    is_active: bool = True,
+    category: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get all active products for webshop"""
+    return await run_in_threadpool(list_products, db, is_active, category)
 
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(product_id: int, db: Session = Depends(get_db)):
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, or_
+from sqlalchemy import func, desc, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -11,7 +12,7 @@ import cloudinary
 import cloudinary.uploader
 import cloudinary.api
 
-from db.database import get_db
+from db.database import get_db, get_async_db, get_read_db
 from models.models import User, SupplierProduct, ProductPricingTier, SupplierOrder, SupplierOrderItem, Product, GroupBuy, SupplierPickupLocation, SupplierInvoice, SupplierPayment, SupplierNotification, AdminGroup, AdminGroupJoin, Transaction
 from authentication.auth import verify_token, verify_supplier
 
@@ -232,7 +233,7 @@ def verify_supplier(user: User = Depends(verify_token)):
 @router.get("/dashboard/metrics", response_model=DashboardMetrics)
 async def get_supplier_dashboard_metrics(
     supplier: User = Depends(verify_supplier),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get dashboard metrics for supplier"""
     try:
@@ -1131,17 +1132,17 @@ async def get_supplier_groups(
 async def get_supplier_notifications(
     unread_only: bool = False,
     supplier: User = Depends(verify_supplier),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get supplier notifications"""
-    query = db.query(SupplierNotification).filter(
+    query = select(SupplierNotification).where(
         SupplierNotification.supplier_id == supplier.id
     )
     
     if unread_only:
-        query = query.filter(~SupplierNotification.is_read)
+        query = query.where(~SupplierNotification.is_read)
     
-    notifications = query.order_by(SupplierNotification.created_at.desc()).all()
+    notifications = (await db.scalars(query.order_by(SupplierNotification.created_at.desc()))).all()
     
     return [
         NotificationResponse(
@@ -1996,7 +1997,7 @@ async def delete_supplier_group(
 @router.get("/analytics/overview")
 async def get_supplier_analytics_overview(
     supplier: User = Depends(verify_supplier),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get comprehensive analytics overview for supplier"""
     try:
@@ -2165,7 +2166,7 @@ async def get_supplier_analytics_overview(
 async def get_supplier_revenue_trend(
     days: int = 30,
     supplier: User = Depends(verify_supplier),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get daily revenue trend for the specified number of days"""
     try:
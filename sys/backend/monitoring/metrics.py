@@ -0,0 +1,176 @@
+"""
+Prometheus metrics, served at GET /metrics in the text exposition format.
+
+Recording is lock-light: counters/histograms only take their own child's
+lock for an increment, and everything that describes current state (DB pool
+usage, WebSocket connections) is read by a collector at scrape time instead
+of being kept up to date on the request path. Metrics are per worker
+process; scrape each worker (or run one worker per container).
+
+Exposed:
+    http_request_duration_seconds{method,route,status}   histogram
+    http_requests_in_progress{method,route}               gauge
+    db_pool_checkout_seconds{pool}                        histogram
+    db_pool_connections{pool,state}                       gauge (scrape time)
+    cache_requests_total{cache,result}                    counter (hit/miss)
+    event_ingestion_queue_events                          gauge
+    websocket_connections{manager}                        gauge (scrape time)
+    websocket_slow_consumers_total{manager,action}        counter (dropped_message/disconnected)
+    recommendation_scoring_seconds{stage}                 histogram (cf/cbf/popularity)
+    training_stage_duration_seconds{stage}                gauge (last run)
+"""
+from typing import Callable, Dict
+import time
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from starlette.routing import Match
+
+router = APIRouter()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CHECKOUT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+SCORING_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being served", ["method", "route"],
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time to check a connection out of the pool", ["pool"], buckets=CHECKOUT_BUCKETS,
+)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result", ["cache", "result"])
+INGESTION_QUEUE_EVENTS = Gauge("event_ingestion_queue_events", "Analytics events accepted but not yet stored")
+SCORING_SECONDS = Histogram(
+    "recommendation_scoring_seconds", "Hybrid recommendation scoring time by stage",
+    ["stage"], buckets=SCORING_BUCKETS,
+)
+WEBSOCKET_SLOW_CONSUMERS = Counter(
+    "websocket_slow_consumers_total", "Messages dropped or connections closed for falling behind",
+    ["manager", "action"],
+)
+TRAINING_STAGE_SECONDS = Gauge(
+    "training_stage_duration_seconds", "Duration of each stage of the last model training run", ["stage"],
+)
+
+_pools: Dict[str, object] = {}
+_websocket_counters: Dict[str, Callable[[], int]] = {}
+UNMATCHED_ROUTE = "unmatched"
+MAX_CACHED_PATHS = 4096
+# (router, method, path) -> route template; plain dict ops, no lock on the request path
+_route_templates: Dict[tuple, str] = {}
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def watch_websocket_manager(name: str, count_connections: Callable[[], int]):
+    """Report `count_connections()` as websocket_connections{manager=name} at scrape time."""
+    _websocket_counters[name] = count_connections
+
+
+def watch_pool(name: str, engine):
+    """Time checkouts from `engine`'s pool and report its usage at scrape time."""
+    pool = engine.pool
+    if name in _pools and _pools[name] is pool:
+        return
+    connect = pool.connect
+    observe = DB_POOL_CHECKOUT_SECONDS.labels(name).observe
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    _pools[name] = pool
+
+
+class TrainingStageTimer:
+    """Times consecutive training stages: start("a") ... start("b") ... finish()."""
+
+    def __init__(self):
+        self.stage = None
+        self.started = 0.0
+
+    def start(self, stage: str):
+        self.finish()
+        self.stage, self.started = stage, time.perf_counter()
+
+    def finish(self):
+        if self.stage is not None:
+            TRAINING_STAGE_SECONDS.labels(self.stage).set(time.perf_counter() - self.started)
+            self.stage = None
+
+
+class _StateCollector:
+    """Pool usage and WebSocket connection counts, read when scraped."""
+
+    def collect(self):
+        pools = GaugeMetricFamily("db_pool_connections", "Connections in the pool by state", labels=["pool", "state"])
+        for name, pool in list(_pools.items()):
+            for state, reader in (("size", "size"), ("checked_out", "checkedout"),
+                                  ("checked_in", "checkedin"), ("overflow", "overflow")):
+                value = getattr(pool, reader, None)
+                if value is not None:
+                    # QueuePool.overflow() is negative while below pool_size
+                    pools.add_metric([name, state], max(value(), 0))
+        yield pools
+
+        websockets = GaugeMetricFamily("websocket_connections", "Open WebSocket connections", labels=["manager"])
+        for name, count in list(_websocket_counters.items()):
+            websockets.add_metric([name], count())
+        yield websockets
+
+
+REGISTRY.register(_StateCollector())
+
+
+def _match_route(router, method: str, path: str) -> str:
+    scope = {"type": "http", "method": method, "path": path}
+    for route in router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", path)
+    return UNMATCHED_ROUTE
+
+
+def route_template(request) -> str:
+    """The route a request maps to (/api/groups/{group_id}), so labels stay bounded."""
+    router = request.app.router
+    key = (id(router), request.method, request.url.path)
+    template = _route_templates.get(key)
+    if template is None:
+        template = _match_route(router, request.method, request.url.path)
+        if len(_route_templates) >= MAX_CACHED_PATHS:
+            _route_templates.clear()
+        _route_templates[key] = template
+    return template
+
+
+async def track_request_metrics(request, call_next):
+    """HTTP middleware: latency histogram and in-flight gauge per route."""
+    route = route_template(request)
+    in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(request.method, route)
+    in_progress.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        HTTP_REQUEST_SECONDS.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
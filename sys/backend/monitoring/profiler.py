@@ -0,0 +1,306 @@
+"""
+On-demand request profiling.
+
+A request is profiled when an admin asks for it (`X-Profile: 1` header or
+`?profile=1`, checked against their bearer token) or when it is picked by
+PROFILE_SAMPLE_RATE (optionally limited to the PROFILE_SAMPLE_PATHS
+prefixes). While it runs, a sampler thread records the request's stack
+every PROFILE_INTERVAL_MS:
+
+* when the request's code is running on the event loop, its live frames;
+* when it is suspended (database call in the threadpool, I/O, sleep), the
+  chain of awaits it is parked in, ending in an "[await]" frame, so the
+  profile shows wall-clock time and not only CPU time.
+
+Other requests sharing the event loop are left out. Each profile is written
+as a speedscope file (open at https://www.speedscope.app, or download as
+collapsed stacks for flamegraph.pl) to PROFILE_DIR, which keeps only the
+newest PROFILE_MAX_FILES. Profiled responses carry `X-Profile-Id`; admins
+list and download profiles at GET /admin/profiles.
+"""
+from typing import Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, QueryParams
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.abspath(os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "groupbuy_profiles")))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_PATHS = [p.strip() for p in os.getenv("PROFILE_SAMPLE_PATHS", "").split(",") if p.strip()]
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_FLAG = "profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SUFFIX = ".speedscope.json"
+AWAIT_FRAME = "[await]"
+
+_PROFILE_ID = re.compile(r"^[0-9]+-[0-9a-f]{12}$")
+_slots = threading.BoundedSemaphore(PROFILE_MAX_CONCURRENT)
+_write_lock = threading.Lock()
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _awaitable_frame(awaitable):
+    return getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+
+
+def _next_awaitable(awaitable):
+    return getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+
+
+class RequestSampler:
+    """Samples one request's stack from a background thread."""
+
+    def __init__(self, root_frame, task, loop_thread: int, interval: float = None):
+        self.root_frame = root_frame
+        self.task = task
+        self.loop_thread = loop_thread
+        self.interval = (interval if interval is not None else PROFILE_INTERVAL_MS) / 1000
+        self.stacks: Dict[tuple, float] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _running_stack(self) -> Optional[List[str]]:
+        frame = sys._current_frames().get(self.loop_thread)
+        stack = []
+        while frame is not None:
+            stack.append(_label(frame))
+            if frame is self.root_frame:
+                return stack[::-1]
+            frame = frame.f_back
+        return None
+
+    def _suspended_stack(self) -> List[str]:
+        stack, inside = [], False
+        awaitable = self.task.get_coro() if self.task is not None else None
+        while awaitable is not None:
+            frame = _awaitable_frame(awaitable)
+            if frame is None:
+                break
+            inside = inside or frame is self.root_frame
+            if inside:
+                stack.append(_label(frame))
+            awaitable = _next_awaitable(awaitable)
+        return stack + [AWAIT_FRAME]
+
+    def _run(self):
+        deadline = time.perf_counter() + PROFILE_MAX_SECONDS
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            try:
+                stack = self._running_stack() or self._suspended_stack()
+            except Exception:
+                # The loop moved on while we walked its frames; skip this sample
+                continue
+            key = tuple(stack)
+            self.stacks[key] = self.stacks.get(key, 0.0) + (now - last) * 1000
+            self.samples += 1
+            last = now
+            if now > deadline:
+                break
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def to_speedscope(stacks: Dict[tuple, float], name: str, meta: dict) -> dict:
+    frames: List[dict] = []
+    index: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, weight in stacks.items():
+        ids = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            ids.append(index[label])
+        samples.append(ids)
+        weights.append(round(weight, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "groupbuy request profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled", "name": name, "unit": "milliseconds",
+            "startValue": 0, "endValue": round(sum(weights), 3),
+            "samples": samples, "weights": weights,
+        }],
+        "meta": meta,
+    }
+
+
+def to_collapsed(profile: dict) -> str:
+    """Speedscope profile as collapsed stacks ("a;b;c <weight in ms>" lines, for flamegraph.pl)."""
+    frames = profile["shared"]["frames"]
+    sampled = profile["profiles"][0]
+    lines = []
+    for ids, weight in zip(sampled["samples"], sampled["weights"]):
+        lines.append(";".join(frames[i]["name"].replace(";", ",") for i in ids) + f" {max(1, round(weight))}")
+    return "\n".join(lines) + "\n"
+
+
+def _prune():
+    names = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(PROFILE_SUFFIX))
+    for stale in names[:max(0, len(names) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, stale))
+        except OSError:
+            pass
+
+
+def new_profile_id() -> str:
+    # Millisecond timestamp first, so ids sort oldest to newest
+    return f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:12]}"
+
+
+def save_profile(stacks: Dict[tuple, float], meta: dict, profile_id: str = None) -> str:
+    """Write a profile into the ring, dropping the oldest beyond PROFILE_MAX_FILES; returns its id."""
+    profile_id = profile_id or new_profile_id()
+    meta = dict(meta, id=profile_id)
+    profile = to_speedscope(stacks, f"{meta['method']} {meta['path']}", meta)
+    with _write_lock:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, profile_id + PROFILE_SUFFIX)
+        with open(path + ".tmp", "w") as f:
+            json.dump(profile, f)
+        os.replace(path + ".tmp", path)
+        _prune()
+    return profile_id
+
+
+def list_profiles() -> List[dict]:
+    """Stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(PROFILE_SUFFIX):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                meta = json.load(f).get("meta", {})
+        except (OSError, ValueError):
+            continue
+        profiles.append(dict(meta, id=name[:-len(PROFILE_SUFFIX)]))
+    return profiles
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, profile_id + PROFILE_SUFFIX)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_admin_token(token: str) -> bool:
+    from authentication.auth import verify_token_string
+    from db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        user = verify_token_string(token, db)
+        return bool(user is not None and user.is_admin)
+    finally:
+        db.close()
+
+
+async def _requested_by_admin(headers: Headers, query: QueryParams) -> bool:
+    flag = headers.get(PROFILE_HEADER) or query.get(PROFILE_QUERY_FLAG)
+    if flag not in ("1", "true", "yes"):
+        return False
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return False
+    return await run_in_threadpool(is_admin_token, authorization[7:].strip())
+
+
+def _sampled(path: str) -> bool:
+    if PROFILE_SAMPLE_RATE <= 0:
+        return False
+    if PROFILE_SAMPLE_PATHS and not any(path.startswith(prefix) for prefix in PROFILE_SAMPLE_PATHS):
+        return False
+    return random.random() < PROFILE_SAMPLE_RATE
+
+
+class RequestProfilerMiddleware:
+    """ASGI middleware profiling admin-flagged and sampled requests.
+
+    Added before the other middleware, so it is the innermost one and the
+    route runs in the same task (and below the same frame) as this one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        trigger = None
+        if await _requested_by_admin(headers, QueryParams(scope.get("query_string", b""))):
+            trigger = "admin"
+        elif _sampled(scope["path"]):
+            trigger = "sampled"
+        if trigger is None or not _slots.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+        try:
+            await self._profile(scope, receive, send, trigger)
+        finally:
+            _slots.release()
+
+    async def _profile(self, scope, receive, send, trigger: str):
+        profile_id = new_profile_id()
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER.lower().encode(), profile_id.encode())]
+            await send(message)
+
+        sampler = RequestSampler(sys._getframe(), asyncio.current_task(), threading.get_ident())
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            meta = {
+                "method": scope["method"], "path": scope["path"], "status": status["code"], "trigger": trigger,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1), "samples": sampler.samples,
+                "interval_ms": PROFILE_INTERVAL_MS, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+            try:
+                await run_in_threadpool(save_profile, sampler.stacks, meta, profile_id)
+                logger.info(f"🔬 Profiled {meta['method']} {meta['path']} ({meta['duration_ms']} ms): {profile_id}")
+            except OSError as e:
+                logger.warning(f"Could not save request profile: {e}")
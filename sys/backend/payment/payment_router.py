@@ -239,6 +239,15 @@ async def confirm_pending_join(tx_ref: str, transaction_id: str, db: Session):
         logger.error(f"Failed to confirm pending join for tx_ref {tx_ref}: {e}")
         db.rollback()
         raise
+    
+    if pending_join.group_type == "admin_group":
+        # Keep the cluster participation index used by admin-group recommendations current.
+        # The join is already committed, so a failure here must not undo or fail it.
+        try:
+            from ml.cluster_participation import record_admin_group_join
+            record_admin_group_join(db, pending_join.user_id, pending_join.group_id)
+        except Exception as e:
+            logger.warning(f"Could not update cluster participation for tx_ref {tx_ref}: {e}")
 
 @router.get("/callback")
 async def payment_callback(
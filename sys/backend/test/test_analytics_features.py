@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Unit tests for analytics event ingestion and incremental behaviour features.
+Uses an in-memory SQLite database so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User
+from models.analytics_models import EventsRaw, UserBehaviorFeatures, FeatureStore
+from analytics.analytics_router import (
+    AnalyticsEvent,
+    EventContext,
+    process_events_batch,
+    VIEWED_GROUPS_KEY,
+)
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create an in-memory test database for each test"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture
+def trader(test_db):
+    user = User(
+        email="trader@example.com",
+        hashed_password="hashed_password_123",
+        full_name="Test Trader",
+        location_zone="HARARE",
+        is_admin=False,
+        is_supplier=False,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+    return user
+
+
+def make_event(event_id, event_type, user_id, properties=None, timestamp=None, session_id="sess_1"):
+    return AnalyticsEvent(
+        event_id=event_id,
+        event_type=event_type,
+        user_id=user_id,
+        anonymous_id="anon_1",
+        session_id=session_id,
+        timestamp=timestamp or datetime.utcnow(),
+        properties=properties or {},
+        context=EventContext(url="http://localhost/groups", path="/groups", user_agent="pytest"),
+    )
+
+
+class TestIncrementalUserFeatures:
+    """Incremental feature updates apply batch deltas only"""
+
+    def test_counts_do_not_inflate_across_batches(self, test_db, trader):
+        process_events_batch([
+            make_event("e1", "page_view", trader.id),
+            make_event("e2", "group_view", trader.id, {"group_id": 1}),
+        ], test_db)
+        process_events_batch([
+            make_event("e3", "group_view", trader.id, {"group_id": 2}),
+            make_event("e4", "group_join_click", trader.id, {"group_id": 2}),
+        ], test_db)
+
+        features = test_db.query(UserBehaviorFeatures).filter_by(user_id=trader.id).one()
+        assert features.total_events == 4
+        assert features.total_page_views == 1
+        assert features.total_group_views == 2
+        assert features.total_group_clicks == 1
+        assert features.browse_to_click_rate == pytest.approx(0.5)
+
+    def test_duplicate_events_are_ignored(self, test_db, trader):
+        batch = [make_event("dup", "group_view", trader.id, {"group_id": 1})]
+        process_events_batch(batch, test_db)
+        process_events_batch(batch + batch, test_db)
+
+        assert test_db.query(EventsRaw).count() == 1
+        features = test_db.query(UserBehaviorFeatures).filter_by(user_id=trader.id).one()
+        assert features.total_group_views == 1
+
+    def test_unique_groups_viewed_uses_id_set(self, test_db, trader):
+        process_events_batch([
+            make_event("v1", "group_view", trader.id, {"group_id": 5}),
+            make_event("v2", "group_view", trader.id, {"group_id": 5}),
+            make_event("v3", "group_view", trader.id, {"group_id": "7"}),
+        ], test_db)
+        process_events_batch([
+            make_event("v4", "group_view", trader.id, {"group_id": 7}),
+            make_event("v5", "group_view", trader.id, {"group_id": 9}),
+        ], test_db)
+
+        features = test_db.query(UserBehaviorFeatures).filter_by(user_id=trader.id).one()
+        assert features.total_group_views == 5
+        assert features.unique_groups_viewed == 3
+
+        record = test_db.query(FeatureStore).filter_by(
+            feature_key=VIEWED_GROUPS_KEY.format(user_id=trader.id)
+        ).one()
+        assert record.feature_value["group_ids"] == [5, 7, 9]
+
+    def test_viewed_group_set_is_seeded_from_stored_events(self, test_db, trader):
+        # History ingested before the set existed (e.g. by the daily ETL era)
+        for i, gid in enumerate([1, 2, 3]):
+            test_db.add(EventsRaw(id=f"old-{i}", event_id=f"old-{i}", event_type="group_view", user_id=trader.id,
+                                  session_id="s", timestamp=datetime.utcnow(), group_id=gid))
+        test_db.add(UserBehaviorFeatures(user_id=trader.id, unique_groups_viewed=3))
+        test_db.commit()
+
+        process_events_batch([make_event("n1", "group_view", trader.id, {"group_id": 4})], test_db)
+        features = test_db.query(UserBehaviorFeatures).filter_by(user_id=trader.id).one()
+        assert features.unique_groups_viewed == 4
+
+    def test_deltas_are_applied_in_sql(self, test_db, trader):
+        # Totals written by another session after this one loaded the row are kept
+        test_db.add(UserBehaviorFeatures(user_id=trader.id, total_events=10, total_group_views=8))
+        test_db.commit()
+        stale = test_db.query(UserBehaviorFeatures).filter_by(user_id=trader.id).one()
+        other = sessionmaker(bind=test_db.get_bind())()
+        other.query(UserBehaviorFeatures).filter_by(user_id=trader.id).update({"total_events": 20})
+        other.commit()
+        other.close()
+
+        process_events_batch([make_event("d1", "group_view", trader.id, {"group_id": 1})], test_db)
+        test_db.refresh(stale)
+        assert stale.total_events == 21
+        assert stale.total_group_views == 9
+        assert stale.engagement_score == pytest.approx(9 / 50 * 0.3)
+
+    def test_recency_tracks_latest_event(self, test_db, trader):
+        earlier = datetime.utcnow() - timedelta(hours=2)
+        later = datetime.utcnow()
+        process_events_batch([
+            make_event("j1", "group_join_complete", trader.id, {"group_id": 1}, timestamp=later),
+            make_event("j2", "group_join_complete", trader.id, {"group_id": 2}, timestamp=earlier),
+        ], test_db)
+
+        features = test_db.query(UserBehaviorFeatures).filter_by(user_id=trader.id).one()
+        assert features.total_joins == 2
+        assert features.last_join.replace(tzinfo=None) == later.replace(tzinfo=None)
+
+
+class TestEventCompaction:
+    """Daily rollups and raw event retention"""
+
+    def test_rollups_aggregate_by_user_and_group(self, test_db, trader):
+        from analytics.etl_pipeline import compact_event_rollups
+        from models.analytics_models import EventDailyUserRollup, EventDailyGroupRollup
+
+        day = datetime.utcnow() - timedelta(days=2)
+        process_events_batch([
+            make_event("r1", "group_view", trader.id, {"group_id": 3}, timestamp=day),
+            make_event("r2", "group_view", trader.id, {"group_id": 3}, timestamp=day, session_id="sess_2"),
+            make_event("r3", "group_join_complete", trader.id, {"group_id": 3}, timestamp=day),
+            make_event("r4", "page_view", trader.id, timestamp=day),
+            make_event("today", "page_view", trader.id),
+        ], test_db)
+
+        assert compact_event_rollups(test_db) >= 1
+
+        user_rollup = test_db.query(EventDailyUserRollup).filter_by(user_id=trader.id).one()
+        assert user_rollup.day == day.date()
+        assert user_rollup.total_events == 4
+        assert user_rollup.unique_sessions == 2
+        assert user_rollup.group_views == 2
+        assert user_rollup.joins == 1
+        assert user_rollup.event_counts["page_view"] == 1
+
+        group_rollup = test_db.query(EventDailyGroupRollup).filter_by(group_id=3).one()
+        assert group_rollup.total_events == 3
+        assert group_rollup.unique_users == 1
+        assert group_rollup.joins == 1
+
+        # Already compacted days are not recomputed
+        assert compact_event_rollups(test_db) == 0
+
+    def test_retention_archives_only_rolled_up_events(self, test_db, trader):
+        from analytics.etl_pipeline import compact_event_rollups, apply_events_retention
+        from analytics.analytics_router import get_event_breakdown
+        from models.analytics_models import EventsArchive
+
+        old = datetime.utcnow() - timedelta(days=40)
+        process_events_batch([
+            make_event("old1", "group_view", trader.id, {"group_id": 1}, timestamp=old),
+            make_event("old2", "page_view", trader.id, timestamp=old),
+            make_event("new1", "page_view", trader.id),
+        ], test_db)
+
+        # Nothing is archived before the days are compacted
+        assert apply_events_retention(test_db, retention_days=30) == 0
+
+        compact_event_rollups(test_db)
+        assert apply_events_retention(test_db, retention_days=30) == 2
+        assert test_db.query(EventsRaw).count() == 1
+        assert test_db.query(EventsArchive).count() == 2
+
+        # Activity breakdown still sees archived days through the rollups
+        assert get_event_breakdown(test_db, trader.id) == {"group_view": 1, "page_view": 2}
+
+    def test_daily_totals_survive_retention(self, test_db, trader):
+        from analytics.etl_pipeline import (
+            compact_event_rollups, apply_events_retention, update_user_features_daily, update_group_metrics_daily,
+        )
+        from models.models import AdminGroup
+        from models.analytics_models import GroupPerformanceMetrics
+
+        group = AdminGroup(name="Rice", description="Rice 10kg", category="Grains", price=10.0, original_price=12.0,
+                           image="rice.jpg", end_date=datetime.utcnow() + timedelta(days=5))
+        test_db.add(group)
+        test_db.commit()
+        old = datetime.utcnow() - timedelta(days=40)
+        process_events_batch([
+            make_event("o1", "group_view", trader.id, {"group_id": group.id}, timestamp=old),
+            make_event("o2", "group_join_complete", trader.id, {"group_id": group.id}, timestamp=old),
+            make_event("n1", "group_view", trader.id, {"group_id": group.id}),
+        ], test_db)
+        compact_event_rollups(test_db)
+        assert apply_events_retention(test_db, retention_days=30) == 2
+
+        update_user_features_daily(test_db)
+        update_group_metrics_daily(test_db)
+        features = test_db.query(UserBehaviorFeatures).filter_by(user_id=trader.id).one()
+        assert (features.total_events, features.total_group_views, features.total_joins) == (3, 2, 1)
+        metrics = test_db.query(GroupPerformanceMetrics).filter_by(admin_group_id=group.id).one()
+        assert (metrics.total_views, metrics.total_joins) == (2, 1)
+
+    def test_late_events_are_folded_into_compacted_days(self, test_db, trader):
+        from analytics.etl_pipeline import compact_event_rollups, apply_events_retention
+        from analytics.analytics_router import get_event_breakdown
+        from models.analytics_models import EventDailyUserRollup
+
+        old = datetime.utcnow() - timedelta(days=40)
+        process_events_batch([make_event("a1", "page_view", trader.id, timestamp=old)], test_db)
+        compact_event_rollups(test_db)
+        assert apply_events_retention(test_db, retention_days=30) == 1
+
+        # Arrives (client timestamp) for a day that is already compacted and archived
+        process_events_batch([make_event("late", "group_view", trader.id, {"group_id": 1}, timestamp=old)], test_db)
+        assert compact_event_rollups(test_db) == 0
+
+        rollup = test_db.query(EventDailyUserRollup).filter_by(user_id=trader.id, day=old.date()).one()
+        assert rollup.event_counts == {"page_view": 1, "group_view": 1}
+        apply_events_retention(test_db, retention_days=30)
+        assert get_event_breakdown(test_db, trader.id) == {"page_view": 1, "group_view": 1}
+
+    def test_daily_activity_is_admin_only(self, test_db, trader):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from analytics.analytics_router import router
+        from authentication.auth import verify_token
+        from db.database import get_read_db
+
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_read_db] = lambda: test_db
+        app.dependency_overrides[verify_token] = lambda: trader
+        client = TestClient(app)
+
+        response = client.get("/api/analytics/daily-activity", params={"group_id": 1})
+        assert response.status_code == 403
+
+
+class TestEventEntityColumns:
+    """group_id/product_id are promoted out of properties"""
+
+    def test_ingestion_populates_entity_columns(self, test_db, trader):
+        process_events_batch([
+            make_event("g1", "group_view", trader.id, {"group_id": "12", "product_id": 4}),
+            make_event("g2", "page_view", trader.id, {"page_name": "home"}),
+        ], test_db)
+
+        by_id = {e.event_id: e for e in test_db.query(EventsRaw).all()}
+        assert (by_id["g1"].group_id, by_id["g1"].product_id) == (12, 4)
+        assert (by_id["g2"].group_id, by_id["g2"].product_id) == (None, None)
+
+    def test_group_metrics_use_group_id_column(self, test_db, trader):
+        from analytics.etl_pipeline import update_group_metrics_daily
+        from models.models import AdminGroup
+        from models.analytics_models import GroupPerformanceMetrics
+
+        group = AdminGroup(name="Rice", description="Bulk rice", category="Grains", price=10.0,
+                           original_price=12.0, image="rice.jpg",
+                           end_date=datetime.utcnow() + timedelta(days=3))
+        test_db.add(group)
+        test_db.commit()
+
+        process_events_batch([
+            make_event("m1", "group_view", trader.id, {"group_id": group.id}),
+            make_event("m2", "group_view", trader.id, {"group_id": group.id}),
+            make_event("m3", "group_join_click", trader.id, {"group_id": group.id}),
+        ], test_db)
+        update_group_metrics_daily(test_db)
+
+        metrics = test_db.query(GroupPerformanceMetrics).filter_by(admin_group_id=group.id).one()
+        assert metrics.total_views == 2
+        assert metrics.total_clicks == 1
+        assert metrics.view_to_click_rate == pytest.approx(0.5)
+
+    def test_backfill_migration(self, test_db, trader):
+        import uuid
+        from db.migrate_event_entity_columns import backfill
+
+        for i, props in enumerate([{"group_id": 3}, {"product_id": "8"}, {"page_name": "home"}]):
+            test_db.add(EventsRaw(id=str(uuid.uuid4()), event_id=f"old{i}", event_type="group_view",
+                                  user_id=trader.id, session_id="s", timestamp=datetime.utcnow(),
+                                  properties=props))
+        test_db.commit()
+
+        with test_db.get_bind().connect() as conn:
+            assert backfill(conn, EventsRaw) == 2
+        test_db.expire_all()
+        rows = {e.event_id: (e.group_id, e.product_id) for e in test_db.query(EventsRaw).all()}
+        assert rows == {"old0": (3, None), "old1": (None, 8), "old2": (None, None)}
+
+
+class TestProductTransitions:
+    """Markov transition index over product views"""
+
+    def views(self, prefix, user_id, product_ids, start=None, session_id="sess_1"):
+        start = start or datetime.utcnow() - timedelta(hours=1)
+        return [
+            make_event(f"{prefix}{i}", "product_view", user_id, {"product_id": pid},
+                       timestamp=start + timedelta(seconds=i), session_id=session_id)
+            for i, pid in enumerate(product_ids)
+        ]
+
+    def test_ingestion_counts_transitions_across_batches(self, test_db, trader):
+        from analytics.transition_index import next_products
+        from models.analytics_models import ProductTransition
+
+        process_events_batch(self.views("a", trader.id, [1, 2]), test_db)
+        later = datetime.utcnow()
+        process_events_batch(self.views("b", trader.id, [3, 2, 3], start=later), test_db)
+
+        counts = {(t.ngram_order, t.context, t.next_product_id): t.count
+                  for t in test_db.query(ProductTransition).all()}
+        assert counts[(1, "2", 3)] == 2
+        assert counts[(2, "1,2", 3)] == 1   # context carried over from the first batch
+        assert counts[(3, "2,3,2", 3)] == 1
+
+        assert next_products(test_db, [2]) == [(3, 1.0)]
+        assert next_products(test_db, [1, 2, 3]) == [(2, 1.0)]
+        # Unknown longer contexts back off to shorter ones
+        assert next_products(test_db, [9, 3]) == [(2, 1.0)]
+        assert next_products(test_db, [42]) == []
+
+    def test_rebuild_matches_incremental_index(self, test_db, trader):
+        from analytics.transition_index import rebuild_transition_index
+        from models.analytics_models import ProductTransition
+
+        process_events_batch(self.views("c", trader.id, [5, 6, 7, 5, 6, 8]), test_db)
+        incremental = {(t.ngram_order, t.context, t.next_product_id): t.count
+                       for t in test_db.query(ProductTransition).all()}
+
+        assert rebuild_transition_index(test_db) == len(incremental)
+        rebuilt = {(t.ngram_order, t.context, t.next_product_id): t.count
+                   for t in test_db.query(ProductTransition).all()}
+        assert rebuilt == incremental
+
+    def test_counts_are_added_in_sql(self, test_db, trader):
+        from collections import Counter
+        from analytics.transition_index import apply_transition_counts
+        from models.analytics_models import ProductTransition
+
+        apply_transition_counts(test_db, Counter({(1, "4", 5): 2}))
+        test_db.commit()
+        loaded = test_db.query(ProductTransition).one()
+        # Another batch adds to the same and to a new transition after this session loaded the row
+        apply_transition_counts(test_db, Counter({(1, "4", 5): 3, (1, "4", 6): 1}))
+        test_db.commit()
+
+        test_db.refresh(loaded)
+        assert loaded.count == 5
+        assert test_db.query(ProductTransition).count() == 2
+
+    def test_miner_reads_index(self, test_db, trader):
+        from ml.behavioral_ml_service import SequentialPatternMiner
+
+        process_events_batch(self.views("d", trader.id, [1, 2, 1, 2, 1, 3]), test_db)
+        predictions = SequentialPatternMiner(test_db).find_next_likely_products(trader.id, [1], top_k=5)
+        assert predictions[0][0] == 2
+        assert predictions[0][1] == pytest.approx(2 / 3)
+        assert predictions[1] == (3, pytest.approx(1 / 3))
+
+
+class TestSessionStore:
+    """Session context is maintained by ingestion, not re-read from events_raw"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_store(self):
+        from analytics.session_store import clear_session_store
+        clear_session_store()
+        yield
+        clear_session_store()
+
+    def test_context_built_from_ingested_events(self, test_db, trader):
+        from ml.behavioral_ml_service import SessionBasedRecommender
+
+        start = datetime.utcnow() - timedelta(minutes=5)
+        process_events_batch([
+            make_event("s1", "group_view", trader.id, {"group_id": 4, "category": "Grains", "price": 10},
+                       timestamp=start, session_id="live"),
+            make_event("s2", "product_view", trader.id, {"product_id": 7, "category": "Dairy", "price": "20"},
+                       timestamp=start + timedelta(seconds=90), session_id="live"),
+            make_event("s3", "product_search", trader.id, {"query": "milk"},
+                       timestamp=start + timedelta(seconds=120), session_id="live"),
+        ], test_db)
+
+        # The context must not depend on the event table any more
+        test_db.query(EventsRaw).delete()
+        test_db.commit()
+
+        context = SessionBasedRecommender(test_db).get_session_context("live")
+        assert context["event_count"] == 3
+        assert context["duration"] == 120
+        assert context["viewed_products"] == [7]
+        assert context["viewed_groups"] == [4]
+        assert context["viewed_categories"] == ["Grains", "Dairy"]
+        assert context["last_category"] == "Dairy"
+        assert context["avg_price"] == pytest.approx(15.0)
+        assert context["session_intent"] == "research"
+
+    def test_ring_buffer_is_bounded(self, test_db, trader, monkeypatch):
+        import analytics.session_store as session_store
+        monkeypatch.setattr(session_store, "SESSION_BUFFER_SIZE", 3)
+
+        start = datetime.utcnow() - timedelta(minutes=5)
+        process_events_batch([
+            make_event(f"rb{i}", "group_view", trader.id, {"group_id": i},
+                       timestamp=start + timedelta(seconds=i), session_id="ring")
+            for i in range(8)
+        ], test_db)
+
+        context = session_store.get_session_state("ring").context()
+        assert context["event_count"] == 8
+        assert context["viewed_groups"] == [5, 6, 7]
+        assert context["session_intent"] == "browsing"
+
+    def test_expired_sessions_are_evicted_and_cold_store_reseeds(self, test_db, trader, monkeypatch):
+        import analytics.session_store as session_store
+        from ml.behavioral_ml_service import SessionBasedRecommender
+
+        process_events_batch([make_event("t1", "add_to_cart", trader.id, session_id="cart")], test_db)
+        assert session_store.get_session_state("cart") is not None
+
+        monkeypatch.setattr(session_store, "SESSION_STORE_TTL_SECONDS", -1)
+        session_store._save(session_store.get_session_state("cart"))
+        assert session_store.get_session_state("cart") is None
+
+        monkeypatch.setattr(session_store, "SESSION_STORE_TTL_SECONDS", 1800)
+        context = SessionBasedRecommender(test_db).get_session_context("cart")
+        assert context["session_intent"] == "consideration"
+        assert session_store.get_session_state("cart") is not None
+
+    @staticmethod
+    def record_concurrently(session_store, sessions, batches=2, per_batch=20):
+        """Record `batches` batches per session at once (as /track-batch's threadpool does)."""
+        import threading
+        from types import SimpleNamespace
+
+        start = datetime.utcnow()
+        barrier = threading.Barrier(batches + 1)
+        errors = []
+
+        def record(batch):
+            barrier.wait()
+            session_store.record_session_events([
+                SimpleNamespace(session_id=session_id, event_type="group_view", user_id=1,
+                                timestamp=start + timedelta(milliseconds=batch * per_batch + i),
+                                properties={"group_id": i})
+                for session_id in sessions for i in range(per_batch)
+            ])
+
+        def read():
+            barrier.wait()
+            for _ in range(200):
+                for session_id in sessions:
+                    state = session_store.get_session_state(session_id)
+                    try:
+                        state and state.context()
+                    except RuntimeError as e:
+                        errors.append(e)
+
+        threads = [threading.Thread(target=record, args=(b,)) for b in range(batches)]
+        threads.append(threading.Thread(target=read))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_concurrent_batches_do_not_lose_events(self, monkeypatch):
+        import time
+        import analytics.session_store as session_store
+
+        # Widen the window between loading a session and saving it
+        add = session_store.SessionState.add
+        monkeypatch.setattr(session_store.SessionState, "add",
+                            lambda self, *args: time.sleep(0.0001) or add(self, *args))
+        sessions = [f"concurrent_{i}" for i in range(10)]
+        errors = self.record_concurrently(session_store, sessions)
+
+        assert errors == []
+        for session_id in sessions:
+            assert session_store.get_session_state(session_id).event_count == 40
+
+    def test_concurrent_batches_do_not_lose_events_in_redis(self, monkeypatch):
+        import redis
+        import analytics.session_store as session_store
+        from db import redis_client
+
+        client = redis.from_url(os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15"),
+                                decode_responses=True, socket_connect_timeout=0.2)
+        try:
+            client.ping()
+        except redis.exceptions.ConnectionError:
+            pytest.skip("Redis is not reachable")
+        monkeypatch.setattr(session_store, "SESSION_STORE_BACKEND", "redis")
+        monkeypatch.setattr(redis_client, "_redis_client", client)
+        sessions = [f"concurrent_redis_{i}" for i in range(10)]
+        client.delete(*[session_store.REDIS_KEY_PREFIX + s for s in sessions])
+
+        try:
+            assert self.record_concurrently(session_store, sessions) == []
+            session_store.clear_session_store()  # read back what Redis holds
+            for session_id in sessions:
+                assert session_store.get_session_state(session_id).event_count == 40
+        finally:
+            client.delete(*[session_store.REDIS_KEY_PREFIX + s for s in sessions])
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the hot read endpoints served from the async session.
+Uses a temporary SQLite file (written through the sync engine, read through
+aiosqlite) so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base, to_async_url
+
+from models.models import (
+    User, Product, GroupBuy, Contribution, AdminGroup, AdminGroupJoin, ChatMessage, SupplierNotification
+)
+from models.groups import GroupResponse, get_all_groups, get_group_detail
+from models.chat import get_messages
+from models.supplier import get_supplier_notifications
+from ml.ml import get_recommendations_for_user, load_recommendation_candidates
+
+
+@pytest.fixture(scope="function")
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'groupbuy.db'}"
+
+
+@pytest.fixture(scope="function")
+def test_db(database_url):
+    """File-backed test database shared by the sync and async engines"""
+    engine = create_engine(database_url, echo=False)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+    engine.dispose()
+
+
+def run(database_url, route, *args, **kwargs):
+    """Call an async route with a fresh AsyncSession on the test database."""
+    async def call():
+        engine = create_async_engine(to_async_url(database_url)[0])
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as adb:
+                return await route(*args, db=adb, **kwargs)
+        finally:
+            await engine.dispose()
+    return asyncio.run(call())
+
+
+@pytest.fixture
+def catalogue(test_db):
+    trader = User(email="trader@example.com", hashed_password="x", full_name="Trader", location_zone="HARARE")
+    supplier = User(email="supplier@example.com", hashed_password="x", full_name="Supplier",
+                    location_zone="HARARE", is_supplier=True, company_name="Supplier Co")
+    test_db.add_all([trader, supplier])
+    test_db.commit()
+
+    admin_group = AdminGroup(name="Salt", description="Salt in bulk", category="Grains", price=5.0,
+                             original_price=6.0, image="salt.jpg", max_participants=10, participants=2,
+                             end_date=datetime.utcnow() + timedelta(days=5))
+    test_db.add(admin_group)
+    groups = []
+    for name, zone in [("Rice", "HARARE"), ("Beans", "HARARE"), ("Oil", "BULAWAYO")]:
+        product = Product(name=name, description=f"{name} in bulk", category="Grains",
+                          unit_price=12.0, bulk_price=10.0, moq=4)
+        test_db.add(product)
+        test_db.commit()
+        group = GroupBuy(product_id=product.id, creator_id=supplier.id, location_zone=zone,
+                         deadline=datetime.utcnow() + timedelta(days=5), total_quantity=2)
+        test_db.add(group)
+        groups.append(group)
+    test_db.commit()
+
+    rice = groups[0]
+    test_db.add_all([
+        AdminGroupJoin(admin_group_id=admin_group.id, user_id=trader.id, quantity=3,
+                       delivery_method="pickup", payment_method="cash"),
+        Contribution(group_buy_id=rice.id, user_id=trader.id, quantity=2, contribution_amount=20.0),
+        ChatMessage(group_buy_id=rice.id, user_id=trader.id, message="Hello",
+                    created_at=datetime.utcnow() - timedelta(minutes=5)),
+        ChatMessage(group_buy_id=rice.id, user_id=supplier.id, message="Welcome"),
+        SupplierNotification(supplier_id=supplier.id, title="Order", message="New order", type="order"),
+        SupplierNotification(supplier_id=supplier.id, title="Paid", message="Payment in", type="payment",
+                             is_read=True),
+    ])
+    test_db.commit()
+    return trader, supplier, admin_group, groups
+
+
+class TestAsyncGroupReads:
+    """Group listing and detail on the async session"""
+
+    def test_lists_admin_and_community_groups(self, test_db, database_url, catalogue):
+        trader, supplier, admin_group, (rice, beans, oil) = catalogue
+        response = run(database_url, get_all_groups, current_user=trader)
+        groups = [GroupResponse.model_validate(group) for group in json.loads(response.body)]
+
+        by_name = {group.name: group for group in groups}
+        assert set(by_name) == {"Salt", "Rice", "Beans", "Oil"}
+        assert by_name["Salt"].current_amount == 15.0
+        assert by_name["Salt"].joined and by_name["Rice"].joined
+        assert by_name["Rice"].participants == 1 and by_name["Beans"].participants == 0
+        assert not by_name["Beans"].joined
+        assert by_name["Rice"].adminName == "Supplier Co"
+
+    def test_group_detail(self, test_db, database_url, catalogue):
+        trader, supplier, admin_group, (rice, beans, oil) = catalogue
+        assert run(database_url, get_group_detail, admin_group.id).adminCreated
+
+        detail = run(database_url, get_group_detail, beans.id)
+        assert (detail.name, detail.adminName, detail.remainingNeeded) == ("Beans", "Supplier Co", 2)
+
+        with pytest.raises(HTTPException) as exc:
+            run(database_url, get_group_detail, 999)
+        assert exc.value.status_code == 404
+
+
+class TestAsyncMessageReads:
+    def test_chat_history_in_order(self, test_db, database_url, catalogue):
+        trader, supplier, admin_group, (rice, beans, oil) = catalogue
+        messages = run(database_url, get_messages, rice.id, user=trader)
+        assert [(m.user_email, m.message) for m in messages] == [
+            ("trader@example.com", "Hello"), ("supplier@example.com", "Welcome")
+        ]
+        with pytest.raises(HTTPException):
+            run(database_url, get_messages, 999, user=trader)
+
+    def test_supplier_notifications(self, test_db, database_url, catalogue):
+        trader, supplier, admin_group, groups = catalogue
+        assert len(run(database_url, get_supplier_notifications, supplier=supplier)) == 2
+        unread = run(database_url, get_supplier_notifications, unread_only=True, supplier=supplier)
+        assert [n.title for n in unread] == ["Order"]
+
+
+class TestRecommendationCandidates:
+    def test_candidates_match_sync_fetch(self, test_db, database_url, catalogue):
+        trader, supplier, admin_group, (rice, beans, oil) = catalogue
+
+        async def load(db):
+            return await load_recommendation_candidates(db, trader, test_db)
+
+        active_groups, joined = run(database_url, load)
+        assert sorted(g.id for g in active_groups) == [rice.id, beans.id]
+        assert joined == {rice.id}
+        assert all(g in test_db for g in active_groups)
+
+        def scored(recommendations):
+            return [(rec["group_buy_id"], rec["recommendation_score"], rec["participants_count"])
+                    for rec in recommendations]
+
+        assert scored(get_recommendations_for_user(trader, test_db, (active_groups, joined))) == \
+            scored(get_recommendations_for_user(trader, test_db))
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the behavioural recommendation service.
+Uses an in-memory SQLite database so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User, Product, GroupBuy
+from analytics.analytics_router import AnalyticsEvent, EventContext, process_events_batch
+from analytics.session_store import clear_session_store
+from models.analytics_models import FeatureStore
+from ml.behavioral_ml_service import (
+    BehavioralFeatureExtractor,
+    BehavioralMLService,
+    GroupFeatureIndex,
+    _init_extract_worker,
+    compute_behavioral_features,
+    clear_group_feature_index,
+    extract_behavioral_features_batch,
+    store_behavioral_features,
+)
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create an in-memory test database for each test"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    clear_group_feature_index()
+    clear_session_store()
+    yield
+    clear_group_feature_index()
+    clear_session_store()
+
+
+@pytest.fixture
+def catalogue(test_db):
+    trader = User(email="trader@example.com", hashed_password="x", full_name="Trader",
+                  location_zone="HARARE", preferred_categories=["Grains"], budget_range="low")
+    creator = User(email="admin@example.com", hashed_password="x", full_name="Admin",
+                   location_zone="HARARE", is_admin=True)
+    test_db.add_all([trader, creator])
+    test_db.commit()
+
+    specs = [
+        ("Rice", "Grains", 8.0, 10, 9),
+        ("Oil", "Cooking", 30.0, 10, 1),
+        ("Milk", "Dairy", 12.0, 10, 2),
+        ("Beans", "Legumes", 60.0, 10, 5),
+    ]
+    groups = []
+    for name, category, price, moq, quantity in specs:
+        product = Product(name=name, category=category, unit_price=price * 1.2, bulk_price=price, moq=moq)
+        test_db.add(product)
+        test_db.commit()
+        group = GroupBuy(product_id=product.id, creator_id=creator.id, location_zone="HARARE",
+                         deadline=datetime.utcnow() + timedelta(days=5), total_quantity=quantity)
+        test_db.add(group)
+        groups.append(group)
+    test_db.commit()
+    return trader, groups
+
+
+def view(event_id, user_id, product_id, category, seconds_ago, session_id="sess_1", event_type="product_view"):
+    return AnalyticsEvent(
+        event_id=event_id,
+        event_type=event_type,
+        user_id=user_id,
+        anonymous_id="anon_1",
+        session_id=session_id,
+        timestamp=datetime.utcnow() - timedelta(seconds=seconds_ago),
+        properties={"product_id": product_id, "category": category},
+        context=EventContext(url="http://localhost/groups", path="/groups", user_agent="pytest"),
+    )
+
+
+class TestEnhancedRecommendations:
+    """All groups are scored in one vectorised pass"""
+
+    def test_vectorised_content_scores_match_per_group(self, test_db, catalogue):
+        trader, groups = catalogue
+        service = BehavioralMLService(test_db)
+        profile = service.content_filter.build_user_profile_with_behavior(trader.id)
+
+        index = GroupFeatureIndex.load(test_db)
+        scores = service.content_filter.score_groups(profile, index)
+        for i, group_id in enumerate(index.group_ids):
+            group = test_db.query(GroupBuy).get(int(group_id))
+            expected = service.content_filter.calculate_content_similarity_with_behavior(profile, group)
+            assert scores[i] == pytest.approx(expected)
+
+    def test_sequence_and_session_signals_are_applied(self, test_db, catalogue):
+        trader, groups = catalogue
+        rice, oil, milk, beans = groups
+        # Other traders usually view Milk after Rice
+        peer = User(email="peer@example.com", hashed_password="x", full_name="Peer", location_zone="HARARE")
+        test_db.add(peer)
+        test_db.commit()
+        process_events_batch([
+            view("p1", peer.id, rice.product_id, "Grains", 50, session_id="peer"),
+            view("p2", peer.id, milk.product_id, "Dairy", 40, session_id="peer"),
+            view("t1", trader.id, rice.product_id, "Grains", 30),
+            view("t2", trader.id, beans.product_id, "Legumes", 20),
+        ], test_db)
+
+        recommendations = BehavioralMLService(test_db).get_enhanced_recommendations(
+            trader.id, session_id="sess_1", limit=4
+        )
+        by_id = {rec["group_buy_id"]: rec for rec in recommendations}
+
+        assert len(recommendations) == 4
+        assert "Relevant to your current search" in by_id[beans.id]["reasons"]
+        assert "Matches your interests" in by_id[rice.id]["reasons"]
+        scores = [rec["recommendation_score"] for rec in recommendations]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_group_features_are_cached(self, test_db, catalogue):
+        from ml.behavioral_ml_service import get_group_feature_index
+
+        first = get_group_feature_index(test_db)
+        assert len(first) == 4
+        assert list(first.price_band) == ["low", "medium", "low", "high"]
+        assert get_group_feature_index(test_db) is first
+
+
+class TestBatchFeatureExtraction:
+    """Bulk features match the per-user extractor"""
+
+    def test_matches_per_user_extraction(self, test_db, catalogue):
+        trader, groups = catalogue
+        rice, oil, milk, beans = groups
+        peer = User(email="peer@example.com", hashed_password="x", full_name="Peer", location_zone="HARARE")
+        idle = User(email="idle@example.com", hashed_password="x", full_name="Idle", location_zone="HARARE")
+        test_db.add_all([peer, idle])
+        test_db.commit()
+        day = 24 * 3600
+        process_events_batch([
+            view("t1", trader.id, rice.product_id, "Grains", 3 * day),
+            view("t2", trader.id, milk.product_id, "Dairy", 2 * day),
+            view("t3", trader.id, rice.product_id, "Grains", 3600, event_type="group_join_click"),
+            view("t4", trader.id, rice.product_id, "Grains", 60, event_type="group_join_complete"),
+            view("p1", peer.id, oil.product_id, "Cooking", 40 * day, session_id="peer"),
+            view("p2", peer.id, beans.product_id, "Legumes", 5 * day, session_id="peer"),
+        ], test_db)
+
+        user_ids = [trader.id, peer.id, idle.id]
+        features = extract_behavioral_features_batch(user_ids, test_db, chunk_size=2)
+        extractor = BehavioralFeatureExtractor(test_db)
+
+        assert list(features["user_id"]) == user_ids
+        for record in features.to_dict(orient="records"):
+            expected = extractor.extract_user_features(record.pop("user_id"))
+            assert record.keys() == expected.keys()
+            for name, value in expected.items():
+                assert record[name] == pytest.approx(value), name
+
+    def test_stores_features_per_user(self, test_db, catalogue):
+        trader, _ = catalogue
+        features = extract_behavioral_features_batch([trader.id], test_db)
+        assert store_behavioral_features(test_db, features) == 1
+        assert store_behavioral_features(test_db, features) == 1
+
+        record = test_db.query(FeatureStore).filter(
+            FeatureStore.feature_key == f"user:{trader.id}:behavioral_features"
+        ).one()
+        assert record.feature_value["days_since_last_event"] == 999
+
+    def test_timezone_aware_timestamps(self):
+        """Postgres returns timezone-aware timestamps; they are compared as naive UTC"""
+        import pandas as pd
+        now = datetime(2024, 3, 10, 12, 0)
+        events = pd.DataFrame([
+            {"user_id": 1, "event_type": "product_view", "product_id": 1, "group_id": None,
+             "timestamp": datetime(2024, 3, 7, 14, 0, tzinfo=timezone(timedelta(hours=2))),
+             "properties": {"category": "Grains"}},
+            {"user_id": 1, "event_type": "group_view", "product_id": None, "group_id": 4,
+             "timestamp": datetime(2024, 3, 8, 9, 0, tzinfo=timezone.utc),
+             "properties": {}},
+        ])
+        features = compute_behavioral_features(events, [1, 2], now=now).set_index("user_id")
+
+        assert features.loc[1, "days_since_last_event"] == 2
+        assert features.loc[1, "peak_activity_hour"] == 9
+        assert features.loc[1, "total_events"] == 2
+        assert features.loc[2, "days_since_last_event"] == 999
+
+        aware_now = now.replace(tzinfo=timezone.utc)
+        assert compute_behavioral_features(events, [1], now=aware_now).equals(
+            compute_behavioral_features(events, [1], now=now))
+
+    def test_pool_worker_discards_inherited_connections(self, monkeypatch):
+        from db import database
+        calls = []
+        monkeypatch.setattr(database.engine, "dispose", lambda close=True: calls.append(close))
+        _init_extract_worker()
+        assert calls == [False]
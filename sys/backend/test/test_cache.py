@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the two-tier cache (db.cache): stable keys, L1, single-flight,
+tag invalidation and the L1-only fallback when Redis is unreachable.
+Uses in-memory SQLite databases so no running server or Redis is needed.
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import subprocess
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from db.database import Base
+
+from db import cache, redis_client
+from db.cache import cached, clear_cache, invalidate_tags, stable_key
+from models.models import Product
+from models.products import list_products
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "memory")
+    clear_cache()
+    yield
+    clear_cache()
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create an in-memory test database for each test"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+    db.add_all([
+        Product(name="Rice 10kg", description="Long grain", unit_price=12.0, bulk_price=10.0, moq=10,
+                category="Grains"),
+        Product(name="Cooking oil 2L", description="Sunflower", unit_price=5.0, bulk_price=4.0, moq=12,
+                category="Oils"),
+    ])
+    db.commit()
+
+    yield db
+
+    db.close()
+    Base.metadata.drop_all(engine)
+
+
+class TestKeys:
+    def test_sessions_are_left_out(self, test_db):
+        other = sessionmaker(bind=test_db.get_bind())()
+        assert stable_key("f", {"db": test_db, "group_id": 3}) == stable_key("f", {"db": other, "group_id": 3})
+        assert stable_key("f", {"group_id": 3}) != stable_key("f", {"group_id": 4})
+
+    def test_keys_are_identical_across_processes(self):
+        script = "from db.cache import stable_key; print(stable_key('f', {'q': 'rice', 'page': 2}))"
+        keys = {
+            subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True,
+                           env={**os.environ, "PYTHONHASHSEED": seed}).stdout.strip()
+            for seed in ("1", "2")
+        }
+        assert keys == {stable_key("f", {"q": "rice", "page": 2})}
+
+    def test_unsupported_arguments_need_an_explicit_key(self):
+        @cached()
+        def f(thing):
+            return 1
+
+        with pytest.raises(TypeError):
+            f(object())
+
+
+class TestCachedDecorator:
+    def test_results_are_reused_and_json_round_tripped(self):
+        calls = []
+
+        @cached(ttl_seconds=60)
+        def f(x, db=None):
+            calls.append(x)
+            return {"x": x, "values": (1, 2)}
+
+        assert f(1, db="session-a") == {"x": 1, "values": [1, 2]}
+        assert f(1, db="session-b") == {"x": 1, "values": [1, 2]}
+        assert f(2) == {"x": 2, "values": [1, 2]}
+        assert calls == [1, 2]
+
+    def test_none_is_cached(self):
+        calls = []
+
+        @cached(key="none:{x}")
+        def f(x):
+            calls.append(x)
+
+        assert f(1) is None and f(1) is None
+        assert calls == [1]
+
+    def test_tag_invalidation(self):
+        calls = []
+
+        @cached(key="group:{group_id}:detail", tags=["group:{group_id}"])
+        def f(group_id):
+            calls.append(group_id)
+            return len(calls)
+
+        assert f(1) == 1 and f(2) == 2
+        invalidate_tags("group:1")
+        assert f(1) == 3
+        assert f(2) == 2
+
+    def test_invalidate_one_call(self):
+        calls = []
+
+        @cached()
+        def f(x):
+            calls.append(x)
+            return len(calls)
+
+        f(1)
+        f.invalidate(1)
+        assert f(1) == 2
+
+    def test_ttl_expiry(self):
+        calls = []
+
+        @cached(ttl_seconds=0.05)
+        def f():
+            calls.append(1)
+
+        f()
+        time.sleep(0.1)
+        f()
+        assert len(calls) == 2
+
+    def test_single_flight_threads(self):
+        calls = []
+
+        @cached(key="slow")
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return "done"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == ["done"] * 8
+        assert len(calls) == 1
+
+    def test_single_flight_async(self):
+        calls = []
+
+        @cached(key="slow_async")
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return {"ok": True}
+
+        async def main():
+            return await asyncio.gather(*(slow() for _ in range(8)))
+
+        assert asyncio.run(main()) == [{"ok": True}] * 8
+        assert len(calls) == 1
+
+    def test_failures_are_not_cached(self):
+        calls = []
+
+        @cached(key="flaky")
+        def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            flaky()
+        assert flaky() == "ok"
+
+
+class TestRedisFallback:
+    def test_unreachable_redis_falls_back_to_l1(self, monkeypatch):
+        monkeypatch.setattr(cache, "CACHE_BACKEND", "redis")
+        monkeypatch.setattr(redis_client, "_redis_client",
+                            redis.from_url("redis://127.0.0.1:1/0", socket_connect_timeout=0.2))
+        calls = []
+
+        @cached(key="fallback", tags=["fallback"])
+        def f():
+            calls.append(1)
+            return len(calls)
+
+        assert f() == 1
+        assert f() == 1
+        invalidate_tags("fallback")
+        assert f() == 2
+        assert cache._redis() is None  # backing off instead of retrying every call
+
+
+class TestProductCatalogCache:
+    def test_listing_is_cached_and_refreshed_on_commit(self, test_db):
+        assert [p["name"] for p in list_products(test_db, True, None)] == ["Rice 10kg", "Cooking oil 2L"]
+        assert [p["name"] for p in list_products(test_db, True, "Oils")] == ["Cooking oil 2L"]
+
+        test_db.add(Product(name="Sugar 2kg", description="White", unit_price=3.0, bulk_price=2.5, moq=20,
+                            category="Grains"))
+        test_db.commit()
+        assert len(list_products(test_db, True, None)) == 3
+
+        rice = test_db.query(Product).filter(Product.name == "Rice 10kg").first()
+        rice.is_active = False
+        test_db.commit()
+        assert [p["name"] for p in list_products(test_db, True, "Grains")] == ["Sugar 2kg"]
+
+    def test_rolled_back_changes_keep_the_cache(self, test_db):
+        list_products(test_db, True, None)
+        versions = dict(cache._local_tag_versions)
+        test_db.add(Product(name="Salt", description="Iodised", unit_price=1.0, bulk_price=0.8, moq=50))
+        test_db.flush()
+        test_db.rollback()
+        assert cache._local_tag_versions == versions
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cluster x admin-group participation index and the
+admin-group recommendations scored from it.
+Uses an in-memory SQLite database so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User, AdminGroup, AdminGroupJoin
+from ml.ml import get_admin_group_recommendations
+from ml.cluster_participation import (
+    build_cluster_participation,
+    clear_cluster_participation,
+    get_cluster_participation,
+    record_admin_group_join,
+)
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create an in-memory test database for each test"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    clear_cluster_participation()
+    yield
+    clear_cluster_participation()
+
+
+def make_user(db, i, cluster_id, categories=None):
+    user = User(
+        email=f"trader{i}@example.com",
+        hashed_password="hashed_password_123",
+        full_name=f"Trader {i}",
+        location_zone="HARARE",
+        cluster_id=cluster_id,
+        preferred_categories=categories or [],
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def make_group(db, name, category="Grains", price=10.0, original_price=11.0, days=10):
+    group = AdminGroup(
+        name=name,
+        description=f"{name} in bulk",
+        category=category,
+        price=price,
+        original_price=original_price,
+        image=f"{name}.jpg",
+        end_date=datetime.utcnow() + timedelta(days=days),
+        max_participants=50,
+        participants=0,
+    )
+    db.add(group)
+    db.commit()
+    return group
+
+
+def join(db, user, group):
+    db.add(AdminGroupJoin(admin_group_id=group.id, user_id=user.id, quantity=1,
+                          delivery_method="pickup", payment_method="cash"))
+    db.commit()
+
+
+class TestClusterParticipation:
+    """Join counts per (cluster, admin group)"""
+
+    def test_counts_joins_per_cluster(self, test_db):
+        a1, a2, b1 = make_user(test_db, 1, 0), make_user(test_db, 2, 0), make_user(test_db, 3, 1)
+        unclustered = make_user(test_db, 4, None)
+        rice, oil = make_group(test_db, "Rice"), make_group(test_db, "Oil")
+        for user, group in [(a1, rice), (a2, rice), (a2, oil), (b1, oil), (unclustered, rice)]:
+            join(test_db, user, group)
+
+        index = build_cluster_participation(test_db)
+        assert list(index.cluster_joins(0, [rice.id, oil.id, 999])) == [2, 1, 0]
+        assert list(index.cluster_joins(1, [rice.id, oil.id])) == [0, 1]
+        assert list(index.cluster_joins(None, [rice.id])) == [0]
+        assert list(index.cluster_joins(7, [rice.id])) == [0]
+
+    def test_recorded_joins_update_the_index(self, test_db):
+        member = make_user(test_db, 1, 3)
+        rice = make_group(test_db, "Rice")
+
+        index = get_cluster_participation(test_db)
+        assert list(index.cluster_joins(3, [rice.id])) == [0]
+
+        join(test_db, member, rice)
+        record_admin_group_join(test_db, member.id, rice.id)
+        assert list(get_cluster_participation(test_db).cluster_joins(3, [rice.id])) == [1]
+
+
+class TestAdminGroupRecommendations:
+    """All candidate groups are scored in one pass"""
+
+    def test_scores_use_cluster_joins_and_exclude_joined(self, test_db):
+        trader = make_user(test_db, 1, 0, categories=["grains"])
+        peers = [make_user(test_db, i, 0) for i in range(2, 5)]
+        rice = make_group(test_db, "Rice", category="Grains")
+        beans = make_group(test_db, "Beans", category="Legumes")
+        oil = make_group(test_db, "Oil", category="Cooking", price=8.0, original_price=10.0)
+        joined = make_group(test_db, "Salt", category="Grains")
+        for peer in peers:
+            join(test_db, peer, beans)
+        join(test_db, trader, joined)
+
+        recommendations = get_admin_group_recommendations(trader, [rice, beans, oil, joined], test_db)
+        by_id = {rec["group_buy_id"]: rec for rec in recommendations}
+
+        assert joined.id not in by_id
+        assert by_id[rice.id]["recommendation_score"] == pytest.approx(0.7)   # category match
+        assert by_id[beans.id]["recommendation_score"] == pytest.approx(0.65)  # 3 cluster joins
+        assert by_id[oil.id]["recommendation_score"] == pytest.approx(0.6)    # 20% savings
+        assert by_id[beans.id]["participants_count"] == 3
+        assert [rec["group_buy_id"] for rec in recommendations] == [rice.id, beans.id, oil.id]
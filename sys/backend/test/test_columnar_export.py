@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the columnar (Parquet/Arrow) analytics export.
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User, Product, Transaction
+from models import analytics_models
+from analytics import columnar_export
+
+pytestmark = pytest.mark.skipif(not columnar_export.pyarrow_available(), reason="pyarrow not installed")
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create an in-memory test database for each test"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar_export, "EXPORT_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def transactions(test_db):
+    user = User(email="trader@example.com", hashed_password="x", full_name="Trader", location_zone="HARARE")
+    product = Product(name="Tomatoes", category="Vegetables", unit_price=2.0, bulk_price=1.5, moq=10)
+    test_db.add_all([user, product])
+    test_db.commit()
+
+    now = datetime.utcnow()
+    rows = [
+        Transaction(user_id=user.id, product_id=product.id, quantity=q, amount=q * 1.5,
+                    transaction_type="upfront", created_at=now - timedelta(days=d))
+        for q, d in [(1, 2), (2, 2), (3, 1), (4, 0)]
+    ]
+    test_db.add_all(rows)
+    test_db.commit()
+    return rows
+
+
+class TestColumnarExport:
+    """Day-partitioned export and memory-mapped reads"""
+
+    def test_export_writes_day_partitions(self, test_db, export_dir, transactions):
+        assert columnar_export.export_table(test_db, "transactions") == 4
+
+        partitions = sorted(p.name for p in (export_dir / "transactions").iterdir() if p.is_dir())
+        assert len(partitions) == 3
+        assert all(name.startswith("day=") for name in partitions)
+
+        df = columnar_export.read_export("transactions")
+        assert sorted(df["quantity"].tolist()) == [1, 2, 3, 4]
+
+    def test_incremental_export_only_rewrites_recent_days(self, test_db, export_dir, transactions):
+        columnar_export.export_table(test_db, "transactions")
+
+        test_db.add(Transaction(user_id=transactions[0].user_id, product_id=transactions[0].product_id,
+                                quantity=5, amount=7.5, created_at=datetime.utcnow()))
+        test_db.commit()
+
+        # Only the last exported day (today) is re-read
+        assert columnar_export.export_table(test_db, "transactions") == 2
+        assert len(columnar_export.read_export("transactions")) == 5
+
+    def test_read_export_filters_by_day(self, test_db, export_dir, transactions):
+        columnar_export.export_table(test_db, "transactions")
+        today = datetime.utcnow().date()
+
+        df = columnar_export.read_export("transactions", start=today - timedelta(days=1), columns=["quantity"])
+        assert list(df.columns) == ["quantity"]
+        assert sorted(df["quantity"].tolist()) == [3, 4]
+
+    def test_load_table_frame_reads_export(self, test_db, export_dir, transactions, monkeypatch):
+        monkeypatch.setattr(columnar_export, "OFFLINE_DATA_SOURCE", "export")
+        df = columnar_export.load_table_frame(test_db, "transactions", columns=["user_id", "quantity"])
+        assert len(df) == 4
+        assert (export_dir / "transactions" / columnar_export.MANIFEST_FILE).exists()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batched recommendation explanation pipeline.
+Uses an in-memory SQLite database so no running server is needed.
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User, Product, GroupBuy, Transaction, Contribution
+import ml.ml as ml_module
+from ml.cluster_profiles import build_cluster_profiles
+from ml.explainability import (
+    clear_cluster_explanations,
+    explain_cluster_assignment,
+    explain_cluster_from_profile,
+    explain_recommendation,
+    explain_recommendations,
+    get_cluster_explanation,
+)
+
+
+@pytest.fixture(scope="function")
+def engine():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture(scope="function")
+def test_db(engine):
+    """Create an in-memory test database for each test"""
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture(autouse=True)
+def model_version(monkeypatch):
+    clear_cluster_explanations()
+    monkeypatch.setattr(ml_module, "feature_store", {"model_version": "v1"})
+    yield
+    clear_cluster_explanations()
+
+
+@pytest.fixture
+def ranked(test_db):
+    trader = User(email="trader@example.com", hashed_password="x", full_name="Trader",
+                  location_zone="HARARE", cluster_id=1, budget_range="low")
+    peers = [User(email=f"peer{i}@example.com", hashed_password="x", full_name=f"Peer {i}",
+                  location_zone="HARARE", cluster_id=1, budget_range="low") for i in range(3)]
+    creator = User(email="admin@example.com", hashed_password="x", full_name="Admin",
+                   location_zone="HARARE", is_admin=True)
+    test_db.add_all([trader, creator] + peers)
+    test_db.commit()
+
+    groups = []
+    for i, name in enumerate(["Rice", "Oil", "Milk", "Beans"]):
+        product = Product(name=name, category="Grains", unit_price=10.0, bulk_price=7.0, moq=10)
+        test_db.add(product)
+        test_db.commit()
+        group = GroupBuy(product_id=product.id, creator_id=creator.id, location_zone="HARARE",
+                         deadline=datetime.utcnow() + timedelta(days=2 + i), total_quantity=8)
+        test_db.add(group)
+        groups.append(group)
+    test_db.commit()
+    test_db.add_all([
+        Transaction(user_id=trader.id, group_buy_id=groups[0].id, product_id=groups[0].product_id,
+                    quantity=1, amount=7.0, transaction_type="upfront", location_zone="HARARE")
+        for _ in range(2)
+    ] + [
+        Contribution(group_buy_id=groups[1].id, user_id=peer.id, quantity=1, contribution_amount=7.0)
+        for peer in peers
+    ])
+    test_db.commit()
+
+    recommendations = [
+        {"group_buy_id": g.id, "ml_scores": {"collaborative_filtering": 0.8 - 0.1 * i, "content_based": 0.6,
+                                             "popularity": 0.4, "hybrid": 0.7}}
+        for i, g in enumerate(groups)
+    ]
+    return trader, groups, recommendations
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def summary(explanation):
+    return (
+        explanation["recommendation_id"],
+        [factor["factor"] for factor in explanation["factors"]],
+        {name: part["contribution"] for name, part in explanation["component_contributions"].items()},
+        explanation["confidence"],
+        explanation["transparency_score"],
+    )
+
+
+class TestExplainRecommendations:
+    """Explanations reuse the ranking pass and batch their lookups"""
+
+    def test_matches_per_group_explanations(self, test_db, ranked):
+        trader, groups, recommendations = ranked
+        batched = explain_recommendations(trader, recommendations, test_db)
+        single = [explain_recommendation(trader, g, rec["ml_scores"], test_db)
+                  for g, rec in zip(groups, recommendations)]
+
+        assert [summary(e) for e in batched] == [summary(e) for e in single]
+        assert "purchase_history" in summary(batched[0])[1]
+
+    def test_lookups_are_batched(self, engine, test_db, ranked):
+        trader, _, recommendations = ranked
+        trader_id = trader.id
+        test_db.expunge_all()
+        trader = test_db.get(User, trader_id)
+
+        statements = count_queries(engine)
+        explanations = explain_recommendations(trader, recommendations, test_db)
+
+        assert len(explanations) == 4
+        # group-buys + products (joined), contributions (selectin), purchase counts
+        assert len(statements) == 3
+
+    def test_loaded_group_buys_are_reused(self, engine, test_db, ranked):
+        trader, groups, recommendations = ranked
+        trader.cluster_id
+        for group in groups:
+            group.participants_count, group.product.name
+
+        statements = count_queries(engine)
+        explain_recommendations(trader, recommendations, test_db)
+        assert len(statements) == 1
+
+
+class TestClusterExplanationCache:
+    """Cluster explanations are cached per model version"""
+
+    def test_cached_until_model_changes(self, engine, test_db, ranked, monkeypatch):
+        trader, _, _ = ranked
+        first = get_cluster_explanation(trader, test_db)
+        assert first["cluster_size"] == 4
+
+        statements = count_queries(engine)
+        second = get_cluster_explanation(trader, test_db)
+        assert second == first and second is not first
+        assert statements == []
+
+        # Callers get copies, so mutating one does not change the cache
+        second["factors"].append({"factor": "mutated"})
+        assert get_cluster_explanation(trader, test_db) == first
+
+        monkeypatch.setattr(ml_module, "feature_store", {"model_version": "v2"})
+        get_cluster_explanation(trader, test_db)
+        assert len(statements) == 1
+
+    def test_profile_update_is_explained_afresh(self, test_db, ranked):
+        trader, _, _ = ranked
+        before = get_cluster_explanation(trader, test_db)
+        trader.location_zone = "MUTARE"
+        trader.budget_range = "high"
+        after = get_cluster_explanation(trader, test_db)
+
+        assert after != before
+        descriptions = " ".join(f["description"] for f in after["factors"])
+        assert "HARARE" not in descriptions
+
+
+class TestClusterProfiles:
+    """Cluster endpoints are served from the training-time snapshot"""
+
+    @pytest.fixture
+    def profiles(self, ranked):
+        trader, groups, _ = ranked
+        users = [trader] + [
+            User(id=100 + i, location_zone=zone, budget_range=budget, preferred_categories=cats)
+            for i, (zone, budget, cats) in enumerate([
+                ("HARARE", "low", ["Grains"]), ("HARARE", "low", ["Grains", "Dairy"]),
+                ("MUTARE", "high", ["Dairy"]), ("MUTARE", "high", []),
+            ])
+        ]
+        trader.preferred_categories = ["Grains"]
+        products = [Product(id=1, name="Rice", category="Grains"), Product(id=2, name="Milk", category="Dairy")]
+        purchases = np.array([[4, 0], [2, 1], [3, 0], [0, 5], [0, 2]], dtype=float)
+        labels = [0, 0, 0, 1, 1]
+        distances = np.array([[0.2, 3], [0.5, 3], [0.1, 3], [3, 0.4], [3, 0.3]])
+        transactions = pd.DataFrame({
+            "user_id": [trader.id, 100, 102, 103],
+            "quantity": [4, 3, 5, 2],
+            "amount": [40.0, 30.0, 50.0, 20.0],
+            "location_zone": ["HARARE", "HARARE", "MUTARE", "MUTARE"],
+        })
+        return trader, build_cluster_profiles(users, labels, purchases, products, transactions, distances)
+
+    def test_profiles_summarise_each_cluster(self, profiles):
+        trader, (first, second) = profiles
+        assert first["size"] == 3 and second["size"] == 2
+        assert first["avg_quantity"] == pytest.approx(3.5)
+        assert first["dominant_location"] == "HARARE"
+        assert first["top_categories"] == ["Grains", "Dairy"]
+        assert [p["name"] for p in first["typical_products"]] == ["Rice", "Milk"]
+        assert [t["id"] for t in first["representative_traders"]] == [101, trader.id, 100]
+        assert first["budget_counts"] == {"low": 3}
+        assert first["member_ids"] == sorted([trader.id, 100, 101])
+        assert first["preferred_category_members"] == {"Dairy": [101], "Grains": sorted([trader.id, 100, 101])}
+
+    def test_explanation_and_clusters_use_no_queries(self, engine, test_db, profiles, monkeypatch):
+        trader, cluster_profiles = profiles
+        trader.cluster_id = 0
+        monkeypatch.setattr(ml_module, "feature_store", {"model_version": "v1", "cluster_profiles": cluster_profiles})
+
+        statements = count_queries(engine)
+        explanation = explain_cluster_assignment(trader, test_db)
+        clusters = asyncio.run(ml_module.get_clusters(admin=None, db=test_db))
+
+        assert statements == []
+        assert explanation["cluster_size"] == 3
+        assert {f["factor"] for f in explanation["factors"]} == {"location", "preferences", "budget"}
+        assert trader.id not in [t["id"] for t in explanation["similar_traders"]]
+        assert [(c.cluster_id, c.size, c.dominant_location) for c in clusters] == [(0, 3, "HARARE"), (1, 2, "MUTARE")]
+
+    def test_profile_explanation_counts_other_traders(self):
+        profile = {
+            "size": 5, "member_ids": [1, 2, 3, 4, 5],
+            "location_counts": {"HARARE": 2, "MUTARE": 3}, "budget_counts": {"low": 5},
+            "preferred_category_members": {"Grains": [1, 2], "Dairy": [3, 4]},
+            "representative_traders": [], "top_categories": [], "typical_products": [],
+        }
+        descriptions = lambda explanation: {f["factor"]: f["description"] for f in explanation["factors"]}
+
+        # Not clustered at training time: every counted trader is someone else
+        newcomer = User(id=9, cluster_id=0, location_zone="HARARE", budget_range="low",
+                        preferred_categories=["Grains", "Dairy"])
+        explanation = explain_cluster_from_profile(newcomer, profile)
+        assert explanation["cluster_size"] == 6
+        assert descriptions(explanation) == {
+            "location": "2/5 traders in your cluster are from HARARE",
+            "preferences": "You share product preferences with 4/5 traders in your cluster",
+            "budget": "5/5 traders in your cluster have a similar 'low' budget range",
+        }
+
+        member = User(id=1, cluster_id=0, location_zone="HARARE", budget_range="low",
+                      preferred_categories=["Grains", "Dairy"])
+        explanation = explain_cluster_from_profile(member, profile)
+        assert explanation["cluster_size"] == 5
+        assert descriptions(explanation) == {
+            "preferences": "You share product preferences with 3/4 traders in your cluster",
+            "budget": "4/4 traders in your cluster have a similar 'low' budget range",
+        }
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cached LIME explainer.
+Uses an in-memory SQLite database so no running server is needed.
+"""
+
+import pytest
+import time
+import sys
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User, Product, GroupBuy, Transaction
+import ml.ml as ml_module
+from ml import lime_explainer
+from ml.lime_explainer import clear_lime_explainer, explain_with_lime, get_lime_explainer
+
+
+@pytest.fixture(scope="function")
+def engine():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture(scope="function")
+def test_db(engine):
+    """Create an in-memory test database for each test"""
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture(autouse=True)
+def model_version(monkeypatch):
+    clear_lime_explainer()
+    monkeypatch.setattr(ml_module, "feature_store", {"model_version": "v1"})
+    yield
+    clear_lime_explainer()
+
+
+@pytest.fixture
+def catalogue(test_db):
+    traders = [
+        User(email=f"trader{i}@example.com", hashed_password="x", full_name=f"Trader {i}",
+             location_zone=zone, budget_range=budget, experience_level="intermediate",
+             participation_frequency="regular")
+        for i, (zone, budget) in enumerate([("HARARE", "low"), ("BULAWAYO", "medium"), ("MUTARE", "high")])
+    ]
+    creator = User(email="admin@example.com", hashed_password="x", full_name="Admin",
+                   location_zone="HARARE", is_admin=True)
+    test_db.add_all(traders + [creator])
+    test_db.commit()
+
+    products = [Product(name=name, category=category, unit_price=10.0, bulk_price=8.0, moq=10)
+                for name, category in [("Rice", "Grains"), ("Oil", "Cooking"), ("Milk", "Dairy")]]
+    test_db.add_all(products)
+    test_db.commit()
+    group = GroupBuy(product_id=products[0].id, creator_id=creator.id, location_zone="HARARE",
+                     deadline=datetime.utcnow() + timedelta(days=5))
+    test_db.add(group)
+    test_db.add(Transaction(user_id=traders[0].id, group_buy_id=1, product_id=products[0].id,
+                            quantity=2, amount=16.0, transaction_type="upfront", location_zone="HARARE"))
+    test_db.commit()
+    return traders, products, group
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+class TestLimeExplainerCache:
+    """The explainer is built once per model version and explanations are memoised"""
+
+    def test_training_data_uses_grouped_queries(self, engine, test_db, catalogue):
+        statements = count_queries(engine)
+        explainer = get_lime_explainer(test_db)
+
+        assert explainer.is_initialized
+        assert explainer.locations == ["BULAWAYO", "HARARE", "MUTARE"]
+        assert explainer.product_categories == ["Cooking", "Dairy", "Grains"]
+        assert len(statements) <= 5
+
+    def test_explainer_is_rebuilt_only_on_model_change(self, test_db, catalogue, monkeypatch):
+        first = get_lime_explainer(test_db)
+        assert get_lime_explainer(test_db) is first
+
+        monkeypatch.setattr(ml_module, "feature_store", {"model_version": "v2"})
+        assert get_lime_explainer(test_db) is not first
+
+    def test_explanations_are_memoised(self, test_db, catalogue, monkeypatch):
+        traders, _, group = catalogue
+        calls = []
+        explainer = get_lime_explainer(test_db)
+        original = explainer.explainer.explain_instance
+        monkeypatch.setattr(explainer.explainer, "explain_instance",
+                            lambda *args, **kwargs: calls.append(1) or original(*args, **kwargs))
+
+        first = explain_with_lime(traders[0], group, test_db)
+        second = explain_with_lime(traders[0], group, test_db)
+        assert "error" not in first
+        assert second == first
+        assert len(calls) == 1
+
+        # A changed profile changes the feature vector, so it is explained again
+        traders[0].budget_range = "high"
+        explain_with_lime(traders[0], group, test_db)
+        assert len(calls) == 2
+
+    def test_cache_is_bounded(self, test_db, catalogue, monkeypatch):
+        traders, _, group = catalogue
+        monkeypatch.setattr(lime_explainer, "LIME_CACHE_SIZE", 2)
+        for trader in traders:
+            explain_with_lime(trader, group, test_db)
+        cached = get_lime_explainer(test_db)._explanations
+        assert list(cached) == [(traders[1].id, group.id), (traders[2].id, group.id)]
+
+
+class TestLimeSampling:
+    """Sample budget, vectorised scoring and chunked runs"""
+
+    def test_predict_fn_scores_matrix_at_once(self):
+        predict_fn = lime_explainer.build_predict_fn(n_categories=2)
+        X = np.zeros((3, 9 + 2 + 1))
+        X[1, 0] = 1       # medium budget
+        X[2, [0, 10, 11]] = 1  # medium budget, category and location match
+
+        scores = predict_fn(X)
+        base = 0.6 * 0.4 + 0.3 * 0.4 + 0.1 * 0.2
+        medium = base + 0.6 * 0.3 + 0.3 * 0.2
+        matched = medium + 0.3 * 0.6 + 0.6 * 0.2
+        expected = 1 / (1 + np.exp(-np.array([base, medium, matched])))
+        assert scores.shape == (3, 2)
+        assert scores[:, 1] == pytest.approx(expected)
+        assert scores.sum(axis=1) == pytest.approx(np.ones(3))
+
+    def test_budget_is_honoured_and_memoised(self, test_db, catalogue):
+        traders, _, group = catalogue
+        small = explain_with_lime(traders[0], group, test_db, num_samples=200)
+        assert small["num_samples"] == 200
+
+        # A larger budget is not served from the smaller cached explanation
+        large = explain_with_lime(traders[0], group, test_db, num_samples=400)
+        assert large["num_samples"] == 400
+        assert explain_with_lime(traders[0], group, test_db, num_samples=300) == large
+
+    def test_parallel_chunks_cover_the_budget(self, test_db, catalogue, monkeypatch):
+        traders, _, group = catalogue
+        monkeypatch.setattr(lime_explainer, "LIME_WORKERS", 2)
+        result = explain_with_lime(traders[1], group, test_db, num_samples=400)
+
+        assert "error" not in result
+        assert result["num_samples"] == 400
+        assert len(result["feature_importances"]) <= 10
+
+    def test_deadline_returns_partial_explanation(self, test_db, catalogue, monkeypatch):
+        traders, _, group = catalogue
+        explainer = get_lime_explainer(test_db)
+        run_chunk = explainer._explain_chunk
+
+        def slow_after_first(data_row, predict_fn, num_samples, seed, stop):
+            if seed > 0:
+                time.sleep(0.5)
+            return run_chunk(data_row, predict_fn, num_samples, seed, stop)
+
+        monkeypatch.setattr(explainer, "_explain_chunk", slow_after_first)
+        result = explain_with_lime(traders[2], group, test_db, num_samples=400, deadline_seconds=0.2)
+
+        assert result["requested_samples"] == 400
+        assert result["num_samples"] == 100
+        assert (traders[2].id, group.id) not in explainer._explanations
+
+    def test_abandoned_chunks_stop_after_the_deadline(self, test_db, catalogue, monkeypatch):
+        traders, _, group = catalogue
+        monkeypatch.setattr(lime_explainer, "LIME_WORKERS", 4)
+        explainer = get_lime_explainer(test_db)
+        run_chunk = explainer._explain_chunk
+        scored, abandoned = [], []
+
+        def slow_after_first(data_row, predict_fn, num_samples, seed, stop):
+            def predict(X):
+                scored.append(seed)
+                return predict_fn(X)
+            if seed > 0:
+                time.sleep(0.3)
+            try:
+                return run_chunk(data_row, predict, num_samples, seed, stop)
+            except lime_explainer.ChunkAbandoned:
+                abandoned.append(seed)
+                raise
+
+        monkeypatch.setattr(explainer, "_explain_chunk", slow_after_first)
+        result = explain_with_lime(traders[2], group, test_db, num_samples=400, deadline_seconds=0.1)
+        time.sleep(0.5)
+
+        assert result["num_samples"] == 100
+        # The late chunks gave up instead of scoring their samples
+        assert scored == [0]
+        assert sorted(abandoned) == [1, 2, 3]
+
+
+class TestLimeRoute:
+    """Budgets above LIME_NUM_SAMPLES are admin-only"""
+
+    @pytest.fixture
+    def engine(self):
+        # The app runs on another thread than the test, so share one connection
+        from sqlalchemy.pool import StaticPool
+        engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False},
+                               poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        return engine
+
+    @pytest.fixture
+    def client(self, test_db, catalogue):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from authentication.auth import verify_token
+        from db.database import get_db
+
+        app = FastAPI()
+        app.include_router(ml_module.router, prefix="/api/ml")
+        app.dependency_overrides[get_db] = lambda: test_db
+
+        def as_user(user):
+            app.dependency_overrides[verify_token] = lambda: user
+            return TestClient(app)
+        return as_user
+
+    def test_trader_is_limited_to_the_default_budget(self, client, catalogue):
+        traders, _, group = catalogue
+        trader = client(traders[0])
+        url = f"/api/ml/explain/lime/{group.id}"
+
+        response = trader.get(url, params={"num_samples": lime_explainer.LIME_NUM_SAMPLES + 1})
+        assert response.status_code == 403
+        response = trader.get(url, params={"num_samples": 200})
+        assert response.status_code == 200
+        assert response.json()["num_samples"] == 200
+
+    def test_admin_may_raise_the_budget(self, client, catalogue, test_db):
+        _, _, group = catalogue
+        admin = test_db.query(User).filter(User.is_admin).one()
+        num_samples = lime_explainer.LIME_NUM_SAMPLES + 200
+        response = client(admin).get(f"/api/ml/explain/lime/{group.id}", params={"num_samples": num_samples})
+        assert response.status_code == 200
+        assert response.json()["num_samples"] == num_samples
+
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Prometheus /metrics exporter.
+Uses an in-memory SQLite engine and a small FastAPI app, so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from monitoring import metrics
+from monitoring.metrics import (
+    TrainingStageTimer, record_cache, track_request_metrics, watch_pool, watch_websocket_manager,
+)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.middleware("http")(track_request_metrics)
+    app.include_router(metrics.router)
+
+    @app.get("/groups/{group_id}")
+    def group(group_id: int):
+        return {"id": group_id}
+
+    return app
+
+
+class TestRequestMetrics:
+    def test_latency_is_labelled_by_route_template(self, app):
+        client = TestClient(app)
+        before = sample("http_request_duration_seconds_count", method="GET", route="/groups/{group_id}", status="200")
+        client.get("/groups/1")
+        client.get("/groups/2")
+        after = sample("http_request_duration_seconds_count", method="GET", route="/groups/{group_id}", status="200")
+        assert after - before == 2
+        assert sample("http_requests_in_progress", method="GET", route="/groups/{group_id}") == 0
+
+    def test_unknown_paths_share_one_label(self, app):
+        client = TestClient(app)
+        before = sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404")
+        client.get("/nope/1")
+        client.get("/nope/2")
+        assert sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") - before == 2
+
+    def test_metrics_endpoint_serves_text_format(self, app):
+        client = TestClient(app)
+        record_cache("test_cache", True)
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'cache_requests_total{cache="test_cache",result="hit"}' in response.text
+        assert "http_request_duration_seconds_bucket" in response.text
+
+
+class TestStateMetrics:
+    def test_cache_hits_and_misses(self):
+        before_hit = sample("cache_requests_total", cache="ratio_cache", result="hit")
+        before_miss = sample("cache_requests_total", cache="ratio_cache", result="miss")
+        record_cache("ratio_cache", True)
+        record_cache("ratio_cache", True)
+        record_cache("ratio_cache", False)
+        assert sample("cache_requests_total", cache="ratio_cache", result="hit") - before_hit == 2
+        assert sample("cache_requests_total", cache="ratio_cache", result="miss") - before_miss == 1
+
+    def test_websocket_connections_read_at_scrape(self):
+        connections = {1: ["a", "b"], 2: ["c"]}
+        watch_websocket_manager("test_ws", lambda: sum(len(c) for c in connections.values()))
+        assert sample("websocket_connections", manager="test_ws") == 3
+        connections[3] = ["d"]
+        assert sample("websocket_connections", manager="test_ws") == 4
+
+    def test_pool_checkouts_and_usage(self):
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2, max_overflow=1)
+        watch_pool("test_pool", engine)
+        watch_pool("test_pool", engine)  # idempotent: checkouts are not timed twice
+        before = sample("db_pool_checkout_seconds_count", pool="test_pool")
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            assert sample("db_pool_connections", pool="test_pool", state="checked_out") == 1
+        assert sample("db_pool_checkout_seconds_count", pool="test_pool") - before == 1
+        assert sample("db_pool_connections", pool="test_pool", state="size") == 2
+        assert sample("db_pool_connections", pool="test_pool", state="checked_out") == 0
+
+    def test_pool_without_usage_counters(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        watch_pool("test_static_pool", engine)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        assert sample("db_pool_checkout_seconds_count", pool="test_static_pool") >= 1
+
+    def test_training_stage_timer(self):
+        timer = TrainingStageTimer()
+        timer.start("test_stage_a")
+        time.sleep(0.01)
+        timer.start("test_stage_b")
+        timer.finish()
+        assert sample("training_stage_duration_seconds", stage="test_stage_a") >= 0.01
+        assert sample("training_stage_duration_seconds", stage="test_stage_b") >= 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
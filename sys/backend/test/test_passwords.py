@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Unit tests for off-loop password hashing and rehash on login.
+Uses an in-memory SQLite database so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User
+from authentication import auth, passwords
+from authentication.login_benchmark import run_login_benchmark
+from authentication.principal_cache import clear_principal_cache
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create an in-memory test database for each test"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+    clear_principal_cache()
+
+
+@pytest.fixture(autouse=True)
+def cheap_cost(monkeypatch):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 5)
+
+
+def make_user(db, hashed):
+    user = User(email="trader@example.com", hashed_password=hashed, full_name="Trader",
+                location_zone="HARARE", email_verified=True)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def login(db, password):
+    return asyncio.run(auth.login(auth.UserLogin(email="trader@example.com", password=password), db))
+
+
+class TestPasswordHashing:
+    """bcrypt runs in the password pool at the configured cost"""
+
+    def test_async_hash_and_verify(self):
+        hashed = asyncio.run(passwords.hash_password_async("Secret123"))
+        assert passwords.hash_rounds(hashed) == 5
+        assert asyncio.run(passwords.verify_password_async("Secret123", hashed))
+        assert not asyncio.run(passwords.verify_password_async("Wrong123", hashed))
+        assert not passwords.verify_password("Secret123", "not-a-bcrypt-hash")
+
+    def test_login_upgrades_cheaper_hashes(self, test_db):
+        user = make_user(test_db, passwords.hash_password("Secret123", rounds=4))
+
+        with pytest.raises(HTTPException):
+            login(test_db, "Wrong123")
+        assert passwords.hash_rounds(user.hashed_password) == 4
+
+        assert login(test_db, "Secret123").user_id == user.id
+        test_db.refresh(user)
+        assert passwords.hash_rounds(user.hashed_password) == 5
+        assert passwords.verify_password("Secret123", user.hashed_password)
+
+    def test_current_hashes_are_left_alone(self, test_db):
+        hashed = passwords.hash_password("Secret123")
+        user = make_user(test_db, hashed)
+        login(test_db, "Secret123")
+        test_db.refresh(user)
+        assert user.hashed_password == hashed
+
+
+class TestLoginBenchmark:
+    def test_reports_throughput(self):
+        result = run_login_benchmark(logins=6, concurrency=3, users=2, rounds=4)
+        assert result["logins"] == 6
+        assert result["logins_per_second"] > 0
+        assert result["p95_ms"] >= result["p50_ms"] > 0
+        assert passwords.BCRYPT_ROUNDS == 5
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the authenticated-principal cache behind verify_token.
+Uses an in-memory SQLite database so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User
+from authentication.auth import (
+    create_access_token,
+    hash_password,
+    verify_admin,
+    verify_password,
+    verify_token,
+    verify_token_string,
+)
+from authentication.principal_cache import clear_principal_cache, invalidate_all_principals
+
+
+@pytest.fixture(scope="function")
+def engine():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture(scope="function")
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_principal_cache()
+    yield
+    clear_principal_cache()
+
+
+@pytest.fixture
+def trader(session_factory):
+    db = session_factory()
+    user = User(email="trader@example.com", hashed_password=hash_password("Secret123"),
+                full_name="Trader", location_zone="HARARE", preferred_categories=["Grains"])
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+
+def credentials(user_id):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"user_id": user_id}))
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+class TestPrincipalCache:
+    """verify_token skips the users lookup for cached principals"""
+
+    def test_cached_principal_needs_no_query(self, engine, session_factory, trader):
+        verify_token(credentials(trader), session_factory())
+
+        statements = count_queries(engine)
+        db = session_factory()
+        user = verify_token(credentials(trader), db)
+        assert statements == []
+        assert user in db
+        assert (user.id, user.email, user.preferred_categories) == (trader, "trader@example.com", ["Grains"])
+        assert verify_token_string(create_access_token({"user_id": trader}), db) is user
+
+    def test_password_hash_is_loaded_on_demand(self, engine, session_factory, trader):
+        verify_token(credentials(trader), session_factory())
+        user = verify_token(credentials(trader), session_factory())
+
+        statements = count_queries(engine)
+        assert verify_password("Secret123", user.hashed_password)
+        assert len(statements) == 1
+
+    def test_secrets_are_not_cached(self, engine, session_factory, trader):
+        from authentication import principal_cache
+        db = session_factory()
+        user = db.get(User, trader)
+        user.password_reset_token = "reset-token"
+        user.bank_account_number = "1234567890"
+        db.commit()
+        db.close()
+
+        verify_token(credentials(trader), session_factory())
+        (_, values, _), = principal_cache._entries.values()
+        assert not set(values) & {"hashed_password", "password_reset_token", "bank_account_number", "tax_id"}
+
+        user = verify_token(credentials(trader), session_factory())
+        statements = count_queries(engine)
+        assert (user.password_reset_token, user.bank_account_number) == ("reset-token", "1234567890")
+        assert len(statements) == 1
+
+    def test_changes_through_cached_principal_are_saved_and_invalidate(self, session_factory, trader):
+        verify_token(credentials(trader), session_factory())
+        db = session_factory()
+        user = verify_token(credentials(trader), db)
+        user.location_zone = "MUTARE"
+        user.hashed_password = hash_password("Changed123")
+        db.commit()
+
+        fresh = verify_token(credentials(trader), session_factory())
+        assert fresh.location_zone == "MUTARE"
+        assert verify_password("Changed123", fresh.hashed_password)
+
+    def test_role_toggle_invalidates(self, session_factory, trader):
+        with pytest.raises(HTTPException):
+            verify_admin(verify_token(credentials(trader), session_factory()))
+
+        db = session_factory()
+        db.get(User, trader).is_admin = True
+        db.commit()
+
+        assert verify_admin(verify_token(credentials(trader), session_factory())).is_admin
+
+    def test_rolled_back_changes_keep_cache(self, engine, session_factory, trader):
+        verify_token(credentials(trader), session_factory())
+        db = session_factory()
+        db.get(User, trader).full_name = "Renamed"
+        db.flush()
+        db.rollback()
+
+        statements = count_queries(engine)
+        assert verify_token(credentials(trader), session_factory()).full_name == "Trader"
+        assert statements == []
+
+    def test_deleted_account_is_rejected(self, session_factory, trader):
+        verify_token(credentials(trader), session_factory())
+        db = session_factory()
+        db.delete(db.get(User, trader))
+        db.commit()
+
+        with pytest.raises(HTTPException) as exc:
+            verify_token(credentials(trader), session_factory())
+        assert exc.value.status_code == 401
+
+    def test_invalidate_all(self, engine, session_factory, trader):
+        verify_token(credentials(trader), session_factory())
+        invalidate_all_principals()
+
+        statements = count_queries(engine)
+        verify_token(credentials(trader), session_factory())
+        assert len(statements) == 1
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the on-demand request profiler and its admin endpoints.
+Profiles are written to a temporary directory; no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from monitoring import profiler
+from monitoring.profiler import RequestProfilerMiddleware, list_profiles, load_profile, to_collapsed
+from models.admin import router as admin_router
+from authentication.auth import verify_admin
+
+ADMIN = {"Authorization": "Bearer admin-token"}
+TRADER = {"Authorization": "Bearer trader-token"}
+
+
+def crunch(seconds):
+    ends = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < ends:
+        total += 1
+    return total
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiler, "PROFILE_INTERVAL_MS", 1.0)
+    monkeypatch.setattr(profiler, "is_admin_token", lambda token: token == "admin-token")
+
+    app = FastAPI()
+    app.add_middleware(RequestProfilerMiddleware)
+    app.include_router(admin_router, prefix="/api/admin")
+    app.dependency_overrides[verify_admin] = lambda: object()
+
+    @app.get("/api/slow")
+    async def slow():
+        crunch(0.05)
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    return app
+
+
+class TestRequestProfiler:
+    def test_admin_header_profiles_request(self, app):
+        client = TestClient(app)
+        response = client.get("/api/slow", headers={**ADMIN, "X-Profile": "1"})
+        assert response.status_code == 200
+        profile_id = response.headers["X-Profile-Id"]
+
+        profile = load_profile(profile_id)
+        assert profile["meta"]["path"] == "/api/slow"
+        assert profile["meta"]["trigger"] == "admin"
+        assert profile["meta"]["status"] == 200
+        names = [frame["name"] for frame in profile["shared"]["frames"]]
+        # CPU time in the route and time parked in an await are both recorded
+        assert any(name.startswith("crunch ") for name in names)
+        assert profiler.AWAIT_FRAME in names
+        assert profile["profiles"][0]["endValue"] > 50
+
+    def test_query_flag_profiles_request(self, app):
+        response = TestClient(app).get("/api/slow?profile=1", headers=ADMIN)
+        assert "X-Profile-Id" in response.headers
+
+    def test_non_admins_are_not_profiled(self, app):
+        client = TestClient(app)
+        assert "X-Profile-Id" not in client.get("/api/slow", headers={**TRADER, "X-Profile": "1"}).headers
+        assert "X-Profile-Id" not in client.get("/api/slow", headers={"X-Profile": "1"}).headers
+        assert "X-Profile-Id" not in client.get("/api/slow", headers=ADMIN).headers
+        assert list_profiles() == []
+
+    def test_sampled_requests(self, app, monkeypatch):
+        monkeypatch.setattr(profiler, "PROFILE_SAMPLE_RATE", 1.0)
+        monkeypatch.setattr(profiler, "PROFILE_SAMPLE_PATHS", ["/api/slow"])
+        response = TestClient(app).get("/api/slow")
+        assert load_profile(response.headers["X-Profile-Id"])["meta"]["trigger"] == "sampled"
+
+    def test_ring_keeps_newest_profiles(self, app, monkeypatch):
+        monkeypatch.setattr(profiler, "PROFILE_MAX_FILES", 2)
+        client = TestClient(app)
+        ids = [client.get("/api/slow", headers={**ADMIN, "X-Profile": "1"}).headers["X-Profile-Id"]
+               for _ in range(3)]
+        assert [p["id"] for p in list_profiles()] == [ids[2], ids[1]]
+        assert load_profile(ids[0]) is None
+
+    def test_collapsed_stacks(self):
+        profile = profiler.to_speedscope({("a", "b"): 12.4, ("a",): 0.2}, "GET /x", {})
+        assert to_collapsed(profile) == "a;b 12\na 1\n"
+
+
+class TestProfileEndpoints:
+    def test_list_and_download(self, app):
+        client = TestClient(app)
+        profile_id = client.get("/api/slow", headers={**ADMIN, "X-Profile": "1"}).headers["X-Profile-Id"]
+
+        listed = client.get("/api/admin/profiles").json()["profiles"]
+        assert listed[0]["id"] == profile_id
+        assert listed[0]["path"] == "/api/slow"
+
+        speedscope = client.get(f"/api/admin/profiles/{profile_id}")
+        assert speedscope.status_code == 200
+        assert speedscope.json()["profiles"][0]["type"] == "sampled"
+
+        collapsed = client.get(f"/api/admin/profiles/{profile_id}?format=collapsed")
+        assert collapsed.status_code == 200
+        assert "crunch " in collapsed.text
+
+    def test_unknown_or_invalid_profile(self, app):
+        client = TestClient(app)
+        assert client.get("/api/admin/profiles/123-abcdefabcdef").status_code == 404
+        assert client.get("/api/admin/profiles/..%2F..%2Fetc%2Fpasswd").status_code == 404
+        assert client.get("/api/admin/profiles/123-abcdefabcdef?format=svg").status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Unit tests for per-request/per-job SQL instrumentation and N+1 detection.
+Uses in-memory SQLite databases so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from db.database import Base
+
+from models.models import User
+from db import query_stats
+from db.query_stats import clear_query_stats, route_query_stats, track_queries, track_request_queries
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create an in-memory test database for each test"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+    db.add_all([User(email=f"trader{i}@example.com", hashed_password="x", full_name=f"Trader {i}",
+                     location_zone="HARARE") for i in range(5)])
+    db.commit()
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(query_stats, "N_PLUS_ONE_THRESHOLD", 3)
+    clear_query_stats()
+    yield
+    clear_query_stats()
+
+
+def lookup_each(db, user_ids):
+    return [db.query(User).filter(User.id == user_id).first() for user_id in user_ids]
+
+
+class TestQueryTracking:
+    """Queries are attributed to the current request or job"""
+
+    def test_counts_queries_in_block_only(self, test_db):
+        with track_queries("job:lookup") as stats:
+            lookup_each(test_db, [1, 2])
+        lookup_each(test_db, [3])
+
+        assert stats.count == 2
+        assert stats.seconds > 0
+        assert route_query_stats()[0]["label"] == "job:lookup"
+
+    def test_flags_repeated_statement_shapes(self, test_db, caplog):
+        with caplog.at_level(logging.WARNING, logger="db.query_stats"):
+            with track_queries("job:n_plus_one") as stats:
+                lookup_each(test_db, [1, 2, 3, 4, 5])
+            with track_queries("job:batched") as batched:
+                test_db.query(User).filter(User.id.in_([1, 2, 3, 4, 5])).all()
+
+        assert len(stats.n_plus_one) == 1
+        assert not batched.n_plus_one
+        assert sum("Possible N+1 in job:n_plus_one" in r.message for r in caplog.records) == 1
+        assert [row["label"] for row in route_query_stats(sort_by="n_plus_one", limit=1)] == ["job:n_plus_one"]
+
+    def test_logs_slow_queries(self, test_db, caplog, monkeypatch):
+        monkeypatch.setattr(query_stats, "SLOW_QUERY_MS", 0)
+        with caplog.at_level(logging.WARNING, logger="db.query_stats"):
+            with track_queries("job:slow"):
+                lookup_each(test_db, [1])
+        assert any("Slow query in job:slow" in r.message for r in caplog.records)
+
+    def test_counts_async_engine_queries(self):
+        async def run():
+            engine = create_async_engine("sqlite+aiosqlite://")
+            try:
+                async with engine.connect() as conn:
+                    with track_queries("job:async") as stats:
+                        await conn.execute(select(1))
+                        await conn.execute(select(2))
+                return stats.count
+            finally:
+                await engine.dispose()
+
+        assert asyncio.run(run()) == 2
+
+
+class TestRequestTracking:
+    def test_per_route_totals_and_debug_header(self, test_db, monkeypatch):
+        monkeypatch.setattr(query_stats, "QUERY_STATS_HEADER", True)
+        app = FastAPI()
+        app.middleware("http")(track_request_queries)
+
+        @app.get("/users/{user_id}")
+        def get_user(user_id: int):
+            lookup_each(test_db, [user_id, user_id])
+            return {"ok": True}
+
+        client = TestClient(app)
+        response = client.get("/users/1")
+        client.get("/users/2")
+
+        assert response.headers["X-DB-Queries"].startswith("2; time_ms=")
+        route = route_query_stats()[0]
+        assert (route["label"], route["calls"], route["queries"], route["avg_queries"]) == \
+            ("GET /users/{user_id}", 2, 4, 2.0)
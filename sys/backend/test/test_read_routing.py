@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Unit tests for read-replica routing: replica reads, read-your-writes
+stickiness and fallback to the primary.
+Uses temporary SQLite files as primary and replica so no server is needed.
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from db import database, read_routing
+from db.read_routing import caller_key, clear_read_routing, mark_write, track_primary_writes, wrote_recently
+from authentication.auth import create_access_token
+
+
+@pytest.fixture(autouse=True)
+def fresh_routing():
+    clear_read_routing()
+    yield
+    clear_read_routing()
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """Point the read pool at a separate SQLite file"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setattr(database, "read_engine", engine)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(database, "async_read_engine", async_engine)
+    monkeypatch.setattr(database, "AsyncReadSessionLocal", async_sessionmaker(async_engine))
+    yield engine
+    engine.dispose()
+
+
+def request_as(user_id=None):
+    headers = []
+    if user_id is not None:
+        token = create_access_token({"user_id": user_id})
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def bound_url(request):
+    dependency = database.get_read_db(request)
+    db = next(dependency)
+    try:
+        return str(db.get_bind().url)
+    finally:
+        dependency.close()
+
+
+def async_bound_url(request):
+    async def resolve():
+        async for db in database.get_async_read_db(request):
+            return str(db.get_bind().url)
+    return asyncio.run(resolve())
+
+
+class TestReadRouting:
+    """Reads go to the replica unless the caller just wrote or it is unusable"""
+
+    def test_reads_use_replica(self, replica):
+        assert bound_url(request_as(7)).endswith("replica.db")
+        assert async_bound_url(request_as(7)).endswith("replica.db")
+
+    def test_no_replica_uses_primary(self):
+        assert bound_url(request_as(7)) == str(database.engine.url)
+
+    def test_callers_stick_to_primary_after_writes(self, replica):
+        mark_write(caller_key(request_as(7)))
+        assert bound_url(request_as(7)) == str(database.engine.url)
+        assert async_bound_url(request_as(7)) == str(database.async_engine.url)
+        # Other callers still read from the replica
+        assert bound_url(request_as(8)).endswith("replica.db")
+
+    def test_stickiness_expires(self, monkeypatch):
+        monkeypatch.setattr(read_routing, "READ_YOUR_WRITES_SECONDS", -1)
+        mark_write("user:7")
+        assert not wrote_recently("user:7")
+        assert not wrote_recently(None)
+
+    def test_lagging_replica_falls_back(self, replica, monkeypatch):
+        monkeypatch.setattr(read_routing, "REPLICA_MAX_LAG_SECONDS", -1)
+        assert bound_url(request_as(7)) == str(database.engine.url)
+
+    def test_unreachable_replica_falls_back_until_rechecked(self, tmp_path, monkeypatch):
+        engine = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+        monkeypatch.setattr(database, "read_engine", engine)
+        monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=engine))
+        assert bound_url(request_as(7)) == str(database.engine.url)
+
+        (tmp_path / "missing").mkdir()
+        assert bound_url(request_as(7)) == str(database.engine.url)
+        monkeypatch.setattr(read_routing, "REPLICA_CHECK_INTERVAL_SECONDS", 0)
+        assert bound_url(request_as(7)).endswith("replica.db")
+
+
+class TestWriteTracking:
+    def test_successful_writes_make_caller_sticky(self):
+        app = FastAPI()
+        app.middleware("http")(track_primary_writes)
+
+        @app.post("/things")
+        def create_thing():
+            return {"ok": True}
+
+        @app.post("/broken")
+        def broken():
+            from fastapi import HTTPException
+            raise HTTPException(status_code=400, detail="bad")
+
+        client = TestClient(app)
+        token = create_access_token({"user_id": 7})
+        client.post("/broken", headers={"Authorization": f"Bearer {token}"})
+        assert not wrote_recently("user:7")
+        client.post("/things")
+        client.post("/things", headers={"Authorization": f"Bearer {token}"})
+        assert wrote_recently("user:7")
+        assert caller_key(request_as()) is None
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the response pipeline: orjson responses, single-pass model
+serialisation and brotli/gzip compression. No running server is needed.
+"""
+
+import pytest
+import sys
+import os
+import gzip
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import brotli
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, field_validator
+
+from api import responses
+from api.responses import CompressionMiddleware, FastJSONResponse, choose_encoding, model_response
+
+validations = []
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+    price: float
+    deadline: datetime
+    note: Optional[str] = None
+
+    @field_validator("name")
+    @classmethod
+    def count_validation(cls, value):
+        validations.append(value)
+        return value
+
+
+def items(n):
+    return [Item(id=i, name=f"item {i}", price=i * 1.5, deadline=datetime(2026, 1, 1, 12, 30)) for i in range(n)]
+
+
+@pytest.fixture
+def app():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/validated", response_model=List[Item])
+    async def validated(n: int = 200):
+        return items(n)
+
+    @app.get("/fast", response_model=List[Item])
+    async def fast(n: int = 200):
+        return model_response(items(n), Item)
+
+    @app.get("/dicts", response_model=List[Item])
+    async def dicts():
+        return model_response([{"id": "1", "name": "x", "price": 2, "deadline": "2026-01-01T12:30:00",
+                                "secret": "dropped"}], Item)
+
+    @app.get("/plain")
+    async def plain():
+        return {"when": datetime(2026, 1, 1), "score": np.float64(0.5),
+                "amount": Decimal("2.50"), "tags": {"a"}, "item": items(1)[0]}
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"x" * 5000, b"y" * 5000]), media_type="text/csv")
+
+    return app
+
+
+class TestJSONResponses:
+    def test_orjson_handles_app_types(self, app):
+        body = TestClient(app).get("/plain", headers={"Accept-Encoding": "identity"}).json()
+        assert body == {"when": "2026-01-01T00:00:00", "score": 0.5, "amount": 2.5,
+                        "tags": ["a"], "item": {"id": 0, "name": "item 0", "price": 0.0,
+                                                "deadline": "2026-01-01T12:30:00", "note": None}}
+
+    def test_model_response_matches_response_model(self, app):
+        client = TestClient(app)
+        assert client.get("/fast").json() == client.get("/validated").json()
+
+    def test_built_models_are_not_validated_again(self):
+        built = items(3)
+        validations.clear()
+        response = model_response(built, Item)
+        assert validations == []
+        assert json.loads(response.body)[2]["name"] == "item 2"
+
+    def test_dicts_are_validated_once(self, app):
+        assert TestClient(app).get("/dicts").json() == [
+            {"id": 1, "name": "x", "price": 2.0, "deadline": "2026-01-01T12:30:00", "note": None}
+        ]
+
+
+class TestCompression:
+    def test_brotli_preferred(self, app):
+        response = TestClient(app).get("/fast", headers={"Accept-Encoding": "gzip, br"})
+        assert response.headers["content-encoding"] == "br"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert len(response.json()) == 200
+
+    def test_gzip(self, app):
+        response = TestClient(app).get("/fast", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()) == 200
+
+    def test_small_responses_are_sent_as_is(self, app):
+        response = TestClient(app).get("/fast?n=1", headers={"Accept-Encoding": "gzip, br"})
+        assert "content-encoding" not in response.headers
+
+    def test_streams_are_passed_through(self, app):
+        response = TestClient(app).get("/stream", headers={"Accept-Encoding": "gzip, br"})
+        assert "content-encoding" not in response.headers
+        assert len(response.content) == 10000
+
+    def test_large_bodies_compressed_off_loop(self, app, monkeypatch):
+        monkeypatch.setattr(responses, "COMPRESSION_THREADPOOL_BYTES", 1)
+        response = TestClient(app).get("/fast", headers={"Accept-Encoding": "br"})
+        assert response.headers["content-encoding"] == "br"
+        assert int(response.headers["content-length"]) < len(json.dumps(response.json()))
+
+    def test_accept_encoding_negotiation(self, monkeypatch):
+        assert choose_encoding("gzip, deflate, br") == "br"
+        assert choose_encoding("br;q=0, gzip") == "gzip"
+        assert choose_encoding("*") == "br"
+        assert choose_encoding("identity") is None
+        assert choose_encoding("") is None
+        monkeypatch.setattr(responses, "brotli", None)
+        assert choose_encoding("br, gzip") == "gzip"
+
+    def test_round_trip(self):
+        body = json.dumps([{"id": i} for i in range(500)]).encode()
+        assert brotli.decompress(responses.compress(body, "br")) == body
+        assert gzip.decompress(responses.compress(body, "gzip")) == body
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the precomputed user similarity neighbour table.
+Uses an in-memory SQLite database so no running server is needed.
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+
+from models.models import User, Product, GroupBuy, Contribution
+from models.analytics_models import UserSimilarity
+from ml.ml import calculate_user_similarity, get_user_similarity_based_recommendations
+from ml.user_similarity import load_preference_matrix, rebuild_user_similarity, get_similar_users
+
+
+PROFILES = [
+    (["Grains", "Vegetables"], "low", "beginner", ["small"], "occasional"),
+    (["Grains"], "low", "intermediate", ["small", "medium"], "regular"),
+    (["Dairy", "Vegetables"], "high", "advanced", ["large"], "frequent"),
+    (["Grains", "Vegetables"], "medium", "beginner", ["small"], "occasional"),
+    ([], "medium", "expert", [], "regular"),
+]
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create an in-memory test database for each test"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    db = TestingSessionLocal()
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture
+def traders(test_db):
+    users = []
+    for i, (categories, budget, experience, sizes, frequency) in enumerate(PROFILES):
+        user = User(
+            email=f"trader{i}@example.com",
+            hashed_password="hashed_password_123",
+            full_name=f"Trader {i}",
+            location_zone="HARARE",
+            preferred_categories=categories,
+            budget_range=budget,
+            experience_level=experience,
+            preferred_group_sizes=sizes,
+            participation_frequency=frequency,
+        )
+        test_db.add(user)
+        users.append(user)
+    test_db.commit()
+    return users
+
+
+class TestUserSimilarityMatrix:
+    """Vectorised scores match the pairwise reference implementation"""
+
+    def test_scores_match_pairwise_similarity(self, test_db, traders):
+        matrix = load_preference_matrix(test_db)
+        rows = [matrix.row_of[user.id] for user in traders]
+        scores, _ = matrix.scores(rows)
+
+        for i, user in enumerate(traders):
+            for other in traders:
+                if other.id == user.id:
+                    continue
+                expected = calculate_user_similarity(user, other)
+                assert scores[i, matrix.row_of[other.id]] == pytest.approx(expected, abs=1e-6)
+
+    def test_rebuild_writes_top_n_neighbours(self, test_db, traders):
+        written = rebuild_user_similarity(test_db, top_n=2, chunk_size=2)
+        assert written == 2 * len(traders)
+
+        first = traders[0]
+        neighbours = get_similar_users(test_db, first.id)
+        assert len(neighbours) == 2
+        assert neighbours[0][0] == traders[3].id
+        assert neighbours[0][1] >= neighbours[1][1]
+
+        row = test_db.query(UserSimilarity).filter_by(user_id=first.id, similar_user_id=traders[3].id).one()
+        assert (row.jaccard_similarity, row.common_groups_count) == (0.0, 0)
+
+        # Rebuilding replaces rather than duplicates
+        rebuild_user_similarity(test_db, top_n=2, chunk_size=3)
+        assert test_db.query(UserSimilarity).count() == written
+
+    def test_missing_neighbours_are_computed_on_demand(self, test_db, traders):
+        assert test_db.query(UserSimilarity).count() == 0
+        neighbours = get_similar_users(test_db, traders[1].id, limit=3)
+        assert len(neighbours) == 3
+        assert test_db.query(UserSimilarity).filter_by(user_id=traders[1].id).count() > 0
+
+    def test_jaccard_is_over_common_groups(self, test_db, traders):
+        product = Product(name="Maize Meal", unit_price=10.0, bulk_price=8.0, moq=10, category="Grains")
+        test_db.add(product)
+        test_db.commit()
+        groups = []
+        for _ in range(3):
+            group = GroupBuy(product_id=product.id, creator_id=traders[4].id, location_zone="HARARE",
+                             deadline=datetime.utcnow() + timedelta(days=5), total_quantity=1)
+            test_db.add(group)
+            groups.append(group)
+        test_db.commit()
+        for member, group in ((traders[0], groups[0]), (traders[0], groups[1]), (traders[3], groups[1]),
+                              (traders[3], groups[2])):
+            test_db.add(Contribution(group_buy_id=group.id, user_id=member.id, quantity=1, contribution_amount=8.0))
+        test_db.commit()
+
+        rebuild_user_similarity(test_db, top_n=2)
+        row = test_db.query(UserSimilarity).filter_by(user_id=traders[0].id, similar_user_id=traders[3].id).one()
+        assert row.common_groups_count == 1
+        assert row.jaccard_similarity == pytest.approx(1 / 3)
+
+    def test_empty_neighbour_sets_are_not_recomputed(self, test_db, traders, monkeypatch):
+        from ml import user_similarity
+
+        loads = []
+        real_load = user_similarity.load_preference_matrix
+        monkeypatch.setattr(user_similarity, "load_preference_matrix",
+                            lambda *args, **kwargs: loads.append(1) or real_load(*args, **kwargs))
+
+        # With every other profile incomplete there are no neighbour candidates
+        for other in traders[:4]:
+            other.experience_level = None
+        test_db.commit()
+        assert get_similar_users(test_db, traders[4].id) == []
+        assert get_similar_users(test_db, traders[4].id) == []
+        assert len(loads) == 1
+
+    def test_traders_covered_by_the_rebuild_are_not_computed_on_demand(self, test_db, traders, monkeypatch):
+        from ml import user_similarity
+
+        for other in traders[1:]:
+            other.experience_level = None
+        test_db.commit()
+        rebuild_user_similarity(test_db)
+        monkeypatch.setattr(user_similarity, "refresh_user_neighbours",
+                            lambda *args, **kwargs: pytest.fail("computed on the request path"))
+        assert get_similar_users(test_db, traders[0].id) == []
+
+
+class TestUserSimilarityRecommendations:
+    """The request path reads neighbours from the table"""
+
+    def test_recommends_groups_joined_by_neighbours(self, test_db, traders):
+        creator = traders[4]
+        product = Product(name="Maize Meal", unit_price=10.0, bulk_price=8.0, moq=10, category="Grains")
+        test_db.add(product)
+        test_db.commit()
+        group = GroupBuy(product_id=product.id, creator_id=creator.id, location_zone="HARARE",
+                         deadline=datetime.utcnow() + timedelta(days=5), total_quantity=5)
+        test_db.add(group)
+        test_db.commit()
+        test_db.add(Contribution(group_buy_id=group.id, user_id=traders[3].id, quantity=5,
+                                 contribution_amount=40.0, paid_amount=40.0, is_fully_paid=True))
+        test_db.commit()
+
+        rebuild_user_similarity(test_db)
+        recommendations = get_user_similarity_based_recommendations(traders[0].id, test_db)
+
+        assert [rec['group_buy_id'] for rec in recommendations] == [group.id]
+        assert recommendations[0]['ml_scores']['user_similarity'] == pytest.approx(
+            calculate_user_similarity(traders[0], traders[3]), abs=1e-6
+        )
+        # Members are not recommended groups they already joined
+        assert get_user_similarity_based_recommendations(traders[3].id, test_db) == []
+
+
+class TestPreferenceIndex:
+    """In-memory index used for cold-start recommendations"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_index(self):
+        from ml.user_similarity import clear_preference_index
+        clear_preference_index()
+        yield
+        clear_preference_index()
+
+    def test_find_similar_traders_matches_pairwise(self, test_db, traders):
+        from ml.user_similarity import find_similar_traders
+
+        target = traders[0]
+        expected = sorted(
+            ((other.id, calculate_user_similarity(target, other)) for other in traders[1:]),
+            key=lambda pair: (-pair[1], pair[0]),
+        )
+        expected = [pair for pair in expected if pair[1] > 0.3][:2]
+
+        found = find_similar_traders(test_db, target, min_similarity=0.3, limit=2)
+        assert [uid for uid, _ in found] == [uid for uid, _ in expected]
+        for (_, score), (_, want) in zip(found, expected):
+            assert score == pytest.approx(want, abs=1e-6)
+
+    def test_profile_updates_are_upserted(self, test_db, traders):
+        from ml.user_similarity import find_similar_traders, get_preference_index, update_preference_index
+
+        get_preference_index(test_db)
+        newcomer = User(email="new@example.com", hashed_password="x", full_name="New", location_zone="HARARE",
+                        preferred_categories=["Dairy", "Vegetables"], budget_range="high",
+                        experience_level="advanced", preferred_group_sizes=["large"],
+                        participation_frequency="frequent")
+        test_db.add(newcomer)
+        test_db.commit()
+        update_preference_index(newcomer)
+
+        assert find_similar_traders(test_db, newcomer, limit=1)[0] == (traders[2].id, pytest.approx(1.0))
+
+        # A new category token extends the encoding
+        newcomer.preferred_categories = ["Grains", "Vegetables", "Spices"]
+        newcomer.budget_range = "low"
+        newcomer.experience_level = "beginner"
+        newcomer.preferred_group_sizes = ["small"]
+        newcomer.participation_frequency = "occasional"
+        update_preference_index(newcomer)
+
+        best_id, best_score = find_similar_traders(test_db, newcomer, limit=1)[0]
+        assert best_id == traders[0].id
+        assert best_score == pytest.approx(calculate_user_similarity(newcomer, traders[0]), abs=1e-6)
+        assert "Spices" in get_preference_index(test_db).vocab["preferred_categories"]
+
+    def test_incomplete_profiles_with_categories_are_candidates(self, test_db, traders):
+        from ml.user_similarity import find_similar_traders
+
+        traders[3].experience_level = None
+        test_db.commit()
+        found = dict(find_similar_traders(test_db, traders[0], limit=10))
+        assert traders[3].id in found
+        assert found[traders[3].id] == pytest.approx(calculate_user_similarity(traders[0], traders[3]), abs=1e-6)
+
+    def test_stale_index_is_rebuilt_in_the_background(self, test_db, traders, monkeypatch):
+        import threading
+        import time
+        from ml import user_similarity
+
+        first = user_similarity.get_preference_index(test_db)
+        monkeypatch.setattr(user_similarity, "PREFERENCE_INDEX_TTL_SECONDS", 0)
+        fresh = user_similarity.encode_preferences(traders)
+        release = threading.Event()
+        loads = []
+
+        def slow_load(db, *args, **kwargs):
+            loads.append(threading.current_thread().name)
+            release.wait(5)
+            return fresh
+
+        monkeypatch.setattr(user_similarity, "load_preference_matrix", slow_load)
+        # Stale: every caller keeps getting the current index while one rebuild runs
+        assert all(user_similarity.get_preference_index(test_db) is first for _ in range(5))
+        newcomer = User(id=999, email="late@example.com", is_admin=False, is_supplier=False,
+                        preferred_categories=["Spices"], budget_range="low", experience_level="beginner",
+                        preferred_group_sizes=["small"], participation_frequency="regular")
+        user_similarity.update_preference_index(newcomer)
+        release.set()
+
+        deadline = time.monotonic() + 5
+        while user_similarity._preference_index is first and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert loads == ["preference-index-rebuild"]
+        rebuilt = user_similarity._preference_index
+        assert rebuilt is fresh
+        assert 999 in rebuilt.row_of  # profile change made during the rebuild is kept
+
+    def test_cold_start_recommendations_use_grouped_counts(self, test_db, traders):
+        from ml.ml import get_similarity_based_recommendations
+
+        product = Product(name="Rice", unit_price=10.0, bulk_price=8.0, moq=10, category="Grains")
+        test_db.add(product)
+        test_db.commit()
+        group = GroupBuy(product_id=product.id, creator_id=traders[4].id, location_zone="HARARE",
+                         deadline=datetime.utcnow() + timedelta(days=10), total_quantity=2)
+        test_db.add(group)
+        test_db.commit()
+        for member in (traders[1], traders[3], traders[3]):
+            test_db.add(Contribution(group_buy_id=group.id, user_id=member.id, quantity=1,
+                                     contribution_amount=8.0))
+        test_db.commit()
+
+        recommendations = get_similarity_based_recommendations(traders[0], test_db, [group])
+        assert [rec['group_buy_id'] for rec in recommendations] == [group.id]
+
+        sim_1 = calculate_user_similarity(traders[0], traders[1])
+        sim_3 = calculate_user_similarity(traders[0], traders[3])
+        assert recommendations[0]['ml_scores']['user_similarity'] == pytest.approx((sim_1 + 2 * sim_3) / 3, abs=1e-6)
+        assert recommendations[0]['ml_scores']['participant_boost'] == pytest.approx(0.2)
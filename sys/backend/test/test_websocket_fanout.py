@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Unit tests for WebSocket fan-out (websocket.fanout): per-connection send
+queues, slow-consumer policies and dead-connection cleanup in the
+notification and chat managers. Uses fake sockets, so no server is needed.
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from websocket import fanout
+from websocket.fanout import FanoutManager, SLOW_CONSUMER_CLOSE_CODE
+from websocket.websocket_manager import ConnectionManager
+from models.chat import ConnectionManager as ChatConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0, fail=False, block=False):
+        self.delay = delay
+        self.fail = fail
+        self.block = block
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        if self.block:
+            await asyncio.Event().wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestFanout:
+    def test_slow_client_does_not_delay_others(self):
+        async def main():
+            manager = FanoutManager("test", queue_size=100)
+            slow, fast = FakeWebSocket(delay=0.5), FakeWebSocket()
+            await manager.connect(slow, 1)
+            await manager.connect(fast, 1)
+            started = time.perf_counter()
+            for i in range(10):
+                assert manager.publish(1, f"m{i}") == 2
+            publish_time = time.perf_counter() - started
+            await asyncio.sleep(0.05)
+            return publish_time, slow, fast
+
+        publish_time, slow, fast = asyncio.run(main())
+        assert publish_time < 0.05
+        assert fast.sent == [f"m{i}" for i in range(10)]
+        assert len(slow.sent) < 10
+
+    def test_full_queue_disconnects(self):
+        async def main():
+            manager = FanoutManager("test", queue_size=2, policy="disconnect")
+            stuck, ok = FakeWebSocket(block=True), FakeWebSocket()
+            await manager.connect(stuck, 1)
+            await manager.connect(ok, 1)
+            for i in range(5):
+                manager.publish(1, f"m{i}")
+                await settle()  # `ok` keeps up; `stuck` fills its queue
+            return manager, stuck, ok
+
+        manager, stuck, ok = asyncio.run(main())
+        assert stuck.close_code == SLOW_CONSUMER_CLOSE_CODE
+        assert manager.active_connections == {1: [ok]}
+        assert manager.connection_count() == 1
+        assert len(ok.sent) == 5
+
+    def test_full_queue_drops_oldest(self):
+        async def main():
+            manager = FanoutManager("test", queue_size=2, policy="drop_oldest")
+            ws = FakeWebSocket(block=True)
+            await manager.connect(ws, 1)
+            await settle()  # writer takes m0 and blocks on it
+            for i in range(5):
+                manager.publish(1, f"m{i}")
+            sender = manager._senders[ws]
+            return manager, list(sender.queue._queue)
+
+        manager, queued = asyncio.run(main())
+        assert queued == ["m3", "m4"]
+        assert manager.connection_count() == 1
+
+    def test_send_timeout_closes_connection(self, monkeypatch):
+        monkeypatch.setattr(fanout, "WS_SEND_TIMEOUT_SECONDS", 0.05)
+
+        async def main():
+            manager = FanoutManager("test")
+            ws = FakeWebSocket(block=True)
+            await manager.connect(ws, 1)
+            manager.publish(1, "hello")
+            await asyncio.sleep(0.1)
+            await settle()
+            return manager, ws
+
+        manager, ws = asyncio.run(main())
+        assert ws.close_code == SLOW_CONSUMER_CLOSE_CODE
+        assert manager.active_connections == {}
+
+    def test_publish_from_worker_thread(self):
+        async def main():
+            manager = FanoutManager("test")
+            ws = FakeWebSocket()
+            await manager.connect(ws, 1)
+            await asyncio.get_running_loop().run_in_executor(None, manager.publish_all, "from thread")
+            await settle()
+            return ws
+
+        assert asyncio.run(main()).sent == ["from thread"]
+
+
+class TestNotificationManager:
+    def test_dead_connections_are_removed(self):
+        async def main():
+            manager = ConnectionManager()
+            dead, alive = FakeWebSocket(fail=True), FakeWebSocket()
+            await manager.connect(dead, 1)
+            await manager.connect(alive, 2)
+            await manager.broadcast("first")
+            await settle()
+            await manager.broadcast("second")
+            await settle()
+            return manager, alive
+
+        manager, alive = asyncio.run(main())
+        assert manager.active_connections == {2: [alive]}
+        assert alive.sent == ["first", "second"]
+
+    def test_broadcast_to_user_survives_disconnects_mid_iteration(self):
+        async def main():
+            manager = ConnectionManager()
+            sockets = [FakeWebSocket(block=True), FakeWebSocket(), FakeWebSocket(block=True), FakeWebSocket()]
+            manager.queue_size = 1
+            for ws in sockets:
+                await manager.connect(ws, 7)
+            await manager.broadcast_to_user(7, {"n": 0})
+            await settle()
+            # The blocked sockets overflow and are dropped while the user's list is being walked
+            await manager.broadcast_to_user(7, {"n": 1})
+            await settle()
+            await manager.broadcast_to_user(7, {"n": 2})
+            await settle()
+            return manager, sockets
+
+        manager, sockets = asyncio.run(main())
+        assert manager.active_connections == {7: [sockets[1], sockets[3]]}
+        for ws in (sockets[1], sockets[3]):
+            assert [json.loads(m)["n"] for m in ws.sent] == [0, 1, 2]
+
+    def test_message_is_serialised_once(self, monkeypatch):
+        from websocket import websocket_manager
+        dumps = []
+        monkeypatch.setattr(websocket_manager.json, "dumps", lambda obj: dumps.append(obj) or json.JSONEncoder().encode(obj))
+
+        async def main():
+            manager = ConnectionManager()
+            sockets = [FakeWebSocket() for _ in range(5)]
+            for ws in sockets:
+                await manager.connect(ws, 3)
+            await manager.broadcast_to_user(3, {"type": "qr_status"})
+            await settle()
+            return sockets
+
+        sockets = asyncio.run(main())
+        assert len(dumps) == 1
+        assert all(ws.sent == ['{"type": "qr_status"}'] for ws in sockets)
+
+
+class TestChatManager:
+    def test_broadcast_to_group(self):
+        async def main():
+            manager = ChatConnectionManager()
+            a, b, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+            await manager.connect(a, 1)
+            await manager.connect(b, 1)
+            await manager.connect(other, 2)
+            await manager.broadcast("hi group 1", 1)
+            await settle()
+            manager.disconnect(b, 1)
+            manager.disconnect(b, 1)
+            await manager.broadcast("bye", 1)
+            await settle()
+            return manager, a, b, other
+
+        manager, a, b, other = asyncio.run(main())
+        assert a.sent == ["hi group 1", "bye"]
+        assert b.sent == ["hi group 1"]
+        assert other.sent == []
+        assert manager.active_connections == {1: [a], 2: [other]}
+
+    def test_round_trip_through_starlette(self):
+        manager = ChatConnectionManager()
+        app = FastAPI()
+
+        @app.websocket("/ws/{group_id}")
+        async def chat(websocket: WebSocket, group_id: int):
+            await manager.connect(websocket, group_id)
+            try:
+                while True:
+                    await manager.broadcast(await websocket.receive_text(), group_id)
+            except WebSocketDisconnect:
+                manager.disconnect(websocket, group_id)
+
+        client = TestClient(app)
+        with client.websocket_connect("/ws/5") as first, client.websocket_connect("/ws/5") as second:
+            first.send_text("hello")
+            assert first.receive_text() == "hello"
+            assert second.receive_text() == "hello"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
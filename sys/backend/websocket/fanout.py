@@ -0,0 +1,178 @@
+"""
+Backpressure-aware WebSocket fan-out.
+
+Every connection gets a bounded send queue (WS_SEND_QUEUE_SIZE messages)
+drained by its own writer task, so publishing never awaits a client: a
+broadcast serialises its payload once and enqueues the same string for each
+recipient with put_nowait, and a slow phone on 3G only delays itself.
+
+When a connection's queue is full it is a slow consumer, handled by
+WS_SLOW_CONSUMER_POLICY:
+
+* disconnect (default): close it with 1013 (try again later); the client
+  reconnects and reloads what it missed;
+* drop_oldest: discard its oldest queued message to make room (fine for
+  progress streams, where only the latest state matters).
+
+A send that fails, or takes longer than WS_SEND_TIMEOUT_SECONDS, closes the
+connection and removes it from its topic.
+"""
+from typing import Dict, Hashable, List, Optional
+import asyncio
+import logging
+import os
+
+from fastapi import WebSocket
+
+from monitoring.metrics import WEBSOCKET_SLOW_CONSUMERS
+
+logger = logging.getLogger(__name__)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect").lower()  # or 'drop_oldest'
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ConnectionSender:
+    """One connection's bounded send queue and the writer task draining it."""
+
+    def __init__(self, websocket: WebSocket, manager: "FanoutManager", queue_size: int = None,
+                 policy: str = None):
+        self.websocket = websocket
+        self.manager = manager
+        self.policy = policy or WS_SLOW_CONSUMER_POLICY
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or WS_SEND_QUEUE_SIZE)
+        self.closed = False
+        self.task = asyncio.create_task(self._write(), name=f"ws-writer-{manager.name}")
+
+    def offer(self, message: str) -> bool:
+        """Queue `message` without waiting; False if the connection is (now) closed."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "drop_oldest":
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            WEBSOCKET_SLOW_CONSUMERS.labels(self.manager.name, "dropped_message").inc()
+            return True
+        WEBSOCKET_SLOW_CONSUMERS.labels(self.manager.name, "disconnected").inc()
+        logger.warning(f"🐌 Closing slow {self.manager.name} WebSocket: {self.queue.qsize()} messages queued")
+        self.close(SLOW_CONSUMER_CLOSE_CODE)
+        return False
+
+    async def _write(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                async with asyncio.timeout(WS_SEND_TIMEOUT_SECONDS):
+                    await self.websocket.send_text(message)
+        except asyncio.CancelledError:
+            pass
+        except TimeoutError:
+            WEBSOCKET_SLOW_CONSUMERS.labels(self.manager.name, "disconnected").inc()
+            logger.warning(f"🐌 Closing {self.manager.name} WebSocket: send took over {WS_SEND_TIMEOUT_SECONDS}s")
+            self.close(SLOW_CONSUMER_CLOSE_CODE)
+        except Exception as e:
+            logger.info(f"Dropping {self.manager.name} WebSocket after failed send: {e!r}")
+            self.close()
+
+    def close(self, code: Optional[int] = None):
+        """Stop writing and unregister; with `code`, also close the socket."""
+        if self.closed:
+            return
+        self.closed = True
+        self.manager._remove(self.websocket)
+        if asyncio.current_task() is not self.task:
+            self.task.cancel()
+        if code is not None:
+            asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            async with asyncio.timeout(WS_SEND_TIMEOUT_SECONDS):
+                await self.websocket.close(code=code)
+        except Exception:
+            pass  # Already gone
+
+
+class FanoutManager:
+    """
+    WebSocket connections grouped by topic (user id, group id, ...), with
+    non-blocking publish to a topic or to everyone.
+    """
+
+    def __init__(self, name: str, queue_size: int = None, policy: str = None):
+        self.name = name
+        self.queue_size = queue_size
+        self.policy = policy
+        self.active_connections: Dict[Hashable, List[WebSocket]] = {}
+        self._senders: Dict[WebSocket, ConnectionSender] = {}
+        self._topics: Dict[WebSocket, Hashable] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def connect(self, websocket: WebSocket, topic: Hashable):
+        await websocket.accept()
+        self._loop = asyncio.get_running_loop()
+        self.active_connections.setdefault(topic, []).append(websocket)
+        self._topics[websocket] = topic
+        self._senders[websocket] = ConnectionSender(websocket, self, self.queue_size, self.policy)
+
+    def disconnect(self, websocket: WebSocket, topic: Hashable = None):
+        """Forget a connection (idempotent) and stop its writer."""
+        self._remove(websocket, topic)
+
+    def _remove(self, websocket: WebSocket, topic: Hashable = None):
+        topic = self._topics.pop(websocket, topic)
+        connections = self.active_connections.get(topic)
+        if connections is not None and websocket in connections:
+            # Replace rather than mutate, so a publish iterating the old list is unaffected
+            remaining = [c for c in connections if c is not websocket]
+            if remaining:
+                self.active_connections[topic] = remaining
+            else:
+                del self.active_connections[topic]
+        sender = self._senders.pop(websocket, None)
+        if sender is not None:
+            sender.close()
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def send(self, websocket: WebSocket, message: str) -> bool:
+        """Queue a message for one connection."""
+        sender = self._senders.get(websocket)
+        return sender.offer(message) if sender is not None else False
+
+    def publish(self, topic: Hashable, message: str) -> int:
+        """Queue an already-serialised message for every connection on `topic`; returns how many took it."""
+        if self._loop is not None and not self._on_loop():
+            # Called from a worker thread: hand over to the event loop
+            self._loop.call_soon_threadsafe(self.publish, topic, message)
+            return 0
+        delivered = 0
+        for websocket in self.active_connections.get(topic, ()):
+            sender = self._senders.get(websocket)
+            if sender is not None and sender.offer(message):
+                delivered += 1
+        return delivered
+
+    def publish_all(self, message: str) -> int:
+        if self._loop is not None and not self._on_loop():
+            self._loop.call_soon_threadsafe(self.publish_all, message)
+            return 0
+        delivered = 0
+        for sender in list(self._senders.values()):
+            if sender.offer(message):
+                delivered += 1
+        return delivered
+
+    def connection_count(self) -> int:
+        return len(self._senders)
@@ -280,6 +280,9 @@ def manually_complete_group(db: Session, group_buy_id: int) -> dict:
 
 
 if __name__ == "__main__":
+    from db.query_stats import track_queries
+
     # Run the auto-complete check
-    check_and_complete_groups()
+    with track_queries("job:auto_complete_groups"):
+        check_and_complete_groups()
 
@@ -1,5 +1,8 @@
 import os
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
+
+from db.query_stats import begin_tracking, end_tracking
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", os.getenv("REDIS_URL", "redis://localhost:6379/1"))
@@ -19,3 +22,16 @@ celery_app.conf.update(
     enable_utc=True,
 )
 
+
+# Query counts, slow-query and N+1 logging per task run
+_task_query_trackers = {}
+
+@task_prerun.connect
+def _start_task_query_tracking(task_id=None, task=None, **kwargs):
+    _task_query_trackers[task_id] = begin_tracking(f"job:{task.name}")
+
+@task_postrun.connect
+def _stop_task_query_tracking(task_id=None, **kwargs):
+    tracking = _task_query_trackers.pop(task_id, None)
+    if tracking is not None:
+        end_tracking(tracking)
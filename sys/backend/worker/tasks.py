@@ -11,3 +11,57 @@ def analytics_run_daily_jobs() -> str:
     asyncio.run(run_daily_analytics_jobs_once())
     return "ok"
 
+@celery_app.task(name="analytics.compact_events")
+def analytics_compact_events() -> str:
+    from analytics.etl_pipeline import compact_event_rollups, apply_events_retention
+    from db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        days = compact_event_rollups(db)
+        archived = apply_events_retention(db)
+    finally:
+        db.close()
+    return f"compacted {days} day(s), archived {archived} event(s)"
+
+@celery_app.task(name="analytics.user_similarity")
+def analytics_user_similarity() -> str:
+    from ml.user_similarity import rebuild_user_similarity
+    from db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        rows = rebuild_user_similarity(db)
+    finally:
+        db.close()
+    return f"wrote {rows} user similarity row(s)"
+
+@celery_app.task(name="analytics.rebuild_transitions")
+def analytics_rebuild_transitions() -> str:
+    from analytics.transition_index import rebuild_transition_index
+    from db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        rows = rebuild_transition_index(db)
+    finally:
+        db.close()
+    return f"wrote {rows} product transition(s)"
+
+@celery_app.task(name="analytics.export_columnar")
+def analytics_export_columnar() -> dict:
+    from analytics.columnar_export import export_all
+    from db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        return export_all(db)
+    finally:
+        db.close()
+
+@celery_app.task(name="analytics.behavioral_features")
+def analytics_behavioral_features() -> str:
+    from analytics.etl_pipeline import refresh_behavioral_features
+    from db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        stored = refresh_behavioral_features(db)
+    finally:
+        db.close()
+    return f"refreshed behavioral features for {stored} trader(s)"